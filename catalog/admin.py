@@ -1,6 +1,34 @@
-from django.contrib import admin
+import datetime
+import uuid
 
-from .models import Book, BookInstance, Author, Language, Genre
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import circulation, search
+from .forms import AuthorAutocompleteSelect, RenewBookForm
+from .models import Book, BookInstance, Author, Language, Genre, Hold
+from .pagination import estimate_count
+
+# Below this many rows a changelist counts its rows exactly
+EXACT_COUNT_LIMIT = 10000
+
+# Number of full-text matches the book changelist can show
+ADMIN_SEARCH_RESULTS_LIMIT = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """A paginator that takes the number of rows from the query plan when possible
+
+    An exact COUNT(*) reads the whole table, which takes seconds with
+    millions of copies. The page links only need to be roughly right.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        return estimate_count(self.object_list, exact_below=EXACT_COUNT_LIMIT)
 
 
 class CatalogAdmin(admin.ModelAdmin):
@@ -8,16 +36,68 @@ class CatalogAdmin(admin.ModelAdmin):
     It adds features that are common to all modeladmins
     """
 
-    pass
+    # The changelists count their rows from the query plan on large tables,
+    # and do not count the whole table again when a filter or search is used
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """An inline formset that only edits one page of the related rows
+
+    The page is chosen with the ?<prefix>-page= parameter of the change form,
+    which the form keeps when it is submitted.
+    """
+
+    per_page = 20
+    page_number = 1
+    page = None
+
+    def get_queryset(self):
+        if self.page is None:
+            # The rows are shown with the parent object, e.g. by __str__()
+            queryset = super().get_queryset().select_related(self.fk.name)
+            # The default ordering of the rows may not be unique (copies are
+            # ordered by due_back, mostly NULL), so the pk keeps the pages the
+            # same between the GET of the form and its POST
+            ordering = queryset.query.order_by or self.model._meta.ordering
+            queryset = queryset.order_by(*ordering, "pk")
+            paginator = Paginator(queryset, self.per_page)
+            self.page = paginator.get_page(self.page_number)
+        return self.page.object_list
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    """A tabular inline showing a page of related rows with links to the others
+
+    Opening a change form costs the same however many related rows there are.
+    """
+
+    formset = PaginatedInlineFormSet
+    template = "admin/catalog/paginated_tabular_inline.html"
+    per_page = 20
+    show_change_link = True
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_number = request.GET.get(f"{formset.get_default_prefix()}-page")
+        return formset
 
-class BooksInstanceInline(admin.TabularInline):
+
+class BooksInstanceInline(PaginatedTabularInline):
     model = BookInstance
 
+    # A select of every user would be rendered for every copy
+    raw_id_fields = ("borrower",)
+
 
-class BookInline(admin.TabularInline):
+class BookInline(PaginatedTabularInline):
     model = Book
 
+    # Selects of every language and genre would be rendered for every book
+    raw_id_fields = ("language", "genre")
+
 
 @admin.register(Author)
 class AuthorAdmin(CatalogAdmin):
@@ -42,6 +122,34 @@ class BookAdmin(CatalogAdmin):
     # We cannot display genre directly, so we use display_genre function
     list_display = ("title", "author", "display_genre")
 
+    # The author is joined in and the genres of a whole page are read with
+    # one more query, instead of one query per book for each
+    list_select_related = ("author",)
+
+    # Searches go through the full-text index of catalog.search, or match
+    # the ISBN exactly
+    search_fields = ("title", "author__last_name", "genre__name", "isbn")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("genre")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # A select of every author would be rendered with the form; the
+        # authors are fetched as the name is typed instead
+        if db_field.name == "author":
+            kwargs["widget"] = AuthorAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get("using")
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        book_ids = search.search_book_ids(search_term, limit=ADMIN_SEARCH_RESULTS_LIMIT)
+        return queryset.filter(Q(pk__in=book_ids) | Q(isbn=search_term)), False
+
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(CatalogAdmin):
@@ -49,6 +157,13 @@ class BookInstanceAdmin(CatalogAdmin):
     # Book details are received using book_details function
     list_display = ("book_details", "id", "status", "borrower", "due_back")
 
+    # The book and the borrower of every row are joined in
+    list_select_related = ("book", "borrower")
+
+    # Every search is an exact match on a unique, indexed column: the id of
+    # the copy, the ISBN of its book or the username of its borrower
+    search_fields = ("book__isbn__exact", "borrower__username__exact")
+
     # We allow filtering options for admin site
     # The books are already sorted according to due_back date
     list_filter = ("status", "due_back")
@@ -59,6 +174,80 @@ class BookInstanceAdmin(CatalogAdmin):
         ("Availability", {"fields": ("status", "due_back", "borrower")}),
     )
 
+    actions = ["renew_selected", "return_selected"]
+
+    def get_search_results(self, request, queryset, search_term):
+        try:
+            copy_id = uuid.UUID(search_term.strip())
+        except ValueError:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk=copy_id), False
+
+    def report(self, request, results: dict, done: str) -> None:
+        """Tells the user how many copies were changed and why the others were not"""
+
+        changed = sum(1 for error in results.values() if error is None)
+        self.message_user(request, f"{changed} copies {done}.", messages.SUCCESS)
+
+        failures = {}
+        for copy_id, error in results.items():
+            if error is not None:
+                failures.setdefault(error, []).append(str(copy_id))
+
+        for error, copy_ids in failures.items():
+            self.message_user(
+                request, f"{error}: {', '.join(copy_ids)}", messages.WARNING
+            )
+
+    @admin.action(
+        description="Renew selected copies for 3 weeks",
+        permissions=["change"],
+    )
+    def renew_selected(self, request, queryset):
+        # The same rules apply as when a librarian renews a single copy
+        form = RenewBookForm(
+            data={"renewal_date": datetime.date.today() + datetime.timedelta(weeks=3)}
+        )
+        if not form.is_valid():
+            self.message_user(request, form.errors["renewal_date"][0], messages.ERROR)
+            return
+
+        copy_ids = queryset.values_list("pk", flat=True)
+        results = circulation.renew(copy_ids, form.cleaned_data["renewal_date"])
+        self.report(request, results, "renewed")
+
+    @admin.action(description="Return selected copies", permissions=["change"])
+    def return_selected(self, request, queryset):
+        results = circulation.return_copies(queryset.values_list("pk", flat=True))
+        self.report(request, results, "returned")
+
+
+@admin.register(Hold)
+class HoldAdmin(CatalogAdmin):
+
+    list_display = ("book", "patron", "status", "placed_at", "ready_at", "copy")
+
+    # The book and the patron of every row are joined in
+    list_select_related = ("book", "patron")
+
+    # The status and copy of a hold are moved by catalog.circulation, which
+    # keeps them in step with the copies, so they are not edited here
+    raw_id_fields = ("book", "patron")
+    readonly_fields = ("status", "copy", "placed_at", "ready_at")
+
+    search_fields = ("book__isbn__exact", "patron__username__exact")
+    list_filter = ("status",)
+
+    actions = ["cancel_selected"]
+
+    @admin.action(description="Cancel selected holds", permissions=["change"])
+    def cancel_selected(self, request, queryset):
+        cancelled = 0
+        for hold_id in queryset.active().values_list("pk", flat=True):
+            if circulation.cancel_hold(hold_id) is None:
+                cancelled += 1
+        self.message_user(request, f"{cancelled} holds cancelled.", messages.SUCCESS)
+
 
 # The models are registered here so that they can be populated by admin site
 
@@ -0,0 +1,140 @@
+"""Independent aggregate queries for the async views, run concurrently
+
+Django's ORM is synchronous, so the async index and dashboard views hand each
+query to sync_to_async. With thread_sensitive=False every query runs on its
+own thread from the event loop's default pool, on that thread's own database
+connection, so queries that do not depend on each other wait on the database
+at the same time instead of one after another. The page then costs about as
+long as its slowest query rather than the sum of all of them.
+
+The connections of the pool threads are not closed by the request_finished
+signal of the request thread, so each query releases its connection the same
+way Django does at the end of a request, honouring CONN_MAX_AGE.
+
+Running the queries concurrently is turned off with the
+CATALOG_CONCURRENT_QUERIES setting, in which case they run one after another
+on the request's thread, as the synchronous views do.
+"""
+
+import asyncio
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .models import OVERDUE_BUCKETS, Book, BookInstance, CatalogStats
+
+# Loans due back within this many days are listed as due this week
+DUE_SOON_DAYS = 7
+
+# The number of books listed as the most borrowed ones
+TOP_BOOKS = 5
+
+
+def concurrent_queries_enabled() -> bool:
+    """Returns whether independent queries may run on separate threads"""
+
+    return getattr(settings, "CATALOG_CONCURRENT_QUERIES", True)
+
+
+def _on_own_connection(query):
+    """Wraps query so that it releases the connection of its pool thread"""
+
+    def run():
+        try:
+            return query()
+        finally:
+            close_old_connections()
+
+    return run
+
+
+async def gather(**queries) -> dict:
+    """Runs the given callables concurrently and returns their results by name"""
+
+    if not concurrent_queries_enabled():
+
+        def run_all():
+            return {name: query() for name, query in queries.items()}
+
+        return await sync_to_async(run_all)()
+
+    results = await asyncio.gather(
+        *(
+            sync_to_async(_on_own_connection(query), thread_sensitive=False)()
+            for query in queries.values()
+        )
+    )
+    return dict(zip(queries, results))
+
+
+def count_loans_by_status() -> dict:
+    """Returns the number of copies in each loan status"""
+
+    counts = dict(
+        BookInstance.objects.order_by()
+        .values_list("status")
+        .annotate(count=Count("pk"))
+    )
+    return {label: counts.get(status, 0) for status, label in BookInstance.LOAN_STATUS}
+
+
+def count_due_soon(today: date) -> int:
+    """Returns the number of copies on loan due back within DUE_SOON_DAYS"""
+
+    return (
+        BookInstance.objects.on_loan()
+        .filter(due_back__range=(today, today + timedelta(days=DUE_SOON_DAYS)))
+        .count()
+    )
+
+
+def count_borrowers() -> int:
+    """Returns the number of users with at least one copy on loan"""
+
+    return (
+        BookInstance.objects.on_loan()
+        .filter(borrower__isnull=False)
+        .order_by()
+        .values("borrower")
+        .distinct()
+        .count()
+    )
+
+
+def most_borrowed_books() -> list:
+    """Returns the TOP_BOOKS books with the most copies on loan"""
+
+    return list(
+        Book.objects.filter(count_of_on_loan__gt=0)
+        .order_by("-count_of_on_loan", "title")
+        .only("title", "count_of_on_loan")[:TOP_BOOKS]
+    )
+
+
+def dashboard_queries(today: date = None) -> dict:
+    """Returns the independent queries of the librarian dashboard by name"""
+
+    today = today or date.today()
+    return {
+        "stats": CatalogStats.load,
+        "overdue": lambda: BookInstance.objects.count_overdue_by_bucket(today),
+        "loans_by_status": count_loans_by_status,
+        "count_of_due_soon": lambda: count_due_soon(today),
+        "count_of_borrowers": count_borrowers,
+        "most_borrowed": most_borrowed_books,
+    }
+
+
+async def load_dashboard(today: date = None) -> dict:
+    """Returns the template context of the librarian dashboard"""
+
+    results = await gather(**dashboard_queries(today))
+
+    overdue = results.pop("overdue")
+    results["buckets"] = [(name, overdue[name]) for name, _, _ in OVERDUE_BUCKETS]
+    results["count_of_overdue"] = sum(overdue.values())
+    results["due_soon_days"] = DUE_SOON_DAYS
+    return results
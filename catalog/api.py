@@ -0,0 +1,221 @@
+"""Read-only JSON API for the catalog
+
+Every resource is served by a CatalogApiView subclass that declares which
+fields can be requested and how they are read from the database. Rows are
+read with values_list(), so no model instances are built.
+
+Query parameters understood by every resource:
+
+    fields=title,isbn   only return these fields (default: all of them)
+    limit=50            number of results per page (at most MAX_PAGE_SIZE)
+    after=<token>       continue after the last row of the previous page
+    format=compact      return each row as a list in the order of "fields"
+                        instead of an object repeating the field names
+    stream=1            return every matching row in one response that is
+                        serialized row by row from QuerySet.iterator(), so
+                        memory use does not grow with the number of rows
+
+Responses are gzip compressed for clients that accept it.
+"""
+
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.gzip import gzip_page
+
+from .models import Author, Book, BookInstance, Genre, Language
+from .pagination import AFTER_PARAM, KeysetPaginator
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Number of rows fetched from the database at a time when streaming
+STREAM_CHUNK_SIZE = 2000
+
+COMPACT_FORMAT = "compact"
+
+
+def dump_json(data) -> str:
+    """Encodes data as JSON without any whitespace"""
+
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+
+class ApiError(Exception):
+    """An invalid request parameter, reported to the client with status 400"""
+
+
+@method_decorator(gzip_page, name="dispatch")
+class CatalogApiView(View):
+    """Lists the rows of a model as JSON
+
+    Subclasses set model and api_fields, a mapping from the public name of
+    each field to the lookup it is read with, and may set api_filters, a
+    mapping from query parameters to the lookups they filter on.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    model = None
+    api_fields = {}
+    api_filters = {}
+
+    def get_queryset(self):
+        queryset = self.model.objects.all()
+
+        for param, lookup in self.api_filters.items():
+            if param in self.request.GET:
+                try:
+                    queryset = queryset.filter(**{lookup: self.request.GET[param]})
+                except (ValueError, ValidationError):
+                    raise ApiError(f"Invalid value for {param}")
+
+        return queryset
+
+    def get_fields(self) -> list:
+        """Returns the public names of the requested fields"""
+
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return list(self.api_fields)
+
+        fields = [field.strip() for field in requested.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in self.api_fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def get_page_size(self) -> int:
+        try:
+            page_size = int(self.request.GET.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("limit must be a number")
+
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        return page_size
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = self.get_fields()
+            compact = request.GET.get("format") == COMPACT_FORMAT
+
+            if request.GET.get("stream"):
+                return self.stream(fields, compact)
+            return self.page(fields, compact, self.get_page_size())
+
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+
+    def encode_row(self, fields, row, compact: bool):
+        """Returns a values_list() row as a list or as a dict keyed by field name"""
+
+        return list(row) if compact else dict(zip(fields, row))
+
+    def page(self, fields, compact: bool, page_size: int) -> JsonResponse:
+        """Returns one page of results with the token of the next page"""
+
+        paginator = KeysetPaginator(self.get_queryset(), page_size, ("pk",))
+        queryset = paginator.page_queryset(after=self.request.GET.get(AFTER_PARAM))
+
+        # The primary key is read last for the next page token
+        lookups = [self.api_fields[field] for field in fields] + ["pk"]
+        rows = list(queryset.values_list(*lookups)[: page_size + 1])
+
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            params = self.request.GET.copy()
+            params[AFTER_PARAM] = paginator.encode_cursor({"id": rows[-1][-1]})
+            next_url = f"{self.request.path}?{params.urlencode()}"
+
+        data = {
+            "fields": fields,
+            "results": [self.encode_row(fields, row[:-1], compact) for row in rows],
+            "next": next_url,
+        }
+        return JsonResponse(data, json_dumps_params={"separators": (",", ":")})
+
+    def stream(self, fields, compact: bool) -> StreamingHttpResponse:
+        """Returns every result, serialized one row at a time"""
+
+        lookups = [self.api_fields[field] for field in fields]
+        queryset = self.get_queryset().order_by("pk").values_list(*lookups)
+
+        def generate():
+            yield '{"fields":' + dump_json(fields) + ',"results":['
+
+            separator = ""
+            for row in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+                yield separator + dump_json(self.encode_row(fields, row, compact))
+                separator = ","
+
+            yield "]}"
+
+        return StreamingHttpResponse(generate(), content_type="application/json")
+
+
+class BookApiView(CatalogApiView):
+    """The books of the catalog"""
+
+    model = Book
+    api_fields = {
+        "id": "id",
+        "title": "title",
+        "author": "author_id",
+        "summary": "summary",
+        "isbn": "isbn",
+        "language": "language__language",
+        "updated_at": "updated_at",
+    }
+    api_filters = {"author": "author_id", "isbn": "isbn"}
+
+
+class AuthorApiView(CatalogApiView):
+    """The authors of the catalog"""
+
+    model = Author
+    api_fields = {
+        "id": "id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "date_of_birth": "date_of_birth",
+        "date_of_death": "date_of_death",
+        "updated_at": "updated_at",
+    }
+
+
+class GenreApiView(CatalogApiView):
+    """The genres of the catalog"""
+
+    model = Genre
+    api_fields = {"id": "id", "name": "name"}
+
+
+class LanguageApiView(CatalogApiView):
+    """The languages of the catalog"""
+
+    model = Language
+    api_fields = {"id": "id", "language": "language"}
+
+
+class BookInstanceApiView(CatalogApiView):
+    """The copies of the books and whether they can be borrowed
+
+    Borrowers are not exposed.
+    """
+
+    model = BookInstance
+    api_fields = {
+        "id": "id",
+        "book": "book_id",
+        "imprint": "imprint",
+        "status": "status",
+        "due_back": "due_back",
+        "updated_at": "updated_at",
+    }
+    api_filters = {"book": "book_id", "status": "status"}
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalog"
+
+    def ready(self):
+        # Connects the signal handlers that keep denormalized data up to date
+        from . import signals  # noqa: F401
+
+        # Connects the handler that times the queries of measured requests
+        from . import instrumentation  # noqa: F401
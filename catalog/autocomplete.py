@@ -0,0 +1,260 @@
+"""Author name autocompletion from an in-memory prefix index
+
+Forms pick the author of a book from a select that fetches the authors
+matching what was typed (see catalog.forms.AuthorAutocompleteSelect), rather
+than rendering an option for every author. The matches come from a prefix
+index kept in the memory of the process: two sorted arrays, one of the
+normalized names of the authors and one of their ids, searched with bisect.
+Every author has two names in it, "last first" and "first last", so either
+name can be typed first.
+
+The index of a database is built from the authors table when it is first
+searched. After that it is changed in place: the signal handlers in
+catalog.signals add and remove the names of the authors saved and deleted
+by this process, and the authors updated by other processes are read again
+every CATALOG_AUTOCOMPLETE_SYNC_INTERVAL seconds (60 by default). Names of
+authors that were deleted or renamed elsewhere stay in the index, so the
+matches are read back from the database, which drops them, before they are
+returned.
+"""
+
+import bisect
+import threading
+import time
+import unicodedata
+from array import array
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Author
+
+# The number of matches returned per page
+RESULTS_LIMIT = 20
+
+# How often, in seconds, the authors changed by other processes are read
+DEFAULT_SYNC_INTERVAL = 60
+
+
+def sync_interval() -> int:
+    """Returns the number of seconds between two reads of the changed authors"""
+
+    return getattr(
+        settings, "CATALOG_AUTOCOMPLETE_SYNC_INTERVAL", DEFAULT_SYNC_INTERVAL
+    )
+
+
+def normalize(text: str) -> str:
+    """Returns the text in the form it is indexed and searched in
+
+    Case and accents are ignored and runs of whitespace count as one space.
+    """
+
+    text = text.casefold()
+    # Most names are ASCII, which has no accents to strip
+    if not text.isascii():
+        text = "".join(
+            char
+            for char in unicodedata.normalize("NFKD", text)
+            if not unicodedata.combining(char)
+        )
+    return " ".join(text.split())
+
+
+def name_keys(first_name: str, last_name: str) -> set:
+    """Returns the keys an author is found by"""
+
+    first_name, last_name = normalize(first_name), normalize(last_name)
+    return {f"{last_name} {first_name}".strip(), f"{first_name} {last_name}".strip()}
+
+
+class PrefixIndex:
+    """Sorted keys with the id each belongs to, searched by prefix
+
+    Equal keys are ordered by id. The ids are kept in a typed array, which
+    takes 8 bytes per entry instead of a pointer to an int object.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.ids = array("q")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def load(self, entries) -> None:
+        """Replaces the contents with the given (key, id) pairs"""
+
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.ids = array("q", (pk for _, pk in entries))
+
+    def _position(self, key: str, pk: int) -> int:
+        """Returns where the entry is, or would be inserted"""
+
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        return start + bisect.bisect_left(self.ids[start:end], pk)
+
+    def _contains_at(self, position: int, key: str, pk: int) -> bool:
+        return (
+            position < len(self.keys)
+            and self.keys[position] == key
+            and self.ids[position] == pk
+        )
+
+    def add(self, key: str, pk: int) -> None:
+        position = self._position(key, pk)
+        if not self._contains_at(position, key, pk):
+            self.keys.insert(position, key)
+            self.ids.insert(position, pk)
+
+    def remove(self, key: str, pk: int) -> None:
+        position = self._position(key, pk)
+        if self._contains_at(position, key, pk):
+            del self.keys[position]
+            del self.ids[position]
+
+    def search(self, prefix: str, limit: int, offset: int = 0) -> list:
+        """Returns the distinct ids of the keys starting with prefix, in key order
+
+        At most limit ids are returned, after skipping the first offset.
+        """
+
+        found = []
+        seen = set()
+        position = bisect.bisect_left(self.keys, prefix)
+        while (
+            position < len(self.keys)
+            and len(found) < limit
+            and self.keys[position].startswith(prefix)
+        ):
+            pk = self.ids[position]
+            position += 1
+            if pk in seen:
+                continue
+            seen.add(pk)
+            if len(seen) > offset:
+                found.append(pk)
+        return found
+
+
+class AuthorIndex:
+    """The author names of one database"""
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+        self.names = PrefixIndex()
+        self.built = False
+        self.synced_at = None
+        self.last_sync = 0.0
+        self.lock = threading.Lock()
+
+    def _authors(self):
+        return Author.objects.using(self.using).values_list(
+            "pk", "first_name", "last_name", "updated_at"
+        )
+
+    def _build(self) -> None:
+        entries = []
+        synced_at = None
+        for pk, first_name, last_name, updated_at in self._authors().iterator():
+            entries.extend((key, pk) for key in name_keys(first_name, last_name))
+            if updated_at is not None and (synced_at is None or updated_at > synced_at):
+                synced_at = updated_at
+        self.names.load(entries)
+        self.synced_at = synced_at
+        self.built = True
+
+    def _sync(self) -> None:
+        """Adds the current names of the authors updated since the last sync"""
+
+        authors = self._authors()
+        if self.synced_at is not None:
+            authors = authors.filter(updated_at__gte=self.synced_at)
+        for pk, first_name, last_name, updated_at in authors.iterator():
+            self._add(pk, first_name, last_name)
+            if updated_at is not None and (
+                self.synced_at is None or updated_at > self.synced_at
+            ):
+                self.synced_at = updated_at
+
+    def _add(self, pk: int, first_name: str, last_name: str) -> None:
+        for key in name_keys(first_name, last_name):
+            self.names.add(key, pk)
+
+    def search(self, query: str, limit: int = RESULTS_LIMIT, offset: int = 0) -> list:
+        """Returns the ids of the authors with a name starting with the query"""
+
+        with self.lock:
+            if not self.built:
+                self._build()
+                self.last_sync = time.monotonic()
+            elif time.monotonic() - self.last_sync >= sync_interval():
+                self._sync()
+                self.last_sync = time.monotonic()
+            return self.names.search(normalize(query), limit, offset)
+
+    def update(self, pk: int, old_names: tuple, new_names: tuple) -> None:
+        """Replaces the names of a saved author; None stands for no names"""
+
+        with self.lock:
+            if not self.built:
+                return
+            if old_names is not None:
+                for key in name_keys(*old_names):
+                    self.names.remove(key, pk)
+            if new_names is not None:
+                self._add(pk, *new_names)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def author_index(using: str = DEFAULT_DB_ALIAS) -> AuthorIndex:
+    """Returns the author index of the database"""
+
+    with _indexes_lock:
+        if using not in _indexes:
+            _indexes[using] = AuthorIndex(using)
+        return _indexes[using]
+
+
+def clear(using: str = None) -> None:
+    """Forgets the index of one database, or of all, so it is rebuilt when next searched"""
+
+    with _indexes_lock:
+        if using is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(using, None)
+
+
+def search_authors(
+    query: str, page: int = 1, limit: int = RESULTS_LIMIT, using=DEFAULT_DB_ALIAS
+) -> tuple:
+    """Returns the authors of a page of matches of the query, and whether more follow
+
+    The matches are read from the database in index order. Those that no
+    longer match, because they were renamed or deleted by another process,
+    are left out.
+    """
+
+    offset = (page - 1) * limit
+    ids = author_index(using).search(query, limit + 1, offset)
+    more = len(ids) > limit
+    ids = ids[:limit]
+
+    prefix = normalize(query)
+    authors = Author.objects.using(using).in_bulk(ids)
+    matches = [
+        authors[pk]
+        for pk in ids
+        if pk in authors
+        and any(
+            key.startswith(prefix)
+            for key in name_keys(authors[pk].first_name, authors[pk].last_name)
+        )
+    ]
+    return matches, more
@@ -0,0 +1,55 @@
+"""Caching of rendered page fragments
+
+The book and author detail pages cache the parts of the page built from the
+database with the {% cache %} template tag. Every fragment key contains the
+updated_at timestamp of the book or author it shows, so a fragment is never
+served after the object changed: the page simply asks for a new key.
+
+A book page also shows its author, language, genres and copies, an author
+page shows their books and the number of copies of each, and the loan lists
+show the title of the book of each copy. When one of those related objects
+changes, the signal handlers in catalog.signals call the functions below to
+move the updated_at of the affected books, authors and copies forward, which
+gives their pages new fragment keys. The update is a single UPDATE statement
+that bypasses save() and its signals.
+
+The same timestamps validate conditional GET requests (see catalog.conditional).
+The cache backend is chosen with the CATALOG_CACHE_BACKEND setting.
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Author, Book, BookInstance
+
+# Fragments change key whenever their data changes, so they can live long
+DEFAULT_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def fragment_cache_timeout() -> int:
+    """Returns the number of seconds a rendered fragment is kept in the cache"""
+
+    return getattr(
+        settings, "CATALOG_FRAGMENT_CACHE_TIMEOUT", DEFAULT_FRAGMENT_CACHE_TIMEOUT
+    )
+
+
+def touch_books(using: str = DEFAULT_DB_ALIAS, **filters) -> None:
+    """Marks the books matching the filters as updated, e.g. touch_books(genre=1)"""
+
+    Book.objects.using(using).filter(**filters).update(updated_at=timezone.now())
+
+
+def touch_authors(using: str = DEFAULT_DB_ALIAS, **filters) -> None:
+    """Marks the authors matching the filters as updated, e.g. touch_authors(pk=1)"""
+
+    Author.objects.using(using).filter(**filters).update(updated_at=timezone.now())
+
+
+def touch_copies(using: str = DEFAULT_DB_ALIAS, **filters) -> None:
+    """Marks the copies matching the filters as updated, e.g. touch_copies(book=1)"""
+
+    BookInstance.objects.using(using).filter(**filters).update(
+        updated_at=timezone.now()
+    )
@@ -0,0 +1,404 @@
+"""Circulation of book copies: lending, reserving, renewing, returning and holds
+
+Every change of a copy's loan state is a transition from one status to
+another, written as a conditional UPDATE ... WHERE id = ... AND status = ...
+that only sets the changed columns. The database applies it atomically, so
+when two librarians lend the same copy at the same time exactly one UPDATE
+matches the row and the other one changes nothing and is reported as failed,
+instead of silently overwriting the first loan as a save() of a stale copy
+would. A transition writes before it reads, so it never holds a read lock it
+then has to upgrade, which SQLite refuses under contention.
+
+The single copy transitions return None when the copy was changed, or the
+reason it was not. The bulk operations change many copies with one UPDATE
+... WHERE id IN (...) inside one transaction, after reading the current
+status of every copy with one SELECT, and map every requested id to its
+result.
+
+A copy that becomes available again is reserved for the next patron waiting
+in the hold queue of its book, in the same transaction.
+
+Queryset updates bypass save() and its signals, so the CatalogStats counters,
+the copy counters of the books and the updated_at timestamps of the affected
+book and author pages are maintained here instead.
+"""
+
+import datetime
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Book, BookInstance, CatalogStats, Hold
+
+ON_LOAN = "o"
+AVAILABLE = "a"
+RESERVED = "r"
+
+UNKNOWN_COPY = "Unknown copy"
+NOT_ON_LOAN = "Not on loan"
+NOT_AVAILABLE = "Not available"
+NOT_RESERVED = "Not reserved"
+HOLD_NOT_ACTIVE = "Not an active hold"
+HOLD_NOT_READY = "Not ready for pickup"
+
+HOLD_WAITING = "w"
+HOLD_READY = "r"
+HOLD_FULFILLED = "f"
+HOLD_CANCELLED = "c"
+
+# The reason a transition from each status fails on a copy in another status
+REFUSALS = {ON_LOAN: NOT_ON_LOAN, AVAILABLE: NOT_AVAILABLE, RESERVED: NOT_RESERVED}
+
+# The number of copies of a book tried by checkout_any before it gives up,
+# when other librarians keep lending them first
+CHECKOUT_ATTEMPTS = 5
+
+
+def _after_change(book_counts: dict, old_status: str, new_status: str, using):
+    """Refreshes the pages and counters affected by changed copies
+
+    book_counts maps the id of every affected book to its number of changed
+    copies.
+    """
+
+    book_ids = set(book_counts)
+
+    # Book pages list their copies, author pages count them
+    caching.touch_books(using, pk__in=book_ids)
+    caching.touch_authors(using, book__in=book_ids)
+
+    # The books with the same number of changed copies are updated together
+    books_by_count = defaultdict(list)
+    for book_id, count in book_counts.items():
+        if book_id is not None:
+            books_by_count[count].append(book_id)
+    for count, ids in books_by_count.items():
+        Book.objects.using(using).filter(pk__in=ids).move_copies(
+            old_status, new_status, count
+        )
+
+    available = (new_status == AVAILABLE) - (old_status == AVAILABLE)
+    CatalogStats.increment(
+        using, count_of_available_books=available * sum(book_counts.values())
+    )
+
+
+def _transition(copy_id, old_status: str, changes: dict, using: str = DEFAULT_DB_ALIAS):
+    """Applies the changes to the copy if it is in old_status
+
+    Returns None when the copy was changed, or the reason it was not.
+    """
+
+    new_status = changes.get("status", old_status)
+
+    with transaction.atomic(using=using):
+        copies = BookInstance.objects.using(using).filter(pk=copy_id)
+        changed = copies.filter(status__exact=old_status).update(
+            updated_at=timezone.now(), **changes
+        )
+        if not changed:
+            return REFUSALS[old_status] if copies.exists() else UNKNOWN_COPY
+
+        book_id = copies.values_list("book_id", flat=True).get()
+        _after_change({book_id: 1}, old_status, new_status, using)
+
+    return None
+
+
+def checkout(
+    copy_id,
+    borrower: User,
+    due_back: datetime.date,
+    reserved: bool = False,
+    using: str = DEFAULT_DB_ALIAS,
+):
+    """Lends an available copy, or a reserved one when reserved is True"""
+
+    return _transition(
+        copy_id,
+        RESERVED if reserved else AVAILABLE,
+        {"status": ON_LOAN, "borrower": borrower, "due_back": due_back},
+        using,
+    )
+
+
+def _take_any(book_id, old_status: str, changes: dict, using: str = DEFAULT_DB_ALIAS):
+    """Applies the changes to any copy of the book in old_status and returns its id
+
+    Returns None when no copy is in old_status. On databases that support it,
+    the copies other transactions are changing at the moment are skipped
+    instead of waited for, so concurrent requests for a popular book pick
+    different copies rather than queueing up behind the same one.
+    """
+
+    # Without row locks the candidate is read outside of the transaction, as
+    # SQLite cannot turn a transaction that has read into one that writes
+    # while another connection is writing
+    locking = connections[using].features.has_select_for_update_skip_locked
+
+    for _ in range(CHECKOUT_ATTEMPTS):
+        with transaction.atomic(using=using) if locking else nullcontext():
+            copy_id = (
+                BookInstance.objects.using(using)
+                .select_for_update(skip_locked=True)
+                .filter(book=book_id, status__exact=old_status)
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if copy_id is None:
+                return None
+            if _transition(copy_id, old_status, changes, using) is None:
+                return copy_id
+
+    return None
+
+
+def checkout_any(
+    book_id, borrower: User, due_back: datetime.date, using: str = DEFAULT_DB_ALIAS
+):
+    """Lends any available copy of the book and returns its id, or None"""
+
+    return _take_any(
+        book_id,
+        AVAILABLE,
+        {"status": ON_LOAN, "borrower": borrower, "due_back": due_back},
+        using,
+    )
+
+
+def reserve(copy_id, using: str = DEFAULT_DB_ALIAS):
+    """Puts an available copy aside for a reader"""
+
+    return _transition(copy_id, AVAILABLE, {"status": RESERVED}, using)
+
+
+def release(copy_id, using: str = DEFAULT_DB_ALIAS):
+    """Makes a reserved copy available again, or reserves it for the next hold"""
+
+    with transaction.atomic(using=using):
+        error = _transition(copy_id, RESERVED, {"status": AVAILABLE}, using)
+        if error is None:
+            _serve_holds([copy_id], using)
+
+    return error
+
+
+def renew_copy(copy_id, renewal_date: datetime.date, using: str = DEFAULT_DB_ALIAS):
+    """Moves the due date of a copy on loan to renewal_date
+
+    The date is expected to be validated already, e.g. by RenewBookForm.
+    """
+
+    return _transition(copy_id, ON_LOAN, {"due_back": renewal_date}, using)
+
+
+def return_copy(copy_id, using: str = DEFAULT_DB_ALIAS):
+    """Marks a copy on loan as returned and available again
+
+    The returned copy is reserved for the next hold of its book, if any, in
+    the same transaction.
+    """
+
+    with transaction.atomic(using=using):
+        error = _transition(
+            copy_id,
+            ON_LOAN,
+            {"status": AVAILABLE, "due_back": None, "borrower": None},
+            using,
+        )
+        if error is None:
+            _serve_holds([copy_id], using)
+
+    return error
+
+
+def _apply(copy_ids, changes: dict, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """Applies the changes to the copies of the ids that are on loan
+
+    Returns the result of every id, in the order of copy_ids.
+    """
+
+    copy_ids = list(dict.fromkeys(copy_ids))
+
+    with transaction.atomic(using=using):
+        copies = {
+            pk: (status, book_id)
+            for pk, status, book_id in BookInstance.objects.using(using)
+            .select_for_update()
+            .filter(pk__in=copy_ids)
+            .values_list("pk", "status", "book_id")
+        }
+
+        results = {}
+        for pk in copy_ids:
+            if pk not in copies:
+                results[pk] = UNKNOWN_COPY
+            elif copies[pk][0] != ON_LOAN:
+                results[pk] = NOT_ON_LOAN
+            else:
+                results[pk] = None
+
+        changed = [pk for pk, error in results.items() if error is None]
+        if changed:
+            # The status condition repeats the check for databases that
+            # cannot lock the rows read above
+            count = (
+                BookInstance.objects.using(using)
+                .filter(pk__in=changed, status__exact=ON_LOAN)
+                .update(updated_at=timezone.now(), **changes)
+            )
+
+            new_status = changes.get("status", ON_LOAN)
+            book_counts = Counter(copies[pk][1] for pk in changed)
+            if count == len(changed):
+                _after_change(book_counts, ON_LOAN, new_status, using)
+            else:
+                # Without row locks another transaction changed some of the
+                # copies first, and which ones is not known, so their books
+                # are recounted
+                _after_change(dict.fromkeys(book_counts, 0), ON_LOAN, new_status, using)
+                Book.objects.using(using).filter(pk__in=book_counts).recount_copies()
+                CatalogStats.increment(
+                    using,
+                    count_of_available_books=(new_status == AVAILABLE) * count,
+                )
+
+    return results
+
+
+def renew(copy_ids, renewal_date: datetime.date, using=DEFAULT_DB_ALIAS) -> dict:
+    """Moves the due date of the given copies on loan to renewal_date
+
+    The date is expected to be validated already, e.g. by RenewBookForm.
+    """
+
+    return _apply(copy_ids, {"due_back": renewal_date}, using)
+
+
+def return_copies(copy_ids, using=DEFAULT_DB_ALIAS) -> dict:
+    """Marks the given copies on loan as returned and available again
+
+    The returned copies are reserved for the next holds of their books, if
+    any, in the same transaction.
+    """
+
+    with transaction.atomic(using=using):
+        results = _apply(
+            copy_ids, {"status": AVAILABLE, "due_back": None, "borrower": None}, using
+        )
+        _serve_holds([pk for pk, error in results.items() if error is None], using)
+
+    return results
+
+
+def _claim_hold(hold_id, copy_id, using: str) -> bool:
+    """Assigns the copy to the hold if it is still waiting"""
+
+    return bool(
+        Hold.objects.using(using)
+        .filter(pk=hold_id, status__exact=HOLD_WAITING)
+        .update(status=HOLD_READY, copy=copy_id, ready_at=timezone.now())
+    )
+
+
+def _serve_holds(copy_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Reserves the given available copies for the next waiting holds of their books
+
+    Copies of books nobody is waiting for stay available. Each hold is
+    claimed with a conditional UPDATE, so a hold is never given two copies
+    by concurrent returns; the loser of the race moves on to the next hold.
+    """
+
+    if not copy_ids:
+        return
+
+    copies = (
+        BookInstance.objects.using(using)
+        .filter(pk__in=copy_ids, status__exact=AVAILABLE)
+        .values_list("pk", "book_id")
+    )
+    for copy_id, book_id in copies:
+        hold = Hold.objects.using(using).next_for(book_id)
+        if hold is None:
+            continue
+        if _transition(copy_id, AVAILABLE, {"status": RESERVED}, using) is not None:
+            continue
+
+        while hold is not None and not _claim_hold(hold.pk, copy_id, using):
+            hold = Hold.objects.using(using).next_for(book_id)
+        if hold is None:
+            _transition(copy_id, RESERVED, {"status": AVAILABLE}, using)
+
+
+def place_hold(book_id, patron: User, using: str = DEFAULT_DB_ALIAS) -> Hold:
+    """Puts the patron at the end of the queue of the book and returns the hold
+
+    A patron has at most one active hold per book, which is returned if it
+    exists. When a copy is available, it is reserved for the next hold at once.
+    """
+
+    holds = Hold.objects.using(using)
+    with transaction.atomic(using=using):
+        try:
+            with transaction.atomic(using=using):
+                hold = holds.create(book_id=book_id, patron=patron)
+        except IntegrityError:
+            return holds.active().get(book=book_id, patron=patron)
+
+        available = (
+            BookInstance.objects.using(using)
+            .filter(book=book_id, status__exact=AVAILABLE)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if available is not None:
+            _serve_holds([available], using)
+            hold.refresh_from_db()
+
+    return hold
+
+
+def cancel_hold(hold_id, using: str = DEFAULT_DB_ALIAS):
+    """Cancels a waiting or ready hold
+
+    The copy reserved for a ready hold goes to the next hold of its book.
+    Returns None when the hold was cancelled, or the reason it was not.
+    """
+
+    holds = Hold.objects.using(using).filter(pk=hold_id)
+    with transaction.atomic(using=using):
+        if holds.filter(status__exact=HOLD_WAITING).update(status=HOLD_CANCELLED):
+            return None
+        if not holds.filter(status__exact=HOLD_READY).update(status=HOLD_CANCELLED):
+            return HOLD_NOT_ACTIVE
+
+        copy_id = holds.values_list("copy_id", flat=True).get()
+        if copy_id is not None:
+            release(copy_id, using)
+
+    return None
+
+
+def fulfil_hold(hold_id, due_back: datetime.date, using: str = DEFAULT_DB_ALIAS):
+    """Lends the copy reserved for a ready hold to its patron
+
+    Returns None when the copy was lent, or the reason it was not.
+    """
+
+    holds = Hold.objects.using(using).filter(pk=hold_id)
+    with transaction.atomic(using=using):
+        if not holds.filter(status__exact=HOLD_READY).update(status=HOLD_FULFILLED):
+            return HOLD_NOT_READY
+
+        hold = holds.select_related("patron").get()
+        error = checkout(
+            hold.copy_id, hold.patron, due_back, reserved=True, using=using
+        )
+        if error is not None:
+            transaction.set_rollback(True, using=using)
+
+    return error
@@ -0,0 +1,92 @@
+"""Conditional GET support for catalog views
+
+Browsers and proxies that already hold a copy of a page send its ETag and
+Last-Modified back in If-None-Match and If-Modified-Since. The mixins below
+compute those validators from the updated_at timestamps of the objects a page
+shows, using one query over the primary keys and timestamps only, and answer
+with 304 Not Modified before the page is loaded or rendered when nothing
+changed.
+
+The signal handlers in catalog.signals move updated_at forward when related
+objects shown on a page change, so the timestamp of the listed objects is
+enough to tell whether a page is still current.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """Answers GET requests with 304 Not Modified when the shown objects did not change
+
+    Views implement get_validator_rows() returning (pk, updated_at) pairs for
+    the objects shown on the page.
+    """
+
+    # Views whose content depends on more than their rows (e.g. on today's
+    # date) can turn off Last-Modified and rely on the ETag only
+    use_last_modified = True
+
+    def get_validator_rows(self) -> list:
+        raise NotImplementedError(
+            "ConditionalGetMixin requires an implementation of get_validator_rows()"
+        )
+
+    def get_etag_extra(self) -> list:
+        """Returns values other than the rows that the page depends on
+
+        The sidebar shows who is logged in, so the user is always part of it.
+        """
+
+        return [self.request.user.pk]
+
+    def get_validators(self) -> tuple:
+        """Returns the ETag and the Last-Modified timestamp of the page"""
+
+        rows = self.get_validator_rows()
+        parts = [f"{pk}:{updated_at}" for pk, updated_at in rows]
+        parts += [str(value) for value in self.get_etag_extra()]
+
+        etag = quote_etag(hashlib.md5("|".join(parts).encode()).hexdigest())
+
+        last_modified = None
+        if self.use_last_modified:
+            timestamps = [updated_at for _, updated_at in rows if updated_at]
+            if timestamps:
+                last_modified = int(max(timestamps).timestamp())
+
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if request.method in ("GET", "HEAD"):
+            if not response.has_header("ETag"):
+                response["ETag"] = etag
+            if last_modified and not response.has_header("Last-Modified"):
+                response["Last-Modified"] = http_date(last_modified)
+
+        return response
+
+
+class ConditionalDetailMixin(ConditionalGetMixin):
+    """Conditional GET for a DetailView, validated by the updated_at of its object"""
+
+    def get_validator_rows(self) -> list:
+        queryset = self.get_queryset().filter(pk=self.kwargs[self.pk_url_kwarg])
+        return list(queryset.order_by().values_list("pk", "updated_at"))
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """Conditional GET for a keyset paginated ListView, validated by the rows of the page"""
+
+    def get_validator_rows(self) -> list:
+        return self.get_page_values("pk", "updated_at")
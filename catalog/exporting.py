@@ -0,0 +1,166 @@
+"""Streaming export of the catalog and its circulation state
+
+Every resource is read with values_list() and QuerySet.iterator(), so rows
+are fetched from the database in chunks (through a server-side cursor on
+PostgreSQL) and no model instances are built. The rows are encoded one at a
+time as CSV or newline-delimited JSON, which keeps memory use flat no matter
+how large the catalog is.
+
+The book export uses the record format of catalog.importing, so a dump can be
+loaded into another database with the import_catalog command.
+"""
+
+import csv
+import itertools
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .api import dump_json
+from .importing import CSV_FORMAT, CSV_GENRE_SEPARATOR, NDJSON_FORMAT
+from .models import Author, Book, BookInstance
+
+# Number of rows fetched from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {CSV_FORMAT: "text/csv", NDJSON_FORMAT: "application/x-ndjson"}
+
+
+class ExportResource:
+    """A table of the export
+
+    Subclasses set model and fields, a mapping from the column name of each
+    field to the lookup it is read with.
+    """
+
+    name = None
+    model = None
+    fields = {}
+
+    def get_queryset(self, using: str):
+        return self.model.objects.using(using).order_by("pk")
+
+    def rows(self, using: str = DEFAULT_DB_ALIAS, chunk_size: int = EXPORT_CHUNK_SIZE):
+        """Yields the rows of the resource as tuples in the order of fields"""
+
+        queryset = self.get_queryset(using).values_list(*self.fields.values())
+        return queryset.iterator(chunk_size=chunk_size)
+
+
+class AuthorExport(ExportResource):
+    name = "authors"
+    model = Author
+    fields = {
+        "id": "id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "date_of_birth": "date_of_birth",
+        "date_of_death": "date_of_death",
+        "updated_at": "updated_at",
+    }
+
+
+class BookExport(ExportResource):
+    """The books with the names of their author, language and genres"""
+
+    name = "books"
+    model = Book
+    fields = {
+        "id": "id",
+        "isbn": "isbn",
+        "title": "title",
+        "summary": "summary",
+        "author_id": "author_id",
+        "author_first_name": "author__first_name",
+        "author_last_name": "author__last_name",
+        "language": "language__language",
+        "genres": "genre__name",
+        "updated_at": "updated_at",
+    }
+
+    def rows(self, using: str = DEFAULT_DB_ALIAS, chunk_size: int = EXPORT_CHUNK_SIZE):
+        """Yields one row per book with the list of its genre names
+
+        The genres are joined in, so the query returns one row per book and
+        genre. The rows of a book are consecutive because they are ordered by
+        book, and are merged here without holding more than one book.
+        """
+
+        genres_index = list(self.fields).index("genres")
+        rows = super().rows(using, chunk_size)
+
+        for book, genre_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            genre_rows = list(genre_rows)
+            row = list(genre_rows[0])
+            row[genres_index] = [
+                genre_row[genres_index]
+                for genre_row in genre_rows
+                if genre_row[genres_index] is not None
+            ]
+            yield tuple(row)
+
+
+class BookInstanceExport(ExportResource):
+    """The copies of the books with their loan status and borrower"""
+
+    name = "copies"
+    model = BookInstance
+    fields = {
+        "id": "id",
+        "book_id": "book_id",
+        "isbn": "book__isbn",
+        "imprint": "imprint",
+        "status": "status",
+        "due_back": "due_back",
+        "borrower": "borrower__username",
+        "updated_at": "updated_at",
+    }
+
+
+RESOURCES = {
+    resource.name: resource
+    for resource in (AuthorExport(), BookExport(), BookInstanceExport())
+}
+
+
+class _Echo:
+    """A file-like object whose write() returns the written line"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def encode_csv(columns, rows):
+    """Yields a header line and one CSV line per row"""
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+
+    for row in rows:
+        yield writer.writerow(
+            CSV_GENRE_SEPARATOR.join(value) if isinstance(value, list) else value
+            for value in row
+        )
+
+
+def encode_ndjson(columns, rows):
+    """Yields one JSON object per row, each on its own line"""
+
+    for row in rows:
+        yield dump_json(dict(zip(columns, row))) + "\n"
+
+
+ENCODERS = {CSV_FORMAT: encode_csv, NDJSON_FORMAT: encode_ndjson}
+
+
+def export_lines(
+    resource: str,
+    file_format: str,
+    using: str = DEFAULT_DB_ALIAS,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+):
+    """Yields the lines of the export of a resource in the given format"""
+
+    resource = RESOURCES[resource]
+    return ENCODERS[file_format](
+        list(resource.fields), resource.rows(using, chunk_size)
+    )
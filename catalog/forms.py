@@ -1,8 +1,15 @@
 import datetime
+import re
+import uuid
 from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.core.exceptions import ValidationError
+from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
+from .models import Book
+
 
 class RenewBookForm(forms.Form):
     """A form in which books can be renewed."""
@@ -26,3 +33,91 @@ class RenewBookForm(forms.Form):
 
         # Remember to always return the cleaned data.
         return data
+
+
+class BulkCirculationForm(RenewBookForm):
+    """A form in which many copies are renewed or returned at once."""
+
+    RENEW = "renew"
+    RETURN = "return"
+
+    action = forms.ChoiceField(choices=((RENEW, "Renew"), (RETURN, "Return")))
+    copies = forms.CharField(
+        widget=forms.Textarea,
+        help_text="Scan or paste the ids of the copies, one per line.",
+    )
+
+    field_order = ["action", "copies", "renewal_date"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Returned copies have no due date
+        self.fields["renewal_date"].required = False
+
+    def clean_copies(self) -> list:
+        """This method checks that every copy id is a valid id and drops duplicates."""
+
+        copy_ids = []
+        invalid = []
+        for value in re.split(r"[\s,]+", self.cleaned_data["copies"]):
+            if not value:
+                continue
+            try:
+                copy_ids.append(uuid.UUID(value))
+            except ValueError:
+                invalid.append(value)
+
+        if invalid:
+            raise ValidationError(
+                _("Invalid copy ids: %(ids)s"), params={"ids": ", ".join(invalid)}
+            )
+        if not copy_ids:
+            raise ValidationError(_("Enter at least one copy id"))
+
+        return list(dict.fromkeys(copy_ids))
+
+    def clean_renewal_date(self):
+        """The renewal date is only checked when one is given."""
+
+        if self.cleaned_data["renewal_date"] is None:
+            return None
+        return super().clean_renewal_date()
+
+    def clean(self) -> dict:
+        cleaned_data = super().clean()
+
+        if (
+            cleaned_data.get("action") == self.RENEW
+            and "renewal_date" in cleaned_data
+            and cleaned_data["renewal_date"] is None
+        ):
+            self.add_error("renewal_date", _("Enter the date to renew the copies to"))
+
+        return cleaned_data
+
+
+class AuthorAutocompleteSelect(AutocompleteSelect):
+    """A select of the author that fetches the authors matching what is typed
+
+    It is the autocomplete widget of the admin, asking the author-autocomplete
+    view (see catalog.autocomplete) instead of the admin's own, so only the
+    selected author is rendered with the form, in the admin and elsewhere.
+    """
+
+    def __init__(self, field=None, admin_site=None, **kwargs):
+        super().__init__(
+            field or Book._meta.get_field("author"), admin_site or admin.site, **kwargs
+        )
+
+    def get_url(self) -> str:
+        return reverse("author-autocomplete")
+
+
+class BookForm(forms.ModelForm):
+    """A form in which librarians create and edit books."""
+
+    class Meta:
+        model = Book
+        fields = ["title", "author", "summary", "isbn", "genre", "language"]
+        widgets = {"author": AuthorAutocompleteSelect}
@@ -0,0 +1,472 @@
+"""Bulk import of catalog records
+
+Records are read from CSV or newline-delimited JSON files, one book per
+record, and written in batches: one multi-row INSERT per table per batch
+instead of one INSERT (plus signal handlers) per object. Authors,
+genres and languages are looked up by name once and their ids are cached
+in memory for the rest of the import.
+
+A record has the following keys; only isbn and title are required:
+
+    isbn, title, summary
+    author_first_name, author_last_name
+    language
+    genres      names separated by "|", or a list in NDJSON
+    copies      number of copies to create (default 0)
+    imprint     imprint of the copies
+    status      loan status of the copies (default "a", available)
+
+Records with a missing ISBN or title, a value longer than its column, a
+number of copies that is not a whole number, an unknown status or a line
+that is not valid JSON are counted as invalid and left out. Books are identified by ISBN. Records whose ISBN already exists are
+skipped together with their copies, so an interrupted import can simply be
+run again. Bulk inserts bypass the signal handlers that maintain the
+CatalogStats counters and the search index, so at the end the counters are
+rebuilt and the imported books are indexed.
+The copy counters of the books are written with the books, as every copy
+of a new book comes from its own record.
+"""
+
+import csv
+import json
+import time
+import uuid
+from array import array
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import search
+from .models import (
+    COPY_COUNTERS,
+    COPY_STATUS_COUNTERS,
+    Author,
+    Book,
+    BookInstance,
+    CatalogStats,
+    Genre,
+    Language,
+)
+
+DEFAULT_BATCH_SIZE = 5000
+
+CSV_FORMAT = "csv"
+NDJSON_FORMAT = "ndjson"
+
+# Separates genre names in the genres column of a CSV file
+CSV_GENRE_SEPARATOR = "|"
+
+DEFAULT_COPY_STATUS = "a"
+
+
+def read_csv(file):
+    """Yields the records of a CSV file with a header row"""
+
+    for row in csv.DictReader(file):
+        genres = row.get("genres") or ""
+        row["genres"] = [
+            name for name in genres.split(CSV_GENRE_SEPARATOR) if name.strip()
+        ]
+        yield row
+
+
+def read_ndjson(file):
+    """Yields the records of a file with one JSON object per line
+
+    Lines that are not valid JSON are yielded as None, which the importer
+    counts as an invalid record.
+    """
+
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+READERS = {CSV_FORMAT: read_csv, NDJSON_FORMAT: read_ndjson}
+
+
+def insert_rows(
+    model, columns, rows, using=DEFAULT_DB_ALIAS, page_size=DEFAULT_BATCH_SIZE
+) -> None:
+    """Inserts rows of values already in database form into the table of a model
+
+    bulk_create() builds a model instance and prepares every value of every
+    row through its field, which costs more than the insert itself. Rows of
+    plain values are handed to the database driver directly instead, with
+    one multi-row statement per page on PostgreSQL.
+    """
+
+    if not rows:
+        return
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES {}".format(
+        quote_name(model._meta.db_table),
+        ", ".join(quote_name(column) for column in columns),
+        (
+            "%s"
+            if connection.vendor == "postgresql"
+            else "({})".format(", ".join(["%s"] * len(columns)))
+        ),
+    )
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            from psycopg2.extras import execute_values
+
+            execute_values(cursor.cursor, sql, rows, page_size=page_size)
+        else:
+            cursor.executemany(sql, rows)
+
+
+def _fits(model, field: str, value: str) -> bool:
+    """Tells whether a cleaned value fits in a column of a model"""
+
+    return len(value) <= model._meta.get_field(field).max_length
+
+
+def _is_valid(record) -> bool:
+    """Tells whether a record can be imported, normalizing its copies, status and genres
+
+    Values longer than their column are rejected here, as only some
+    databases would refuse them, and then abort the whole batch.
+    """
+
+    if not isinstance(record, dict):
+        return False
+
+    isbn, title = _clean(record.get("isbn")), _clean(record.get("title"))
+    if not isbn or not _fits(Book, "isbn", isbn):
+        return False
+    if not title or not _fits(Book, "title", title):
+        return False
+
+    if not (
+        _fits(Author, "first_name", _clean(record.get("author_first_name")))
+        and _fits(Author, "last_name", _clean(record.get("author_last_name")))
+        and _fits(Language, "language", _clean(record.get("language")))
+        and _fits(BookInstance, "imprint", _clean(record.get("imprint")))
+    ):
+        return False
+
+    # NDJSON records may also give the genres as one string, like CSV files
+    genres = record.get("genres") or []
+    if isinstance(genres, str):
+        genres = genres.split(CSV_GENRE_SEPARATOR)
+    if not isinstance(genres, list):
+        return False
+    genres = [_clean(name) for name in genres if _clean(name)]
+    if not all(_fits(Genre, "name", name) for name in genres):
+        return False
+
+    copies = record.get("copies") or 0
+    try:
+        copies = int(str(copies).strip() or 0)
+    except ValueError:
+        return False
+    if copies < 0:
+        return False
+
+    status = _clean(record.get("status")) or DEFAULT_COPY_STATUS
+    if status not in dict(BookInstance.LOAN_STATUS):
+        return False
+
+    record["copies"], record["status"], record["genres"] = copies, status, genres
+    return True
+
+
+def _copy_counts(record) -> tuple:
+    """Returns the copy counters of the book of a record, in the order of COPY_COUNTERS"""
+
+    copies = record["copies"]
+    status = record["status"]
+    counts = dict.fromkeys(COPY_COUNTERS, 0)
+    counts["count_of_bookinstances"] = copies
+    if status in COPY_STATUS_COUNTERS:
+        counts[COPY_STATUS_COUNTERS[status]] = copies
+    return tuple(counts.values())
+
+
+def _clean(value) -> str:
+    """Returns a value of a record as a stripped string; NDJSON values may be numbers"""
+
+    return ("" if value is None else str(value)).strip()
+
+
+class CatalogImporter:
+    """Imports book records into the catalog in batches
+
+    The ids of authors, genres and languages seen so far are kept in memory,
+    so each name is looked up or created only once per import.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.using = using
+
+        self.author_ids = {}
+        self.genre_ids = {}
+        self.language_ids = {}
+
+        # The ids of the books created so far, indexed for search by finish()
+        self.book_ids = array("q")
+
+        self.counts = Counter()
+        self.started = None
+
+    @property
+    def elapsed(self) -> float:
+        """Number of seconds since the import started"""
+
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        """Number of records processed per second since the import started"""
+
+        elapsed = self.elapsed
+        return self.counts["records"] / elapsed if elapsed else 0.0
+
+    def import_records(self, records, progress=None) -> Counter:
+        """Imports every record and returns the number of rows read and created
+
+        progress is called with the importer after every batch.
+        """
+
+        self.started = time.monotonic()
+        batch = []
+
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress:
+                    progress(self)
+
+        if batch:
+            self.import_batch(batch)
+            if progress:
+                progress(self)
+
+        return self.counts
+
+    def finish(self) -> None:
+        """Rebuilds the denormalized data that bulk inserts do not maintain"""
+
+        CatalogStats.rebuild(using=self.using)
+        for start in range(0, len(self.book_ids), self.batch_size):
+            search.index_books(
+                self.book_ids[start : start + self.batch_size], self.using
+            )
+
+    def import_batch(self, records) -> None:
+        """Imports a batch of records in one transaction"""
+
+        self.counts["records"] += len(records)
+
+        valid_records = [record for record in records if _is_valid(record)]
+        self.counts["invalid"] += len(records) - len(valid_records)
+        records = valid_records
+
+        with transaction.atomic(using=self.using):
+            new_records = self._new_books(records)
+            if not new_records:
+                return
+
+            self._cache_authors(new_records)
+            self._cache_names(
+                self.genre_ids,
+                Genre,
+                "name",
+                {_clean(name) for record in new_records for name in record["genres"]},
+            )
+            self._cache_names(
+                self.language_ids,
+                Language,
+                "language",
+                {_clean(record.get("language")) for record in new_records} - {""},
+            )
+
+            book_ids = self._create_books(new_records)
+            self._create_genre_links(new_records, book_ids)
+            self._create_copies(new_records, book_ids)
+            self.book_ids.extend(book_ids.values())
+
+    def _new_books(self, records) -> list:
+        """Returns the records whose ISBN is neither in the database nor earlier in the batch"""
+
+        isbns = {_clean(record["isbn"]) for record in records}
+        seen = set(
+            Book.objects.using(self.using)
+            .filter(isbn__in=isbns)
+            .values_list("isbn", flat=True)
+        )
+
+        new_records = []
+        for record in records:
+            isbn = _clean(record["isbn"])
+            if isbn in seen:
+                self.counts["skipped"] += 1
+                continue
+            seen.add(isbn)
+            new_records.append(record)
+
+        return new_records
+
+    def _cache_authors(self, records) -> None:
+        """Stores the ids of the authors of the records, creating the missing ones"""
+
+        keys = {
+            (
+                _clean(record.get("author_first_name")),
+                _clean(record.get("author_last_name")),
+            )
+            for record in records
+        }
+        missing = {key for key in keys if key not in self.author_ids and any(key)}
+        if not missing:
+            return
+
+        def lookup():
+            last_names = {last_name for _, last_name in missing}
+            rows = (
+                Author.objects.using(self.using)
+                .filter(last_name__in=last_names)
+                .values_list("first_name", "last_name", "id")
+            )
+            for first_name, last_name, author_id in rows:
+                if (first_name, last_name) in missing:
+                    self.author_ids[(first_name, last_name)] = author_id
+
+        lookup()
+        to_create = [key for key in missing if key not in self.author_ids]
+        if to_create:
+            Author.objects.using(self.using).bulk_create(
+                [
+                    Author(first_name=first_name, last_name=last_name)
+                    for first_name, last_name in to_create
+                ],
+                batch_size=self.batch_size,
+            )
+            self.counts["authors"] += len(to_create)
+            lookup()
+
+    def _cache_names(self, cache: dict, model, field: str, names) -> None:
+        """Stores the ids of genres or languages by name, creating the missing ones"""
+
+        missing = {name for name in names if name not in cache}
+        if not missing:
+            return
+
+        def lookup():
+            rows = (
+                model.objects.using(self.using)
+                .filter(**{f"{field}__in": missing})
+                .values_list(field, "id")
+            )
+            cache.update(rows)
+
+        lookup()
+        to_create = [name for name in missing if name not in cache]
+        if to_create:
+            model.objects.using(self.using).bulk_create(
+                [model(**{field: name}) for name in to_create]
+            )
+            self.counts[model._meta.verbose_name_plural] += len(to_create)
+            lookup()
+
+    def _insert(self, model, columns, rows) -> None:
+        insert_rows(model, columns, rows, self.using, self.batch_size)
+
+    def _timestamp(self):
+        """Returns the current time as the created_at and updated_at database value"""
+
+        connection = connections[self.using]
+        return connection.ops.adapt_datetimefield_value(timezone.now())
+
+    def _create_books(self, records) -> dict:
+        """Creates the books of the records and returns their ids by ISBN"""
+
+        now = self._timestamp()
+        rows = []
+        for record in records:
+            author_key = (
+                _clean(record.get("author_first_name")),
+                _clean(record.get("author_last_name")),
+            )
+            rows.append(
+                (
+                    now,
+                    now,
+                    _clean(record["title"]),
+                    self.author_ids.get(author_key),
+                    _clean(record.get("summary")),
+                    _clean(record["isbn"]),
+                    self.language_ids.get(_clean(record.get("language"))),
+                )
+                + _copy_counts(record)
+            )
+
+        self._insert(
+            Book,
+            (
+                "created_at",
+                "updated_at",
+                "title",
+                "author_id",
+                "summary",
+                "isbn",
+                "language_id",
+            )
+            + COPY_COUNTERS,
+            rows,
+        )
+        self.counts["books"] += len(rows)
+
+        # Not every backend returns the ids of inserted rows, so they are read back
+        return dict(
+            Book.objects.using(self.using)
+            .filter(isbn__in=[row[5] for row in rows])
+            .values_list("isbn", "id")
+        )
+
+    def _create_genre_links(self, records, book_ids: dict) -> None:
+        """Inserts the rows of the book to genre table directly"""
+
+        links = {
+            (book_ids[_clean(record["isbn"])], self.genre_ids[_clean(name)])
+            for record in records
+            for name in record["genres"]
+            if _clean(name)
+        }
+        self._insert(Book.genre.through, ("book_id", "genre_id"), list(links))
+
+    def _create_copies(self, records, book_ids: dict) -> None:
+        """Creates the copies of the new books"""
+
+        connection = connections[self.using]
+        id_field = BookInstance._meta.pk
+        now = self._timestamp()
+
+        rows = []
+        for record in records:
+            book_id = book_ids[_clean(record["isbn"])]
+            imprint = _clean(record.get("imprint"))
+            status = record["status"]
+
+            for _ in range(record["copies"]):
+                copy_id = id_field.get_db_prep_value(uuid.uuid4(), connection)
+                rows.append((copy_id, now, now, book_id, imprint, status))
+
+        self._insert(
+            BookInstance,
+            ("id", "created_at", "updated_at", "book_id", "imprint", "status"),
+            rows,
+        )
+        self.counts["copies"] += len(rows)
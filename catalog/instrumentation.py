@@ -0,0 +1,262 @@
+"""Per-request query and timing instrumentation
+
+RequestTimingMiddleware measures every request: the number of SQL queries,
+the time spent running them, the time spent rendering templates and the
+wall time of everything below the middleware. The measurements are kept by
+the name of the URL the request resolved to, for the most recent WINDOW
+requests of each name, in the memory of the process. Staff see their
+percentiles and a histogram of the wall time at /catalog/timings/.
+
+The queries are timed by an execute wrapper (see connection.execute_wrapper)
+that is installed on every database connection when it is opened, and the
+templates by the DjangoTemplates backend of this module, as Django only
+sends its template_rendered signal under the test runner. Both record into
+the measurement of the current request, found through a context variable,
+so queries run on other threads by sync_to_async, like the concurrent
+dashboard queries (see catalog.aggregates), are counted as well. Outside of
+a measured request they only look the variable up.
+
+The instrumentation is turned on with the CATALOG_REQUEST_TIMINGS setting;
+otherwise the middleware removes itself from the stack. With
+CATALOG_REQUEST_TIMINGS_HEADER the measurements of each response are also
+sent in a Server-Timing header, which browser developer tools display.
+The time taken to stream a StreamingHttpResponse is not included.
+"""
+
+import asyncio
+import contextvars
+import math
+import statistics
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+# The number of most recent requests of each URL name that are kept
+WINDOW = 1000
+
+# The upper bounds in ms of the buckets of the wall time histogram
+HISTOGRAM_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# The name requests that did not resolve to a URL are kept under
+UNRESOLVED = "(unresolved)"
+
+METRICS = ("queries", "sql_ms", "template_ms", "total_ms")
+
+_current = contextvars.ContextVar("catalog_request_timing", default=None)
+
+
+def timings_enabled() -> bool:
+    """Returns whether requests are measured"""
+
+    return getattr(settings, "CATALOG_REQUEST_TIMINGS", False)
+
+
+def timings_header_enabled() -> bool:
+    """Returns whether responses carry their measurements in a header"""
+
+    return getattr(settings, "CATALOG_REQUEST_TIMINGS_HEADER", False)
+
+
+def percentile(values: list, rank: int) -> float:
+    """Returns the nearest-rank percentile of the sorted values"""
+
+    return values[max(math.ceil(len(values) * rank / 100), 1) - 1]
+
+
+class RequestTiming:
+    """The measurements of one request, in seconds"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        # Concurrent queries record from several threads at once
+        self.lock = threading.Lock()
+
+    def add_query(self, elapsed: float) -> None:
+        with self.lock:
+            self.queries += 1
+            self.sql_time += elapsed
+
+
+class TimingWindows:
+    """The measurements of the most recent requests, by URL name"""
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.samples = {}
+            self.counts = {}
+
+    def add(self, name: str, sample: tuple) -> None:
+        """Keeps the measurements of a request, in the order of METRICS"""
+
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.counts[name] = 0
+            self.samples[name].append(sample)
+            self.counts[name] += 1
+
+    def summary(self) -> dict:
+        """Returns the statistics of every URL name"""
+
+        with self.lock:
+            snapshot = {name: list(samples) for name, samples in self.samples.items()}
+            counts = dict(self.counts)
+
+        summary = {}
+        for name, samples in sorted(snapshot.items()):
+            route = {"requests": counts[name], "window": len(samples)}
+            for index, metric in enumerate(METRICS):
+                values = sorted(sample[index] for sample in samples)
+                route[metric] = {
+                    "mean": statistics.mean(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                    "max": values[-1],
+                }
+            route["histogram"] = histogram(sample[-1] for sample in samples)
+            summary[name] = route
+        return summary
+
+
+def histogram(values) -> dict:
+    """Returns the number of values in each bucket of HISTOGRAM_BOUNDS"""
+
+    labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS]
+    labels.append(f">{HISTOGRAM_BOUNDS[-1]}")
+    counts = [0] * len(labels)
+    for value in values:
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS) and value > HISTOGRAM_BOUNDS[index]:
+            index += 1
+        counts[index] += 1
+    return dict(zip(labels, counts))
+
+
+windows = TimingWindows()
+
+
+def record_query(execute, sql, params, many, context):
+    """Times a query for the current request, if it is measured"""
+
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs) -> None:
+    """Installs record_query on a new database connection"""
+
+    # It goes first, so that the execute_wrapper() blocks in progress still
+    # remove their own wrapper when they exit
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class Template(django_backend.Template):
+    """A template that times its rendering for the current request"""
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        # Templates rendered while rendering another one are part of its time
+        if timing is None or timing.rendering:
+            return super().render(context, request)
+
+        timing.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template_time += time.perf_counter() - started
+            timing.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with templates timed for RequestTimingMiddleware"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class RequestTimingMiddleware:
+    """Measures every request and keeps the measurements by URL name"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not timings_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Under ASGI the middleware is called as a coroutine, as the async
+        # views then run without being handed to a thread
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def finish(self, request, response, timing: RequestTiming):
+        """Keeps the measurements of the request and adds them to the response"""
+
+        total_ms = (time.perf_counter() - timing.started) * 1000
+        sql_ms = timing.sql_time * 1000
+        template_ms = timing.template_time * 1000
+
+        match = request.resolver_match
+        name = match.view_name if match is not None else UNRESOLVED
+        windows.add(name, (timing.queries, sql_ms, template_ms, total_ms))
+
+        if timings_header_enabled():
+            response["Server-Timing"] = (
+                f'db;dur={sql_ms:.1f};desc="{timing.queries} queries", '
+                f"tpl;dur={template_ms:.1f}, total;dur={total_ms:.1f}"
+            )
+        return response
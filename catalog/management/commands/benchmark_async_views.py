@@ -0,0 +1,123 @@
+import asyncio
+import statistics
+import time
+from types import ModuleType
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+from catalog import views
+
+# The page, the handler that serves it, a description of the variant, the view
+# that answers the home page and whether the dashboard queries run concurrently
+VARIANTS = (
+    ("index", "WSGI", "sync view", views.index, False),
+    ("index", "ASGI", "async view", views.index_async, True),
+    ("dashboard", "WSGI", "concurrent", views.index, True),
+    ("dashboard", "ASGI", "sequential", views.index, False),
+    ("dashboard", "ASGI", "concurrent", views.index, True),
+)
+
+
+def urlconf(index_view) -> ModuleType:
+    """Returns the site's URLconf with the home page answered by index_view"""
+
+    module = ModuleType("benchmark_urls")
+    module.urlpatterns = [
+        path("catalog/", index_view, name="index"),
+        path("", include("locallibrary.urls")),
+    ]
+    return module
+
+
+def check_response(response) -> None:
+    """Stops the benchmark when a page cannot be served"""
+
+    if response.status_code != 200:
+        raise CommandError(f"{response.request['PATH_INFO']}: {response.status_code}")
+
+
+class Command(BaseCommand):
+    """Compares the latency of the home page and dashboard over WSGI and ASGI.
+
+    The requests go through the full middleware stack of Django's WSGI and
+    ASGI handlers, in process, without a web server in front of them, against
+    the default database. The home page is timed with the sync view over WSGI
+    and with the async one over ASGI. The async dashboard is timed over WSGI,
+    where Django runs it in an event loop of its own, and over ASGI with its
+    queries run one after another and concurrently (see catalog.aggregates).
+    """
+
+    help = "Times the async views over ASGI against the WSGI path"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            required=True,
+            help="A librarian to request the pages as",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests timed for each variant",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['username']}")
+        if not user.has_perm("catalog.can_mark_returned"):
+            raise CommandError(f"{user} is not a librarian")
+
+        count = options["requests"]
+        self.stdout.write(f"{'page':<10} {'handler':<8} {'variant':<11} p50 ms  p95 ms")
+        for name, handler, variant, index_view, concurrent in VARIANTS:
+            with override_settings(
+                ROOT_URLCONF=urlconf(index_view),
+                ALLOWED_HOSTS=["testserver"],
+                CATALOG_CONCURRENT_QUERIES=concurrent,
+            ):
+                url = "/catalog/" if name == "index" else "/catalog/dashboard/"
+                if handler == "WSGI":
+                    timings = self.time_wsgi(user, url, count)
+                else:
+                    timings = asyncio.run(self.time_asgi(user, url, count))
+
+            timings.sort()
+            self.stdout.write(
+                f"{name:<10} {handler:<8} "
+                f"{variant:<11} "
+                f"{statistics.median(timings):6.2f}  "
+                f"{timings[int(len(timings) * 0.95) - 1]:6.2f}"
+            )
+
+    def time_wsgi(self, user: User, url: str, count: int) -> list:
+        client = Client()
+        client.force_login(user)
+        client.get(url)
+
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            check_response(response)
+        return timings
+
+    async def time_asgi(self, user: User, url: str, count: int) -> list:
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        await client.get(url)
+
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            check_response(response)
+        return timings
@@ -0,0 +1,159 @@
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from catalog import synthetic
+from catalog.management.scratch import scratch_database
+from catalog.models import BookInstance
+from catalog.pagination import KeysetPaginator
+
+BENCHMARK_ALIAS = "benchmark"
+
+
+class Command(BaseCommand):
+    """Shows the query plans and timings of the loan list queries on a large table.
+
+    By default a throwaway SQLite database is created in a temporary file,
+    migrated and filled with the requested number of copies. The loan list
+    queries are then explained and timed with the loan indexes in place, and
+    again after dropping them, so the two plans can be compared. Pass
+    --database to run against a configured database (e.g. PostgreSQL)
+    instead; it must be migrated and should not hold real data.
+    """
+
+    help = "Benchmarks the loan list queries with and without the loan indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--copies",
+            type=int,
+            default=5_000_000,
+            help="Number of book copies to generate (default: 5,000,000)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of times each query is run to measure its timing",
+        )
+        parser.add_argument(
+            "--database",
+            help="A configured, migrated and disposable database to fill instead of a temporary SQLite file",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+
+        using = options["database"]
+        if using is not None and using not in connections.databases:
+            raise CommandError(f"Unknown database {using}")
+
+        with ExitStack() as stack:
+            if using is None:
+                using = stack.enter_context(
+                    scratch_database(BENCHMARK_ALIAS, "loan-benchmark-")
+                )
+
+            self.fill(using, options["copies"], options["seed"])
+            self.compare(using)
+
+    def fill(self, using: str, copies: int, seed: int) -> None:
+        """Inserts a synthetic catalog with a realistic share of loans"""
+
+        started = time.monotonic()
+        counts = synthetic.generate(copies, using, seed)
+        self.stdout.write(
+            f"Generated {counts['copies']} copies, {counts['books']} books and "
+            f"{counts['borrowers']} borrowers in {time.monotonic() - started:.1f}s"
+        )
+
+    def queries(self, using: str) -> dict:
+        """Returns the loan list queries as the views run them
+
+        Each query is returned as a queryset to explain and a function that
+        runs it.
+        """
+
+        copies = BookInstance.objects.using(using)
+        borrower_id = (
+            copies.on_loan().order_by().values_list("borrower_id", flat=True).first()
+        )
+        ordering = ("due_back", "id")
+        middle = copies.on_loan().order_by(*ordering).values("due_back", "id")
+        middle = middle[copies.on_loan().count() // 2]
+
+        def page(queryset, after=None):
+            paginator = KeysetPaginator(queryset, 10, ordering)
+            cursor = None if after is None else paginator.encode_cursor(after)
+
+            # The range query that the paginator runs first
+            explained = queryset.order_by(
+                *(key.order_by(True) for key in paginator.keys)
+            )
+            if cursor:
+                values = paginator.decode_cursor(cursor)
+                explained = explained.filter(
+                    paginator.seek_filter(values, forward=True, nulls=False)
+                )
+
+            return explained[:11], lambda: paginator.fetch(after=cursor)
+
+        all_borrowed = copies.filter(status__exact="o").select_related(
+            "book", "borrower"
+        )
+        return {
+            "my-borrowed": page(
+                copies.filter(borrower_id=borrower_id)
+                .filter(status__exact="o")
+                .select_related("book")
+            ),
+            "all-borrowed": page(all_borrowed),
+            "all-borrowed, middle page": page(all_borrowed, after=middle),
+            "overdue count": (copies.overdue(), copies.overdue().count),
+        }
+
+    def measure(self, using: str) -> dict:
+        """Prints the plan of every query and returns its median time in milliseconds"""
+
+        timings = {}
+        for name, (queryset, run) in self.queries(using).items():
+            self.stdout.write(f"\n{name}:\n{queryset.explain()}")
+
+            samples = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f"median {timings[name]:.2f} ms")
+
+        return timings
+
+    def compare(self, using: str) -> None:
+        """Measures the queries with the loan indexes, without them, and restores them"""
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nWith the loan indexes"))
+        indexed = self.measure(using)
+
+        indexes = BookInstance._meta.indexes
+        with connections[using].schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.remove_index(BookInstance, index)
+
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nWithout the loan indexes"))
+            unindexed = self.measure(using)
+        finally:
+            with connections[using].schema_editor() as schema_editor:
+                for index in indexes:
+                    schema_editor.add_index(BookInstance, index)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSummary (median ms)"))
+        for name in indexed:
+            self.stdout.write(
+                f"{name:<28} {unindexed[name]:>10.2f} -> {indexed[name]:>8.2f}"
+            )
@@ -0,0 +1,345 @@
+import json
+import math
+import platform
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import Permission, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import synthetic, urls
+from catalog.management.scratch import scratch_database
+from catalog.models import BookInstance
+
+ANONYMOUS = "anonymous"
+PATRON = "patron"
+LIBRARIAN = "librarian"
+
+# Every named catalog route with the user it is requested as and its method.
+# The POST requests change data, so they are only sent to a throwaway
+# database, and must leave it as they found it to be timed repeatedly.
+ROUTES = (
+    ("index", ANONYMOUS, "get"),
+    ("books", ANONYMOUS, "get"),
+    ("book-search", ANONYMOUS, "get"),
+    ("book-detail", ANONYMOUS, "get"),
+    ("authors", ANONYMOUS, "get"),
+    ("author-detail", ANONYMOUS, "get"),
+    ("author-autocomplete", ANONYMOUS, "get"),
+    ("my-borrowed", PATRON, "get"),
+    ("my-holds", PATRON, "get"),
+    ("place-hold", PATRON, "post"),
+    ("holds-ready", LIBRARIAN, "get"),
+    ("all-borrowed", LIBRARIAN, "get"),
+    ("overdue", LIBRARIAN, "get"),
+    ("overdue-bucket", LIBRARIAN, "get"),
+    ("renew-book-librarian", LIBRARIAN, "get"),
+    ("renew-book-librarian", LIBRARIAN, "post"),
+    ("bulk-circulation", LIBRARIAN, "get"),
+    ("dashboard", LIBRARIAN, "get"),
+    ("request-timings", LIBRARIAN, "get"),
+    ("catalog-export", LIBRARIAN, "get"),
+    ("author-create", LIBRARIAN, "get"),
+    ("author-update", LIBRARIAN, "get"),
+    ("author-delete", LIBRARIAN, "get"),
+    ("book-create", LIBRARIAN, "get"),
+    ("book-update", LIBRARIAN, "get"),
+    ("book-delete", LIBRARIAN, "get"),
+    ("api-books", ANONYMOUS, "get"),
+    ("api-authors", ANONYMOUS, "get"),
+    ("api-genres", ANONYMOUS, "get"),
+    ("api-languages", ANONYMOUS, "get"),
+    ("api-copies", ANONYMOUS, "get"),
+)
+
+# The routes that are not timed, and why
+SKIPPED = {
+    "cancel-hold": "cancels the hold it is requested with",
+    "lend-hold": "lends the copy it is requested with",
+}
+
+# Untimed requests sent to each route first, to fill the caches
+WARMUP_REQUESTS = 3
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(timings: list, rank: int) -> float:
+    """Returns the nearest-rank percentile of the sorted timings"""
+
+    return timings[max(math.ceil(len(timings) * rank / 100), 1) - 1]
+
+
+def count_queries(queries: list):
+    """Returns a database execute wrapper that appends every query to queries
+
+    Unlike CaptureQueriesContext it keeps counting when the request closes
+    and reopens the connection.
+    """
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    return wrapper
+
+
+class Command(BaseCommand):
+    """Times every named catalog route and saves the results as JSON.
+
+    By default the default database is pointed at a throwaway SQLite file
+    for the run, migrated and filled with a synthetic catalog of the
+    requested number of copies (see catalog.synthetic). Every route in
+    catalog/urls.py is then requested in turn through the full middleware
+    stack with Django's test client, as an anonymous user, as the borrower of
+    a copy on loan or as a librarian, and timed after a few warmup requests.
+
+    For every route the throughput, the p50, p95 and p99 latencies and the
+    number of queries of one request are reported. Queries the dashboard
+    runs on other threads (see catalog.aggregates) are not counted. Pass
+    --output to save the results and --compare to show the change from an
+    earlier run.
+
+    Pass --existing to time the configured default database as it is
+    instead, e.g. a copy of production on PostgreSQL. No data is generated
+    and the requests that change data are skipped.
+    """
+
+    help = "Benchmarks the latency and query counts of every catalog route"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--copies",
+            type=int,
+            default=10_000,
+            help="Number of book copies to generate (default: 10,000)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=100,
+            help="Number of requests timed for each route",
+        )
+        parser.add_argument(
+            "--existing",
+            action="store_true",
+            help="Time the configured default database without changing it",
+        )
+        parser.add_argument("--output", help="A file to save the results to")
+        parser.add_argument(
+            "--compare", help="A file with the results of an earlier run"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        missing = {name for name in self.route_names() if name not in SKIPPED} - {
+            name for name, _, _ in ROUTES
+        }
+        if missing:
+            raise CommandError(
+                f"No benchmark for the routes {', '.join(sorted(missing))}"
+            )
+
+        earlier = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                earlier = json.load(file)
+
+        with ExitStack() as stack:
+            if not options["existing"]:
+                stack.enter_context(scratch_database("default", "route-benchmark-"))
+                self.fill(options["copies"], options["seed"])
+            stack.enter_context(override_settings(ALLOWED_HOSTS=["testserver"]))
+
+            results = {
+                "date": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "copies": BookInstance.objects.count(),
+                "requests": options["requests"],
+                "routes": self.run(options["requests"], options["existing"]),
+            }
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+        if earlier is not None:
+            self.compare(earlier, results)
+
+    def route_names(self) -> list:
+        """Returns the names of the routes of catalog/urls.py"""
+
+        return [pattern.name for pattern in urls.urlpatterns if pattern.name]
+
+    def fill(self, copies: int, seed: int) -> None:
+        """Inserts a synthetic catalog and a librarian"""
+
+        started = time.monotonic()
+        counts = synthetic.generate(copies, seed=seed)
+        librarian = User.objects.create_user("benchmark-librarian", is_staff=True)
+        librarian.user_permissions.add(
+            Permission.objects.get(codename="can_mark_returned")
+        )
+        self.stdout.write(
+            f"Generated {counts['copies']} copies, {counts['books']} books and "
+            f"{counts['borrowers']} borrowers in {time.monotonic() - started:.1f}s"
+        )
+
+    def samples(self) -> dict:
+        """Returns the copy on loan, book, author and users the routes are requested with"""
+
+        loan = (
+            BookInstance.objects.on_loan()
+            .filter(borrower__isnull=False, book__author__isnull=False)
+            .select_related("book__author", "borrower")
+            .order_by("pk")
+            .first()
+        )
+        if loan is None:
+            raise CommandError("The database has no copy on loan to a borrower")
+
+        permission = Permission.objects.get(codename="can_mark_returned")
+        librarian = (
+            User.objects.filter(
+                Q(is_superuser=True)
+                | Q(user_permissions=permission)
+                | Q(groups__permissions=permission)
+            )
+            .order_by("pk")
+            .first()
+        )
+        if librarian is None:
+            raise CommandError("The database has no librarian")
+
+        return {
+            "loan": loan,
+            "book": loan.book,
+            "author": loan.book.author,
+            ANONYMOUS: None,
+            PATRON: loan.borrower,
+            LIBRARIAN: librarian,
+        }
+
+    def request(self, name: str, method: str, samples: dict) -> tuple:
+        """Returns the URL and the data of a request to the route"""
+
+        kwargs, data = {}, {}
+        if name in ("book-detail", "book-update", "book-delete", "place-hold"):
+            kwargs["pk"] = samples["book"].pk
+        elif name in ("author-detail", "author-update", "author-delete"):
+            kwargs["pk"] = samples["author"].pk
+        elif name == "renew-book-librarian":
+            kwargs["pk"] = samples["loan"].pk
+        elif name == "overdue-bucket":
+            kwargs["bucket"] = "8-30"
+        elif name == "catalog-export":
+            kwargs["resource"] = "authors"
+        elif name == "book-search":
+            data["q"] = samples["book"].title.split()[-1]
+        elif name == "author-autocomplete":
+            data["term"] = samples["author"].last_name[:2]
+
+        if name == "renew-book-librarian" and method == "post":
+            data["renewal_date"] = date.today() + timedelta(weeks=2)
+
+        return reverse(name, kwargs=kwargs), data
+
+    def run(self, count: int, existing: bool) -> list:
+        """Times every route and returns its results"""
+
+        samples = self.samples()
+        clients = {}
+        for role in (ANONYMOUS, PATRON, LIBRARIAN):
+            clients[role] = Client()
+            if samples[role] is not None:
+                clients[role].force_login(samples[role])
+
+        self.stdout.write(
+            f"{'route':<34} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+            f"{'p99 ms':>7} {'queries':>7}"
+        )
+        results = []
+        for name, role, method in ROUTES:
+            label = f"{method.upper()} {name}"
+            if existing and method != "get":
+                self.stdout.write(f"{label:<34} skipped, changes the database")
+                continue
+
+            url, data = self.request(name, method, samples)
+            send = getattr(clients[role], method)
+
+            def get_response():
+                response = send(url, data)
+                if response.status_code >= 400:
+                    raise CommandError(f"{label} {url}: {response.status_code}")
+                # Streamed responses are only produced as they are read
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                return response
+
+            for _ in range(WARMUP_REQUESTS):
+                get_response()
+            queries = []
+            with connection.execute_wrapper(count_queries(queries)):
+                status_code = get_response().status_code
+
+            timings = []
+            started = time.perf_counter()
+            for _ in range(count):
+                start = time.perf_counter()
+                get_response()
+                timings.append((time.perf_counter() - start) * 1000)
+            elapsed = time.perf_counter() - started
+
+            timings.sort()
+            result = {
+                "name": name,
+                "method": method,
+                "url": url,
+                "user": role,
+                "status": status_code,
+                "queries": len(queries),
+                "throughput": count / elapsed,
+                "mean_ms": statistics.mean(timings),
+            }
+            for rank in PERCENTILES:
+                result[f"p{rank}_ms"] = percentile(timings, rank)
+            results.append(result)
+
+            self.stdout.write(
+                f"{label:<34} {result['throughput']:7.1f} {result['p50_ms']:7.2f} "
+                f"{result['p95_ms']:7.2f} {result['p99_ms']:7.2f} "
+                f"{result['queries']:7d}"
+            )
+
+        for name, reason in SKIPPED.items():
+            self.stdout.write(f"{'POST ' + name:<34} skipped, {reason}")
+        return results
+
+    def compare(self, earlier: dict, results: dict) -> None:
+        """Shows the change of the median latency and queries of every route"""
+
+        before = {(r["name"], r["method"]): r for r in earlier["routes"]}
+        self.stdout.write(
+            f"\nCompared to {earlier['date']} ({earlier['copies']} copies)"
+        )
+        for result in results["routes"]:
+            old = before.get((result["name"], result["method"]))
+            label = f"{result['method'].upper()} {result['name']}"
+            if old is None:
+                self.stdout.write(f"{label:<34} new")
+                continue
+            change = (result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            self.stdout.write(
+                f"{label:<34} p50 {old['p50_ms']:7.2f} -> {result['p50_ms']:7.2f} ms "
+                f"({change:+.0f}%), queries {old['queries']} -> {result['queries']}"
+            )
@@ -0,0 +1,80 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.exporting import ENCODERS, EXPORT_CHUNK_SIZE, RESOURCES, export_lines
+from catalog.importing import CSV_FORMAT, NDJSON_FORMAT
+
+
+class Command(BaseCommand):
+    """Exports the authors, books or copies of the catalog as CSV or NDJSON.
+
+    The rows are streamed from the database in chunks and written one at a
+    time, so memory use does not depend on the size of the catalog. See
+    catalog.exporting for the columns of each resource.
+    """
+
+    help = "Streams the authors, books or copies of the catalog to a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", choices=sorted(RESOURCES))
+        parser.add_argument(
+            "--output",
+            default="-",
+            help='The file to write, or "-" for stdout (default)',
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(ENCODERS),
+            help="The format of the file (default: guessed from the extension, or csv)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="Number of rows fetched from the database at a time",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to export from",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        file_format = options["format"] or (
+            NDJSON_FORMAT
+            if os.path.splitext(path)[1] in (".ndjson", ".jsonl")
+            else CSV_FORMAT
+        )
+
+        lines = export_lines(
+            options["resource"],
+            file_format,
+            using=options["database"],
+            chunk_size=options["chunk_size"],
+        )
+
+        if path == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        try:
+            file = open(path, "w", newline="", encoding="utf-8")
+        except OSError as error:
+            raise CommandError(f"Cannot open {path}: {error}")
+
+        count = 0
+        with file:
+            for line in lines:
+                file.write(line)
+                count += 1
+
+        if file_format == CSV_FORMAT:
+            count -= 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {count} {options['resource']} to {path}")
+        )
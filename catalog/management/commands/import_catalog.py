@@ -0,0 +1,92 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.importing import (
+    CSV_FORMAT,
+    DEFAULT_BATCH_SIZE,
+    NDJSON_FORMAT,
+    READERS,
+    CatalogImporter,
+)
+
+
+class Command(BaseCommand):
+    """Imports books, authors, genres, languages and copies from a CSV or NDJSON file.
+
+    The records are written in batches with multi-row INSERT statements (see
+    catalog.importing.insert_rows). Books whose ISBN is already in the catalog
+    are skipped, so the command can be run again after an interruption. See
+    catalog.importing for the record format.
+    """
+
+    help = "Bulk imports catalog records from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='The file to import, or "-" for stdin')
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="The format of the file (default: guessed from the extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of records written per transaction",
+        )
+        parser.add_argument(
+            "--skip-rebuild",
+            action="store_true",
+            help="Do not rebuild the catalog stats or index the imported books afterwards",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to import into",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or (
+            NDJSON_FORMAT
+            if os.path.splitext(path)[1] in (".ndjson", ".jsonl")
+            else CSV_FORMAT
+        )
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"], using=options["database"]
+        )
+
+        def progress(importer):
+            if options["verbosity"] >= 2:
+                self.stdout.write(
+                    f"{importer.counts['records']} records "
+                    f"({importer.rows_per_second:.0f} rows/s)"
+                )
+
+        try:
+            file = (
+                sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+            )
+        except OSError as error:
+            raise CommandError(f"Cannot open {path}: {error}")
+
+        with file:
+            counts = importer.import_records(READERS[file_format](file), progress)
+
+        if not options["skip_rebuild"]:
+            importer.finish()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {counts['records']} records in {importer.elapsed:.1f}s "
+                f"({importer.rows_per_second:.0f} rows/s): "
+                f"{counts['books']} books, {counts['copies']} copies, "
+                f"{counts['authors']} authors, {counts['genres']} genres, "
+                f"{counts['languages']} languages created; "
+                f"{counts['skipped']} existing and {counts['invalid']} invalid records skipped"
+            )
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    """Rebuilds the full-text search documents of every book.
+
+    The documents are kept up to date by signals, which bulk operations such
+    as bulk_create and queryset.update bypass. Running this command afterwards
+    brings the search index back in step with the catalog.
+    """
+
+    help = "Rebuilds the full-text search index of the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to rebuild the index in",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        started = time.monotonic()
+
+        with transaction.atomic(using=using):
+            search.create_search_index(connections[using])
+            search.rebuild_index(using)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Search index rebuilt in {time.monotonic() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from catalog.models import COPY_STATUS_COUNTERS, Book
+
+# The number of books recounted with one UPDATE
+BATCH_SIZE = 500
+
+# The number of drifted books listed
+SHOWN_BOOKS = 20
+
+
+class Command(BaseCommand):
+    """Finds and fixes the books whose copy counters do not match their copies.
+
+    The counters are maintained by signals and by catalog.circulation, which
+    are bypassed by bulk operations such as bulk_create and queryset.update
+    on the copies. This command counts the copies of every book with one
+    grouped query, lists the books whose counters differ and recomputes
+    their counters from the copies table. Pass --dry-run to only list them.
+    """
+
+    help = "Recomputes the copy counters of the books that drifted from their copies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the drifted books without fixing them",
+        )
+
+    def handle(self, *args, **options):
+        # The number of copies of every book counted by each counter
+        actual = {"actual_count_of_bookinstances": Count("bookinstance")}
+        for status, field in COPY_STATUS_COUNTERS.items():
+            actual[f"actual_{field}"] = Count(
+                "bookinstance", filter=Q(bookinstance__status__exact=status)
+            )
+
+        drifted = Q()
+        for name in actual:
+            drifted |= ~Q(**{name[len("actual_") :]: F(name)})
+        drifted = list(
+            Book.objects.annotate(**actual)
+            .filter(drifted)
+            .order_by("pk")
+            .values_list(
+                "pk", "title", "count_of_bookinstances", "actual_count_of_bookinstances"
+            )
+        )
+
+        for pk, title, counted, copies in drifted[:SHOWN_BOOKS]:
+            self.stdout.write(f"{pk} {title}: counted {counted} copies of {copies}")
+        if len(drifted) > SHOWN_BOOKS:
+            self.stdout.write(f"... and {len(drifted) - SHOWN_BOOKS} more")
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted)} books have drifted")
+            return
+
+        book_ids = [pk for pk, *_ in drifted]
+        for start in range(0, len(book_ids), BATCH_SIZE):
+            Book.objects.filter(
+                pk__in=book_ids[start : start + BATCH_SIZE]
+            ).recount_copies()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Copy counters of {len(drifted)} books reconciled")
+        )
@@ -0,0 +1,76 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.notices import DEFAULT_BATCH_SIZE, DEFAULT_DUE_SOON_DAYS, OverdueNotifier
+
+
+class Command(BaseCommand):
+    """Emails every borrower with overdue or due-soon copies, once a day.
+
+    The loans are grouped by borrower in one query and the messages are sent
+    over a single mail connection through EMAIL_BACKEND. Progress is saved
+    after every batch, so running the command again on the same day resumes
+    where it stopped. See catalog.notices.
+    """
+
+    help = "Sends the overdue and due-soon notices of the day to borrowers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--due-soon-days",
+            type=int,
+            default=DEFAULT_DUE_SOON_DAYS,
+            help="Also mention copies due back within this many days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of messages sent between checkpoints",
+        )
+        parser.add_argument(
+            "--date",
+            help="The day to send the notices of, as YYYY-MM-DD (default: today)",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Send every notice of the day again, ignoring the saved progress",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to read the loans from",
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options["date"]:
+            try:
+                today = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']}")
+
+        notifier = OverdueNotifier(
+            today=today,
+            due_soon_days=options["due_soon_days"],
+            batch_size=options["batch_size"],
+            using=options["database"],
+        )
+
+        def progress(run):
+            if options["verbosity"] >= 2:
+                self.stdout.write(
+                    f"{run.count_of_sent} notices sent "
+                    f"(last borrower {run.last_borrower_id})"
+                )
+
+        run = notifier.send(restart=options["restart"], progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{run.count_of_sent} overdue notices sent for {run.run_date}"
+            )
+        )
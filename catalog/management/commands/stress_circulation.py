@@ -0,0 +1,286 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from catalog import circulation
+from catalog.importing import insert_rows
+from catalog.management.scratch import scratch_database
+from catalog.models import (
+    COPY_COUNTERS,
+    COPY_STATUS_COUNTERS,
+    Book,
+    BookInstance,
+    CatalogStats,
+)
+
+STRESS_ALIAS = "stress"
+
+OPERATIONS = (
+    "checkout",
+    "checkout reserved",
+    "checkout any",
+    "renew",
+    "return",
+    "reserve",
+    "release",
+)
+
+
+class Command(BaseCommand):
+    """Runs circulation transitions from many threads at once on a few copies.
+
+    Every thread lends, renews, returns, reserves and releases random copies
+    of one book through catalog.circulation, so most attempts collide with
+    another thread's. Afterwards the final state of every copy is checked
+    against the successful transitions: a copy can only have been lent as
+    many times as it was returned, plus one if it is still on loan, which
+    fails as soon as two threads both believe they lent the same copy. The
+    CatalogStats count of available copies and the copy counters of the book
+    must match the table as well.
+
+    By default the copies live in a throwaway SQLite database in a temporary
+    file, where writers queue up on the database lock. Pass --database to run
+    against a configured database (e.g. PostgreSQL) instead, where they queue
+    up on row locks; it must be migrated and should not hold real data.
+    """
+
+    help = "Stress tests the circulation transitions under contention"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Number of concurrent librarians"
+        )
+        parser.add_argument(
+            "--copies",
+            type=int,
+            default=10,
+            help="Number of copies the threads compete for",
+        )
+        parser.add_argument(
+            "--operations",
+            type=int,
+            default=500,
+            help="Number of transitions each thread attempts",
+        )
+        parser.add_argument(
+            "--database",
+            help="A configured, migrated and disposable database to use instead of a temporary SQLite file",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if using is not None and using not in connections.databases:
+            raise CommandError(f"Unknown database {using}")
+
+        with ExitStack() as stack:
+            if using is None:
+                using = stack.enter_context(
+                    scratch_database(STRESS_ALIAS, "circulation-stress-", timeout=30)
+                )
+                with connections[using].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+
+            self.stress(using, options)
+
+    def stress(self, using: str, options: dict) -> None:
+        now = connections[using].ops.adapt_datetimefield_value(timezone.now())
+        insert_rows(
+            User,
+            ("username", "password", "first_name", "last_name", "email")
+            + ("is_superuser", "is_staff", "is_active", "date_joined"),
+            [
+                (f"librarian{i}", "!", "", "", "", False, False, True, now)
+                for i in range(options["threads"])
+            ],
+            using,
+        )
+        borrowers = list(User.objects.using(using))
+        insert_rows(
+            Book,
+            ("created_at", "updated_at", "title", "summary", "isbn") + COPY_COUNTERS,
+            [
+                (now, now, "Contended Book", "", "0000000000000")
+                + (0,) * len(COPY_COUNTERS)
+            ],
+            using,
+        )
+        book = Book.objects.using(using).get()
+
+        id_field = BookInstance._meta.pk
+        copy_ids = [uuid.uuid4() for _ in range(options["copies"])]
+        insert_rows(
+            BookInstance,
+            ("id", "created_at", "updated_at", "book_id", "imprint", "status"),
+            [
+                (
+                    id_field.get_db_prep_value(copy_id, connections[using]),
+                    now,
+                    now,
+                    book.pk,
+                    "Imprint",
+                    circulation.AVAILABLE,
+                )
+                for copy_id in copy_ids
+            ],
+            using,
+        )
+        CatalogStats.rebuild(using)
+        Book.objects.using(using).recount_copies()
+
+        successes = Counter()
+        refusals = Counter()
+        errors = []
+        lock = threading.Lock()
+
+        def librarian(borrower: User, rng: random.Random) -> None:
+            local_successes = Counter()
+            local_refusals = Counter()
+            try:
+                for _ in range(options["operations"]):
+                    operation = rng.choice(OPERATIONS)
+                    try:
+                        copy_id, error = self.attempt(
+                            operation, rng.choice(copy_ids), book, borrower, using
+                        )
+                    except DatabaseError as exc:
+                        with lock:
+                            errors.append(f"{operation}: {exc}")
+                        continue
+                    if error is None:
+                        local_successes[copy_id, operation] += 1
+                    else:
+                        local_refusals[error] += 1
+            finally:
+                connections[using].close()
+                with lock:
+                    successes.update(local_successes)
+                    refusals.update(local_refusals)
+
+        rng = random.Random(options["seed"])
+        threads = [
+            threading.Thread(
+                target=librarian, args=(borrower, random.Random(rng.random()))
+            )
+            for borrower in borrowers
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = options["threads"] * options["operations"]
+        changed = sum(successes.values())
+        self.stdout.write(
+            f"{attempts} attempts by {options['threads']} threads on "
+            f"{options['copies']} copies in {elapsed:.2f}s: "
+            f"{changed} transitions ({changed / elapsed:.0f}/s), "
+            f"{sum(refusals.values())} refused, {len(errors)} database errors"
+        )
+        problems = errors + self.verify(copy_ids, successes, using)
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f"{len(problems)} errors or inconsistencies found")
+        self.stdout.write(self.style.SUCCESS("Every copy is consistent"))
+
+    def attempt(self, operation: str, copy_id, book: Book, borrower: User, using):
+        """Runs one operation and returns the id of the copy it was run on and its error"""
+
+        due_back = date.today() + timedelta(weeks=3)
+        if operation == "checkout any":
+            copy_id = circulation.checkout_any(book.pk, borrower, due_back, using)
+            return copy_id, None if copy_id else circulation.NOT_AVAILABLE
+        if operation == "checkout":
+            error = circulation.checkout(copy_id, borrower, due_back, using=using)
+        elif operation == "checkout reserved":
+            error = circulation.checkout(
+                copy_id, borrower, due_back, reserved=True, using=using
+            )
+        elif operation == "renew":
+            error = circulation.renew_copy(copy_id, due_back + timedelta(1), using)
+        elif operation == "return":
+            error = circulation.return_copy(copy_id, using)
+        elif operation == "reserve":
+            error = circulation.reserve(copy_id, using)
+        else:
+            error = circulation.release(copy_id, using)
+        return copy_id, error
+
+    def verify(self, copy_ids: list, successes: Counter, using: str) -> list:
+        """Returns the inconsistencies between the copies and the transitions"""
+
+        problems = []
+        copies = BookInstance.objects.using(using).in_bulk(copy_ids)
+        for copy_id in copy_ids:
+            copy = copies[copy_id]
+            done = Counter(
+                {
+                    operation: count
+                    for (pk, operation), count in successes.items()
+                    if pk == copy_id
+                }
+            )
+
+            # A status is entered once more than it is left if the copy ended
+            # up in it, and as many times otherwise
+            lent = done["checkout"] + done["checkout reserved"] + done["checkout any"]
+            reserved = done["reserve"]
+            balances = {
+                circulation.ON_LOAN: (lent, done["return"]),
+                circulation.RESERVED: (
+                    reserved,
+                    done["release"] + done["checkout reserved"],
+                ),
+            }
+            for status, (entered, left) in balances.items():
+                if entered - left != (copy.status == status):
+                    problems.append(
+                        f"{copy_id} entered status {status} {entered} times "
+                        f"and left it {left} times, but is {copy.status}"
+                    )
+
+            on_loan = copy.status == circulation.ON_LOAN
+            if on_loan != (copy.borrower_id is not None) or on_loan != (
+                copy.due_back is not None
+            ):
+                problems.append(
+                    f"{copy_id} is {copy.status} with borrower "
+                    f"{copy.borrower_id} due back {copy.due_back}"
+                )
+
+        available = (
+            BookInstance.objects.using(using)
+            .filter(status__exact=circulation.AVAILABLE)
+            .count()
+        )
+        counted = CatalogStats.objects.using(using).get().count_of_available_books
+        if counted != available:
+            problems.append(
+                f"CatalogStats counts {counted} available copies, the table {available}"
+            )
+
+        book = Book.objects.using(using).get()
+        statuses = Counter(
+            BookInstance.objects.using(using).values_list("status", flat=True)
+        )
+        for status, field in COPY_STATUS_COUNTERS.items():
+            if getattr(book, field) != statuses[status]:
+                problems.append(
+                    f"The book counts {getattr(book, field)} copies in status "
+                    f"{status}, the table {statuses[status]}"
+                )
+
+        return problems
@@ -0,0 +1,56 @@
+"""Throwaway SQLite databases for the benchmark and stress commands
+
+The commands that generate large or contended workloads run them against a
+temporary database file by default, so that they never touch real data. It is
+configured as an extra connection alias, migrated, and removed afterwards.
+When the alias is already configured, e.g. to point the default database at
+a throwaway file while requests are served, it is restored afterwards. The
+in-memory indexes built from the database of the alias are forgotten both
+times.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connections
+
+from catalog import autocomplete
+
+
+@contextmanager
+def scratch_database(alias: str, prefix: str, **options):
+    """Configures and migrates a SQLite database in a temporary file for the block
+
+    The options are passed to the sqlite3 connection, e.g. timeout=30.
+    """
+
+    path = tempfile.mktemp(suffix=".sqlite3", prefix=prefix)
+    previous = None
+    if alias in connections.databases:
+        previous = (connections.databases[alias], connections[alias])
+        del connections[alias]
+    connections.databases[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        "OPTIONS": options,
+    }
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+    autocomplete.clear(alias)
+
+    try:
+        call_command("migrate", database=alias, verbosity=0)
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        if previous is None:
+            del connections.databases[alias]
+        else:
+            connections.databases[alias], connections[alias] = previous
+        autocomplete.clear(alias)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
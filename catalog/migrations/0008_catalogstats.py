@@ -0,0 +1,61 @@
+# Generated by Django 3.2.4 on 2021-07-28 10:10
+
+from django.db import migrations, models
+
+
+def build_catalog_stats(apps, schema_editor):
+    """Stores the current record counts so the home page has a row to read"""
+
+    db_alias = schema_editor.connection.alias
+
+    def count(model_name, **filters):
+        model = apps.get_model("catalog", model_name)
+        return model.objects.using(db_alias).filter(**filters).count()
+
+    CatalogStats = apps.get_model("catalog", "CatalogStats")
+    CatalogStats.objects.using(db_alias).update_or_create(
+        pk=1,
+        defaults={
+            "count_of_books": count("Book"),
+            "count_of_authors": count("Author"),
+            "count_of_genres": count("Genre"),
+            "count_of_languages": count("Language"),
+            "count_of_bookinstances": count("BookInstance"),
+            "count_of_available_books": count("BookInstance", status__exact="a"),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_alter_author_date_of_death"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count_of_books", models.IntegerField(default=0)),
+                ("count_of_authors", models.IntegerField(default=0)),
+                ("count_of_genres", models.IntegerField(default=0)),
+                ("count_of_languages", models.IntegerField(default=0)),
+                ("count_of_bookinstances", models.IntegerField(default=0)),
+                ("count_of_available_books", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "catalog stats",
+            },
+        ),
+        migrations.RunPython(build_catalog_stats, migrations.RunPython.noop),
+    ]
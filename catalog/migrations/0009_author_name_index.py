@@ -0,0 +1,20 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_catalogstats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(
+                fields=["last_name", "first_name", "id"],
+                name="catalog_aut_last_na_b2b7ba_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:08
+
+from django.db import migrations
+
+# The statements are written out here rather than taken from catalog.search,
+# so later changes to that module cannot change what this migration does.
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_book_search "
+    "USING fts5(title, author, genre, summary, tokenize='porter unicode61')",
+    "INSERT INTO catalog_book_search (rowid, title, author, genre, summary) "
+    "SELECT b.id, b.title, "
+    "COALESCE(a.first_name || ' ' || a.last_name, ''), "
+    "COALESCE((SELECT group_concat(g.name, ' ') "
+    "FROM catalog_book_genre bg JOIN catalog_genre g "
+    "ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''), "
+    "b.summary "
+    "FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id",
+]
+
+POSTGRESQL_CREATE = [
+    "CREATE TABLE IF NOT EXISTS catalog_book_search ("
+    "book_id bigint PRIMARY KEY REFERENCES catalog_book (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS catalog_book_search_document_idx "
+    "ON catalog_book_search USING GIN (document)",
+    "INSERT INTO catalog_book_search (book_id, document) "
+    "SELECT b.id, "
+    "setweight(to_tsvector('english', b.title), 'A') || "
+    "setweight(to_tsvector('english', COALESCE(a.first_name, '') || ' ' "
+    "|| COALESCE(a.last_name, '')), 'B') || "
+    "setweight(to_tsvector('english', COALESCE((SELECT string_agg(g.name, ' ') "
+    "FROM catalog_book_genre bg JOIN catalog_genre g "
+    "ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C') || "
+    "setweight(to_tsvector('english', b.summary), 'D') "
+    "FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id",
+]
+
+CREATE_STATEMENTS = {"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the search table and indexes the books already in the catalog"""
+
+    for statement in CREATE_STATEMENTS.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_STATEMENTS:
+        schema_editor.execute("DROP TABLE IF EXISTS catalog_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_author_name_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_book_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["status", "due_back"], name="catalog_boo_status_94e30b_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_bookinstance_status_due_back_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["borrower", "status", "due_back"],
+                name="catalog_boo_borrowe_5eab57_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(("status", "o")),
+                fields=["due_back", "id"],
+                name="catalog_loan_due_back_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(("status", "o")),
+                fields=["borrower", "due_back", "id"],
+                name="catalog_loan_borrower_idx",
+            ),
+        ),
+    ]
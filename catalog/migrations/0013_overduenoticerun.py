@@ -0,0 +1,31 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_loan_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueNoticeRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_date", models.DateField(unique=True)),
+                ("last_borrower_id", models.IntegerField(default=0)),
+                ("count_of_sent", models.IntegerField(default=0)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
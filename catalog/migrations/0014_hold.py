@@ -0,0 +1,94 @@
+# Generated by Django 3.2.4 on 2026-10-17 06:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("catalog", "0013_overduenoticerun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Hold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("w", "Waiting"),
+                            ("r", "Ready for pickup"),
+                            ("f", "Fulfilled"),
+                            ("c", "Cancelled"),
+                        ],
+                        default="w",
+                        max_length=1,
+                    ),
+                ),
+                ("placed_at", models.DateTimeField(auto_now_add=True)),
+                ("ready_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="catalog.book"
+                    ),
+                ),
+                (
+                    "copy",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="catalog.bookinstance",
+                    ),
+                ),
+                (
+                    "patron",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="hold",
+            index=models.Index(
+                condition=models.Q(("status", "w")),
+                fields=["book", "id"],
+                name="catalog_hold_queue_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="hold",
+            index=models.Index(
+                condition=models.Q(("status", "r")),
+                fields=["ready_at", "id"],
+                name="catalog_hold_ready_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hold",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ("w", "r"))),
+                fields=("patron", "book"),
+                name="catalog_hold_one_per_patron",
+            ),
+        ),
+    ]
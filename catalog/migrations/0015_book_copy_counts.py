@@ -0,0 +1,89 @@
+# Generated by Django 3.2.4 on 2026-10-17 07:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# Maps the loan status of a copy to the counter of its book that counts it
+COPY_STATUS_COUNTERS = {
+    "a": "count_of_available",
+    "o": "count_of_on_loan",
+    "r": "count_of_reserved",
+    "m": "count_of_maintenance",
+}
+
+
+def count_copies(apps, schema_editor):
+    """Stores the number of copies of every book in each status"""
+
+    db_alias = schema_editor.connection.alias
+    Book = apps.get_model("catalog", "Book")
+    BookInstance = apps.get_model("catalog", "BookInstance")
+
+    copies = (
+        BookInstance.objects.using(db_alias)
+        .filter(book=OuterRef("pk"))
+        .order_by()
+        .values("book")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+
+    def count(**filters):
+        return Coalesce(Subquery(copies.filter(**filters)), Value(0))
+
+    counters = {"count_of_bookinstances": count()}
+    for status, field in COPY_STATUS_COUNTERS.items():
+        counters[field] = count(status__exact=status)
+    Book.objects.using(db_alias).update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_hold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="count_of_available",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="available"
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="count_of_bookinstances",
+            field=models.IntegerField(default=0, editable=False, verbose_name="copies"),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="count_of_maintenance",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="in maintenance"
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="count_of_on_loan",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="on loan"
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="count_of_reserved",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="reserved"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["count_of_available", "id"],
+                name="catalog_boo_count_o_cd187c_idx",
+            ),
+        ),
+        migrations.RunPython(count_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.4 on 2026-10-17 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_book_copy_counts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-count_of_on_loan", "title"],
+                name="catalog_boo_count_o_1e66d5_idx",
+            ),
+        ),
+    ]
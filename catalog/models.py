@@ -7,13 +7,16 @@ the super class.
 """
 
 
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import BooleanField, Case, Count, F, OuterRef, Q, Subquery
+from django.db.models import Value, When
+from django.db.models.functions import Coalesce
 import uuid
 from django.db.models.deletion import SET_NULL
 from django.urls import reverse  # Used to generate URLs by reversing the URL patterns
 
 from django.contrib.auth.models import User
-from datetime import date
+from datetime import date, timedelta
 
 
 class CatalogModel(models.Model):
@@ -42,6 +45,9 @@ class Author(CatalogModel):
     class Meta:
         ordering = ["last_name", "first_name"]
 
+        # The author list pages through authors in this order
+        indexes = [models.Index(fields=["last_name", "first_name", "id"])]
+
     def get_absolute_url(self):
         """Returns the url to access a particular author instance."""
         return reverse("author-detail", args=[str(self.id)])
@@ -82,8 +88,76 @@ class Language(CatalogModel):
         return self.language
 
 
+# Maps the loan status of a copy to the counter of its book that counts it
+COPY_STATUS_COUNTERS = {
+    "a": "count_of_available",
+    "o": "count_of_on_loan",
+    "r": "count_of_reserved",
+    "m": "count_of_maintenance",
+}
+
+# Every copy counter of a book, the total first
+COPY_COUNTERS = ("count_of_bookinstances",) + tuple(COPY_STATUS_COUNTERS.values())
+
+
+class BookQuerySet(models.QuerySet):
+    """Queries over books that maintain their copy counters"""
+
+    def move_copies(self, old_status, new_status, count: int = 1) -> int:
+        """Moves count copies of every book from the counter of old_status to that of new_status
+
+        A status of None stands for no copy at all: moving copies from None
+        adds them to the books, moving them to None removes them. The
+        counters are changed with F() expressions in a single UPDATE, so
+        concurrent changes of the same book are never lost.
+        """
+
+        deltas = dict.fromkeys(COPY_COUNTERS, 0)
+        if old_status is None:
+            deltas["count_of_bookinstances"] += count
+        elif old_status in COPY_STATUS_COUNTERS:
+            deltas[COPY_STATUS_COUNTERS[old_status]] -= count
+        if new_status is None:
+            deltas["count_of_bookinstances"] -= count
+        elif new_status in COPY_STATUS_COUNTERS:
+            deltas[COPY_STATUS_COUNTERS[new_status]] += count
+
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        return self.update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+    def recount_copies(self) -> int:
+        """Recomputes the copy counters of every book from the copies table"""
+
+        copies = (
+            BookInstance.objects.filter(book=OuterRef("pk"))
+            .order_by()
+            .values("book")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+
+        def count(**filters):
+            return Coalesce(Subquery(copies.filter(**filters)), Value(0))
+
+        counters = {"count_of_bookinstances": count()}
+        for status, field in COPY_STATUS_COUNTERS.items():
+            counters[field] = count(status__exact=status)
+        return self.update(**counters)
+
+
 class Book(CatalogModel):
-    """Model representing a book (but not a specific copy of a book)."""
+    """Model representing a book (but not a specific copy of a book).
+
+    The copy counters are denormalized from the copies of the book, so list
+    pages can show, filter and sort on them without a join. They are kept
+    up to date by the signal handlers in catalog.signals and by the
+    transitions in catalog.circulation, and the reconcile_copy_counts
+    management command recomputes them if they ever drift.
+    """
 
     title = models.CharField(max_length=200)
 
@@ -108,6 +182,41 @@ class Book(CatalogModel):
     # The Language class is already defined, so it can be used to define the relation
     language = models.ForeignKey(Language, null=True, on_delete=SET_NULL)
 
+    count_of_bookinstances = models.IntegerField("copies", default=0, editable=False)
+    count_of_available = models.IntegerField("available", default=0, editable=False)
+    count_of_on_loan = models.IntegerField("on loan", default=0, editable=False)
+    count_of_reserved = models.IntegerField("reserved", default=0, editable=False)
+    count_of_maintenance = models.IntegerField(
+        "in maintenance", default=0, editable=False
+    )
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        # The book list can be sorted on the available copies and the
+        # dashboard lists the books with the most copies on loan
+        indexes = [
+            models.Index(fields=["count_of_available", "id"]),
+            models.Index(fields=["-count_of_on_loan", "title"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Saves the book without writing its copy counters, unless it is new
+
+        The counters are only changed with F() expressions (see
+        BookQuerySet.move_copies), so saving an edited book that was loaded
+        before a copy was lent does not put back the old counts.
+        """
+
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            skipped = set(COPY_COUNTERS) | self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
     def display_genre(self):
         """This is a less costly way to display genre in Books on admin site
         Genre is added as a string
@@ -126,6 +235,73 @@ class Book(CatalogModel):
         return reverse("book-detail", args=[str(self.id)])
 
 
+# Ranges of days overdue that the overdue report groups loans into, as
+# (name, first day, last day); None means there is no upper limit
+OVERDUE_BUCKETS = (
+    ("1-7", 1, 7),
+    ("8-30", 8, 30),
+    ("31-90", 31, 90),
+    ("90+", 91, None),
+)
+
+
+def _overdue_range(first_day: int, last_day: int = None, today: date = None) -> Q:
+    """Returns a filter on the due date for copies first_day to last_day days overdue"""
+
+    today = today or date.today()
+    condition = Q(due_back__lte=today - timedelta(days=first_day))
+    if last_day is not None:
+        condition &= Q(due_back__gte=today - timedelta(days=last_day))
+    return condition
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    """Queries over copies that compute loan state in the database"""
+
+    def on_loan(self) -> "BookInstanceQuerySet":
+        """Returns the copies that are currently on loan"""
+
+        return self.filter(status__exact="o")
+
+    def overdue(self, today: date = None) -> "BookInstanceQuerySet":
+        """Returns the copies on loan whose due date has passed"""
+
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def overdue_between(
+        self, first_day: int, last_day: int = None, today: date = None
+    ) -> "BookInstanceQuerySet":
+        """Returns the copies on loan that are first_day to last_day days overdue
+
+        The range is turned into a range of due dates, so the filter can use
+        the index on (status, due_back).
+        """
+
+        return self.on_loan().filter(_overdue_range(first_day, last_day, today))
+
+    def with_is_overdue(self, today: date = None) -> "BookInstanceQuerySet":
+        """Annotates each copy with is_overdue, so it can be filtered and sorted on"""
+
+        return self.annotate(
+            is_overdue=Case(
+                When(due_back__lt=today or date.today(), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+
+    def count_overdue_by_bucket(self, today: date = None) -> dict:
+        """Returns the number of overdue copies in each of OVERDUE_BUCKETS with one query"""
+
+        today = today or date.today()
+        return self.overdue(today).aggregate(
+            **{
+                name: Count("pk", filter=_overdue_range(first_day, last_day, today))
+                for name, first_day, last_day in OVERDUE_BUCKETS
+            }
+        )
+
+
 class BookInstance(CatalogModel):
     """Model representing a specific copy of a book (i.e. that can be borrowed from the library)."""
 
@@ -139,12 +315,29 @@ class BookInstance(CatalogModel):
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = BookInstanceQuerySet.as_manager()
+
     @property
     def is_overdue(self):
+        # Copies loaded with with_is_overdue() already carry the answer
+        if "_is_overdue" in self.__dict__:
+            return self._is_overdue
         if self.due_back and date.today() > self.due_back:
             return True
         return False
 
+    @is_overdue.setter
+    def is_overdue(self, value):
+        self._is_overdue = value
+
+    @property
+    def days_overdue(self) -> int:
+        """Number of days since the copy was due back, 0 if it is not overdue"""
+
+        if not self.due_back:
+            return 0
+        return max((date.today() - self.due_back).days, 0)
+
     LOAN_STATUS = (
         ("m", "Maintenance"),
         ("o", "On loan"),
@@ -168,9 +361,227 @@ class BookInstance(CatalogModel):
     class Meta:
         ordering = ["due_back"]
 
+        # Loan lists and the overdue report filter on the status and walk
+        # the copies in due date order. The partial indexes only hold the
+        # copies on loan, a small part of the table; backends without
+        # partial indexes skip them and use the composite ones instead.
+        indexes = [
+            models.Index(fields=["status", "due_back"]),
+            models.Index(fields=["borrower", "status", "due_back"]),
+            models.Index(
+                fields=["due_back", "id"],
+                condition=Q(status="o"),
+                name="catalog_loan_due_back_idx",
+            ),
+            models.Index(
+                fields=["borrower", "due_back", "id"],
+                condition=Q(status="o"),
+                name="catalog_loan_borrower_idx",
+            ),
+        ]
+
         # These permissions give access to specific functionalities
         permissions = (("can_mark_returned", "Set book as returned"),)
 
     def __str__(self):
         """String for representing the Model object."""
         return f"{self.id} ({self.book.title})"
+
+
+class HoldQuerySet(models.QuerySet):
+    """Queries over the hold queues of the books"""
+
+    def waiting(self) -> "HoldQuerySet":
+        """Returns the holds still waiting for a copy"""
+
+        return self.filter(status__exact="w")
+
+    def active(self) -> "HoldQuerySet":
+        """Returns the holds waiting for a copy or for their patron"""
+
+        return self.filter(status__in=("w", "r"))
+
+    def next_for(self, book_id) -> "Hold":
+        """Returns the hold of the book that is served next, or None
+
+        The lookup is a single seek into the queue index.
+        """
+
+        return self.waiting().filter(book=book_id).order_by("id").first()
+
+    def with_position(self) -> "HoldQuerySet":
+        """Annotates each waiting hold with its place in the queue of its book, from 1
+
+        The place is counted over the queue index, from the front of the queue
+        up to the hold.
+        """
+
+        ahead = (
+            Hold.objects.waiting()
+            .filter(book=OuterRef("book"), id__lt=OuterRef("id"))
+            .order_by()
+            .values("book")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return self.annotate(
+            position=Case(
+                When(
+                    status__exact="w",
+                    then=Coalesce(Subquery(ahead), Value(0)) + Value(1),
+                ),
+                default=Value(None),
+                output_field=models.IntegerField(),
+            )
+        )
+
+
+class Hold(models.Model):
+    """Model representing a patron waiting for a copy of a book.
+
+    The holds of a book are served first come, first served: the queue is
+    ordered by id, which only grows, so placing or cancelling a hold never
+    renumbers the others. When a copy of the book becomes available it is
+    reserved for the first waiting hold (see catalog.circulation), which is
+    then ready for its patron to pick up.
+    """
+
+    HOLD_STATUS = (
+        ("w", "Waiting"),
+        ("r", "Ready for pickup"),
+        ("f", "Fulfilled"),
+        ("c", "Cancelled"),
+    )
+
+    book = models.ForeignKey("Book", on_delete=models.CASCADE)
+    patron = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default="w")
+    copy = models.ForeignKey(
+        BookInstance, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    placed_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+
+    objects = HoldQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["id"]
+
+        # The queue index only holds the waiting holds, so finding the next
+        # hold of a book or the place of a hold never reads the served ones
+        indexes = [
+            models.Index(
+                fields=["book", "id"],
+                condition=Q(status="w"),
+                name="catalog_hold_queue_idx",
+            ),
+            models.Index(
+                fields=["ready_at", "id"],
+                condition=Q(status="r"),
+                name="catalog_hold_ready_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["patron", "book"],
+                condition=Q(status__in=("w", "r")),
+                name="catalog_hold_one_per_patron",
+            )
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f"Hold of {self.book} for {self.patron} ({self.get_status_display()})"
+
+
+class CatalogStats(models.Model):
+    """Model storing denormalized record counts shown on the home page.
+
+    There is only ever a single row (pk=1). The counters are kept up to date
+    by the signal handlers in catalog.signals, so the home page can read every
+    count with one primary key lookup instead of running a COUNT(*) per table.
+    The rebuild_catalog_stats management command recomputes the row if the
+    counters ever drift (e.g. after bulk_create or queryset.update calls).
+    """
+
+    SINGLETON_PK = 1
+
+    count_of_books = models.IntegerField(default=0)
+    count_of_authors = models.IntegerField(default=0)
+    count_of_genres = models.IntegerField(default=0)
+    count_of_languages = models.IntegerField(default=0)
+    count_of_bookinstances = models.IntegerField(default=0)
+    count_of_available_books = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        verbose_name_plural = "catalog stats"
+
+    @classmethod
+    def load(cls) -> "CatalogStats":
+        """Returns the statistics row, building it from the tables if it does not exist yet."""
+
+        try:
+            return cls.objects.get(pk=cls.SINGLETON_PK)
+        except cls.DoesNotExist:
+            return cls.rebuild()
+
+    @classmethod
+    def rebuild(cls, using: str = DEFAULT_DB_ALIAS) -> "CatalogStats":
+        """Recomputes every counter from the real tables and stores the result."""
+
+        stats, _ = cls.objects.using(using).update_or_create(
+            pk=cls.SINGLETON_PK,
+            defaults={
+                "count_of_books": Book.objects.using(using).count(),
+                "count_of_authors": Author.objects.using(using).count(),
+                "count_of_genres": Genre.objects.using(using).count(),
+                "count_of_languages": Language.objects.using(using).count(),
+                "count_of_bookinstances": BookInstance.objects.using(using).count(),
+                "count_of_available_books": BookInstance.objects.using(using)
+                .filter(status__exact="a")
+                .count(),
+            },
+        )
+        return stats
+
+    @classmethod
+    def increment(cls, using: str = DEFAULT_DB_ALIAS, **deltas: int) -> None:
+        """Atomically adds the given deltas to the counters, e.g. increment(count_of_books=1)
+
+        The update runs in the database using F() expressions so that concurrent
+        requests cannot overwrite each other's changes. If the row does not exist
+        yet nothing is written; it is built from the real tables on first load.
+        """
+
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        cls.objects.using(using).filter(pk=cls.SINGLETON_PK).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f"Catalog stats ({self.count_of_books} books)"
+
+
+class OverdueNoticeRun(models.Model):
+    """Model recording how far the overdue notices of a day have been sent.
+
+    The send_overdue_notices command sends the notices in borrower id order
+    and stores the id of the last borrower of every batch it sends, so a run
+    that stopped half way resumes after that borrower instead of emailing
+    everyone again.
+    """
+
+    run_date = models.DateField(unique=True)
+    last_borrower_id = models.IntegerField(default=0)
+    count_of_sent = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f"Overdue notices of {self.run_date} ({self.count_of_sent} sent)"
@@ -0,0 +1,138 @@
+"""Overdue and due-soon notices for borrowers
+
+The loans to notify about are read with one query ordered by borrower, and
+grouped into one message per borrower while they are read. Every message is
+rendered once and the messages are sent in batches over a single mail
+connection that stays open for the whole run.
+
+Progress is stored in an OverdueNoticeRun row for the day after every batch,
+so a run that stopped half way resumes after the last borrower of the last
+batch sent. A crash while a batch is being sent can make the borrowers of
+that batch receive their notice twice, but never no notice at all.
+"""
+
+import itertools
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import BookInstance, OverdueNoticeRun
+
+# Copies due back within this many days are mentioned as due soon
+DEFAULT_DUE_SOON_DAYS = 3
+
+# Number of messages handed to the mail connection at a time
+DEFAULT_BATCH_SIZE = 100
+
+# Number of loans fetched from the database at a time
+LOAN_CHUNK_SIZE = 2000
+
+
+class OverdueNotifier:
+    """Sends one notice to every borrower with overdue or due-soon copies"""
+
+    def __init__(
+        self,
+        today: date = None,
+        due_soon_days: int = DEFAULT_DUE_SOON_DAYS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        using: str = DEFAULT_DB_ALIAS,
+    ):
+        self.today = today or date.today()
+        self.due_soon_days = due_soon_days
+        self.batch_size = batch_size
+        self.using = using
+
+    def get_run(self, restart: bool = False) -> OverdueNoticeRun:
+        """Returns the progress of the notices of the day, starting over if asked to"""
+
+        run, created = OverdueNoticeRun.objects.using(self.using).get_or_create(
+            run_date=self.today
+        )
+        if restart and not created:
+            run.last_borrower_id = 0
+            run.count_of_sent = 0
+            run.finished_at = None
+            run.save(using=self.using)
+        return run
+
+    def get_loans(self, after_borrower_id: int = 0):
+        """Returns the loans to notify about, grouped by borrower in id order"""
+
+        return (
+            BookInstance.objects.using(self.using)
+            .on_loan()
+            .filter(
+                due_back__lte=self.today + timedelta(days=self.due_soon_days),
+                borrower_id__gt=after_borrower_id,
+            )
+            .exclude(borrower__email="")
+            .select_related("book", "borrower")
+            .order_by("borrower_id", "due_back", "id")
+        )
+
+    def render(self, borrower, loans) -> EmailMessage:
+        """Returns the notice of a borrower about the given loans"""
+
+        overdue = [loan for loan in loans if loan.due_back < self.today]
+        due_soon = [loan for loan in loans if loan.due_back >= self.today]
+        context = {
+            "borrower": borrower,
+            "overdue": overdue,
+            "due_soon": due_soon,
+            "today": self.today,
+        }
+
+        subject = render_to_string("catalog/email/overdue_notice_subject.txt", context)
+        body = render_to_string("catalog/email/overdue_notice.txt", context)
+        return EmailMessage(
+            " ".join(subject.split()),
+            body,
+            settings.DEFAULT_FROM_EMAIL,
+            [borrower.email],
+        )
+
+    def messages(self, after_borrower_id: int = 0):
+        """Yields the id of every borrower to notify with the rendered notice"""
+
+        loans = self.get_loans(after_borrower_id).iterator(chunk_size=LOAN_CHUNK_SIZE)
+        for _, borrower_loans in itertools.groupby(
+            loans, key=lambda loan: loan.borrower_id
+        ):
+            borrower_loans = list(borrower_loans)
+            borrower = borrower_loans[0].borrower
+            yield borrower.pk, self.render(borrower, borrower_loans)
+
+    def send(self, restart: bool = False, progress=None) -> OverdueNoticeRun:
+        """Sends the notices that were not sent yet today and returns the run
+
+        progress is called with the run after every batch.
+        """
+
+        run = self.get_run(restart)
+        if run.finished_at:
+            return run
+
+        messages = self.messages(run.last_borrower_id)
+
+        with get_connection() as connection:
+            while True:
+                batch = list(itertools.islice(messages, self.batch_size))
+                if not batch:
+                    break
+
+                connection.send_messages([message for _, message in batch])
+
+                run.last_borrower_id = batch[-1][0]
+                run.count_of_sent += len(batch)
+                run.save(using=self.using)
+                if progress:
+                    progress(run)
+
+        run.finished_at = timezone.now()
+        run.save(using=self.using)
+        return run
@@ -0,0 +1,381 @@
+"""Keyset (seek) pagination for catalog list views
+
+Django's Paginator pages with OFFSET and needs a COUNT(*) of the whole result
+to know the number of pages, so the cost of a page grows with its depth and
+with the size of the table. The classes in this module page by remembering
+the ordering key of the last row shown and asking the database for the rows
+that come after it. With an index on the ordering key every page costs the
+same as the first one.
+
+The position is passed between requests in an opaque, signed ?after= or
+?before= token. A total is not needed to page through the results; an
+approximate one can be shown by enabling approximate_total on the view.
+"""
+
+import json
+import operator
+from functools import reduce
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+from django.http import Http404, QueryDict
+from django.utils.functional import cached_property
+
+# The salt keeps pagination tokens from being accepted anywhere else
+CURSOR_SALT = "catalog.pagination"
+
+AFTER_PARAM = "after"
+BEFORE_PARAM = "before"
+
+
+def estimate_count(queryset: QuerySet, exact_below: int = 0) -> int:
+    """Returns the number of rows in the queryset without counting them if possible
+
+    PostgreSQL can tell how many rows it expects from the query plan, which
+    costs the same no matter how large the table is. Other backends have no
+    such estimate, so the rows are counted exactly. Estimates below
+    exact_below are replaced by an exact count, which is cheap for few rows.
+    """
+
+    connection = connections[queryset.db]
+
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+
+    # psycopg2 decodes the json column, other drivers may return text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < exact_below:
+        return queryset.count()
+    return estimate
+
+
+class KeysetKey:
+    """A single column of the keyset ordering, e.g. "-due_back" """
+
+    def __init__(self, model, name: str):
+        self.descending = name.startswith("-")
+        self.name = name.lstrip("-")
+
+        field = (
+            model._meta.pk if self.name == "pk" else model._meta.get_field(self.name)
+        )
+        self.field = field
+        self.attname = field.attname
+        self.nullable = field.null
+
+    def order_by(self, forward: bool):
+        """Returns the ordering expression when walking forward or backward"""
+
+        descending = self.descending != (not forward)
+        expression = F(self.name)
+
+        if not self.nullable:
+            return expression.desc() if descending else expression.asc()
+
+        # Nulls always come after every value when walking forward
+        if descending:
+            return expression.desc(nulls_first=not forward, nulls_last=forward)
+        return expression.asc(nulls_first=not forward, nulls_last=forward)
+
+    def value(self, obj):
+        """Returns the key value of a row or values() dict in a form that can be stored in a token"""
+
+        if isinstance(obj, dict):
+            value = obj[self.attname]
+        else:
+            value = getattr(obj, self.attname)
+        if value is None or isinstance(value, (bool, int, str)):
+            return value
+        return str(value)
+
+    def to_python(self, value):
+        """Converts a value read from a token back to the field type"""
+
+        return None if value is None else self.field.to_python(value)
+
+    def equal(self, value) -> Q:
+        """Returns a filter for rows that tie with the value on this key"""
+
+        if value is None:
+            return Q(**{f"{self.name}__isnull": True})
+        return Q(**{self.name: value})
+
+    def at_or_beyond(self, value, forward: bool, nulls: bool = True) -> Q:
+        """Returns a filter for rows that tie with or come after the value on this key
+
+        Walking forward the nulls come after every value; they are left out
+        when nulls is false.
+        """
+
+        descending = self.descending != (not forward)
+        lookup = "lte" if descending else "gte"
+        condition = Q(**{f"{self.name}__{lookup}": value})
+
+        if self.nullable and forward and nulls:
+            condition |= Q(**{f"{self.name}__isnull": True})
+
+        return condition
+
+    def beyond(self, value, forward: bool, nulls: bool = True) -> Q:
+        """Returns a filter for rows that come strictly after the value on this key
+
+        Walking forward the nulls come after every value; they are left out
+        when nulls is false.
+        """
+
+        if value is None:
+            # Walking forward nothing comes after the nulls,
+            # walking backward every value comes after them
+            if forward:
+                return Q(pk__in=[])
+            return Q(**{f"{self.name}__isnull": False})
+
+        descending = self.descending != (not forward)
+        lookup = "lt" if descending else "gt"
+        condition = Q(**{f"{self.name}__{lookup}": value})
+
+        if self.nullable and forward and nulls:
+            condition |= Q(**{f"{self.name}__isnull": True})
+
+        return condition
+
+
+class KeysetPage:
+    """A page of results, offering the parts of django.core.paginator.Page used by templates"""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Pages a queryset by seeking past the ordering key of the previous page
+
+    The ordering must identify every row uniquely, so it should end with the
+    primary key.
+    """
+
+    def __init__(
+        self, queryset: QuerySet, per_page: int, ordering, approximate_total=False
+    ):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = [KeysetKey(queryset.model, name) for name in ordering]
+        self.approximate_total = approximate_total
+
+    @cached_property
+    def approximate_count(self):
+        """The estimated number of rows in all pages, if enabled"""
+
+        if not self.approximate_total:
+            return None
+        return estimate_count(self.queryset)
+
+    def encode_cursor(self, obj) -> str:
+        """Returns an opaque token for the position of the given row or values() dict"""
+
+        return signing.dumps([key.value(obj) for key in self.keys], salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor: str) -> list:
+        """Returns the key values stored in a token, raising Http404 if it is invalid"""
+
+        try:
+            values = signing.loads(cursor, salt=CURSOR_SALT)
+            if len(values) != len(self.keys):
+                raise ValueError
+            return [key.to_python(value) for key, value in zip(self.keys, values)]
+        except (signing.BadSignature, TypeError, ValueError, ValidationError) as error:
+            raise Http404("Invalid page token.") from error
+
+    def seek_filter(self, values, forward: bool, nulls: bool = True) -> Q:
+        """Returns a filter for the rows after the position when walking forward or backward
+
+        With nulls false, the rows whose first key is null are left out.
+        """
+
+        conditions = []
+        ties = Q()
+
+        for index, (key, value) in enumerate(zip(self.keys, values)):
+            key_nulls = nulls or index > 0
+            conditions.append(ties & key.beyond(value, forward, key_nulls))
+            ties &= key.equal(value)
+
+        condition = reduce(operator.or_, conditions)
+
+        # The OR of the conditions above is not a range the database can seek
+        # to in an index; repeating the bound on the first key makes it one
+        first_key, first_value = self.keys[0], values[0]
+        if first_value is not None:
+            condition = first_key.at_or_beyond(first_value, forward, nulls) & condition
+
+        return condition
+
+    def page_queryset(self, after: str = None, before: str = None) -> QuerySet:
+        """Returns the queryset walking from the `after` or `before` token, or from the start"""
+
+        forward = before is None
+        cursor = after if forward else before
+
+        queryset = self.queryset.order_by(*(key.order_by(forward) for key in self.keys))
+
+        if cursor:
+            queryset = queryset.filter(
+                self.seek_filter(self.decode_cursor(cursor), forward)
+            )
+
+        return queryset
+
+    def fetch(self, after: str = None, before: str = None, fields=None) -> list:
+        """Returns the rows of a page and the row that follows it
+
+        When walking forward from a value of a nullable first key, "after the
+        value or null" is not a range of an index. The rows after the value
+        are read with a range scan first, and the rows with a null key, which
+        come after all of them, only if the page is not full yet.
+        """
+
+        forward = before is None
+        cursor = after if forward else before
+        limit = self.per_page + 1
+
+        queryset = self.queryset.order_by(*(key.order_by(forward) for key in self.keys))
+        if fields:
+            queryset = queryset.values_list(*fields)
+
+        if not cursor:
+            return list(queryset[:limit])
+
+        values = self.decode_cursor(cursor)
+        first_key = self.keys[0]
+
+        if not (forward and first_key.nullable and values[0] is not None):
+            return list(queryset.filter(self.seek_filter(values, forward))[:limit])
+
+        rows = list(queryset.filter(self.seek_filter(values, forward, False))[:limit])
+        if len(rows) < limit:
+            rows += queryset.filter(first_key.equal(None))[: limit - len(rows)]
+        return rows
+
+    def page_values(self, *fields, after: str = None, before: str = None) -> list:
+        """Returns the given fields of the rows of a page, and of the row that follows it"""
+
+        return self.fetch(after, before, fields)
+
+    def page(self, after: str = None, before: str = None) -> KeysetPage:
+        """Returns the page after the `after` token, before the `before` token, or the first page"""
+
+        forward = before is None
+        cursor = after if forward else before
+
+        # One extra row tells whether there is another page in this direction
+        rows = self.fetch(after, before)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        has_previous = bool(cursor) if forward else has_more
+
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_next else None,
+            previous_cursor=(
+                self.encode_cursor(rows[0]) if rows and has_previous else None
+            ),
+        )
+
+
+class KeysetPaginationMixin:
+    """Replaces the OFFSET pagination of a ListView with keyset pagination
+
+    Views set keyset_ordering to an indexed, unique ordering and paginate_by as
+    usual. Setting approximate_total shows an estimate of the number of results.
+    The query parameters named in keyset_params, e.g. filters, are kept in the
+    links to the other pages.
+    """
+
+    keyset_ordering = ("pk",)
+    keyset_params = ()
+    approximate_total = False
+
+    def get_keyset_ordering(self) -> tuple:
+        """Returns the ordering the pages are found with"""
+
+        return self.keyset_ordering
+
+    def get_keyset_paginator(self, queryset, page_size) -> KeysetPaginator:
+        """Returns the paginator for the queryset of the view"""
+
+        return KeysetPaginator(
+            queryset,
+            page_size,
+            self.get_keyset_ordering(),
+            approximate_total=self.approximate_total,
+        )
+
+    def get_context_data(self, **kwargs) -> dict:
+        """Adds keyset_query, the kept query parameters to prefix page links with"""
+
+        context = super().get_context_data(**kwargs)
+        params = QueryDict(mutable=True)
+        for param in self.keyset_params:
+            if self.request.GET.get(param):
+                params[param] = self.request.GET[param]
+        context["keyset_query"] = params.urlencode() + "&" if params else ""
+        return context
+
+    def get_page_values(self, *fields) -> list:
+        """Returns the given fields of the rows on the requested page without loading the rows"""
+
+        queryset = self.get_queryset()
+        paginator = self.get_keyset_paginator(queryset, self.get_paginate_by(queryset))
+        return paginator.page_values(
+            *fields,
+            after=self.request.GET.get(AFTER_PARAM),
+            before=self.request.GET.get(BEFORE_PARAM),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate the queryset using the ?after= or ?before= token of the request"""
+
+        paginator = self.get_keyset_paginator(queryset, page_size)
+        page = paginator.page(
+            after=self.request.GET.get(AFTER_PARAM),
+            before=self.request.GET.get(BEFORE_PARAM),
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,224 @@
+"""Full-text search over the books of the catalog
+
+Every book has one document in a search table made of its title, author
+name, genre names and summary. On SQLite the table is an FTS5 virtual table
+ranked with bm25(); on PostgreSQL it holds a weighted tsvector with a GIN
+index and is ranked with ts_rank(). Other backends fall back to a plain
+icontains filter.
+
+The documents are rebuilt with INSERT ... SELECT statements, so reindexing
+all the books of an author or a genre is a single statement. The signal
+handlers in catalog.signals keep the table up to date when books, authors
+and genres change, and the rebuild_search_index management command rebuilds
+it after bulk loads.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+
+from .models import Author, Book, Genre
+
+
+SEARCH_TABLE = "catalog_book_search"
+
+# PostgreSQL text search configuration used to build and query documents
+SEARCH_CONFIG = "english"
+
+# Searches return at most this many of the best matching books
+SEARCH_RESULTS_LIMIT = 100
+
+# bm25() weights of the title, author, genre and summary columns on SQLite
+SQLITE_COLUMN_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+
+def _tables() -> dict:
+    """Returns the names of the tables used to build documents"""
+
+    return {
+        "search": SEARCH_TABLE,
+        "book": Book._meta.db_table,
+        "author": Author._meta.db_table,
+        "genre": Genre._meta.db_table,
+        "book_genre": Book.genre.through._meta.db_table,
+    }
+
+
+def search_terms(query: str) -> list:
+    """Splits a search query into words, dropping any search syntax characters"""
+
+    return re.findall(r"\w+", query.lower())
+
+
+def create_search_index(connection) -> None:
+    """Creates the search table for the backend of the given connection"""
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                "USING fts5(title, author, genre, summary, tokenize='porter unicode61')"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"book_id bigint PRIMARY KEY REFERENCES {Book._meta.db_table} (id) "
+                "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+
+def _reindex(where: str, params, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Rebuilds the documents of the books matching a condition on the book table `b`"""
+
+    connection = connections[using]
+    tables = _tables()
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {tables['search']} WHERE rowid IN "
+                f"(SELECT b.id FROM {tables['book']} b WHERE {where})",
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {tables['search']} (rowid, title, author, genre, summary) "
+                "SELECT b.id, b.title, "
+                "COALESCE(a.first_name || ' ' || a.last_name, ''), "
+                "COALESCE((SELECT group_concat(g.name, ' ') "
+                f"FROM {tables['book_genre']} bg JOIN {tables['genre']} g "
+                "ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''), "
+                "b.summary "
+                f"FROM {tables['book']} b LEFT JOIN {tables['author']} a "
+                f"ON a.id = b.author_id WHERE {where}",
+                params,
+            )
+
+    elif connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tables['search']} (book_id, document) "
+                "SELECT b.id, "
+                "setweight(to_tsvector(%s, b.title), 'A') || "
+                "setweight(to_tsvector(%s, COALESCE(a.first_name, '') || ' ' "
+                "|| COALESCE(a.last_name, '')), 'B') || "
+                "setweight(to_tsvector(%s, COALESCE((SELECT string_agg(g.name, ' ') "
+                f"FROM {tables['book_genre']} bg JOIN {tables['genre']} g "
+                "ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C') || "
+                "setweight(to_tsvector(%s, b.summary), 'D') "
+                f"FROM {tables['book']} b LEFT JOIN {tables['author']} a "
+                f"ON a.id = b.author_id WHERE {where} "
+                "ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                [SEARCH_CONFIG] * 4 + list(params),
+            )
+
+
+def index_books(book_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Rebuilds the documents of the given books"""
+
+    book_ids = list(book_ids)
+    if book_ids:
+        placeholders = ", ".join(["%s"] * len(book_ids))
+        _reindex(f"b.id IN ({placeholders})", book_ids, using)
+
+
+def index_books_by_author(author_id: int, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Rebuilds the documents of every book written by the author"""
+
+    _reindex("b.author_id = %s", [author_id], using)
+
+
+def index_books_by_genre(genre_id: int, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Rebuilds the documents of every book in the genre"""
+
+    _reindex(
+        f"b.id IN (SELECT book_id FROM {_tables()['book_genre']} WHERE genre_id = %s)",
+        [genre_id],
+        using,
+    )
+
+
+def remove_books(book_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Removes the documents of deleted books"""
+
+    book_ids = list(book_ids)
+    connection = connections[using]
+
+    # PostgreSQL removes the documents itself through the cascading foreign key
+    if not book_ids or connection.vendor != "sqlite":
+        return
+
+    placeholders = ", ".join(["%s"] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", book_ids
+        )
+
+
+def rebuild_index(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Rebuilds the documents of every book in the catalog"""
+
+    connection = connections[using]
+
+    if connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        _reindex("1 = 1", [], using)
+
+
+def search_book_ids(
+    query: str, limit: int = SEARCH_RESULTS_LIMIT, using: str = DEFAULT_DB_ALIAS
+) -> list:
+    """Returns the ids of the books matching every word of the query, best match first
+
+    Each word also matches longer words starting with it, so results show up
+    while the user is still typing.
+    """
+
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    connection = connections[using]
+
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in SQLITE_COLUMN_WEIGHTS)
+        sql = (
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s"
+        )
+        params = [match, limit]
+
+    elif connection.vendor == "postgresql":
+        sql = (
+            f"SELECT book_id FROM {SEARCH_TABLE}, to_tsquery(%s, %s) query "
+            "WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s"
+        )
+        params = [SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms), limit]
+
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term)
+                | Q(summary__icontains=term)
+                | Q(author__first_name__icontains=term)
+                | Q(author__last_name__icontains=term)
+                | Q(genre__name__icontains=term)
+            )
+        return list(
+            Book.objects.using(using)
+            .filter(condition)
+            .values_list("id", flat=True)
+            .distinct()[:limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,309 @@
+"""Signal handlers for the catalog application
+
+The handlers keep denormalized data in step with the tables it is built
+from: the CatalogStats counters, the copy counters of the books, the
+full-text search index, the author autocompletion index and the updated_at
+timestamps that version the cached page fragments. They are connected in
+CatalogConfig.ready().
+"""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from . import autocomplete, caching, search
+from .models import Author, Book, BookInstance, CatalogStats, Genre, Language
+
+# Maps every counted CatalogModel subclass to its counter in CatalogStats
+STATS_COUNTERS = {
+    Book: "count_of_books",
+    Author: "count_of_authors",
+    Genre: "count_of_genres",
+    Language: "count_of_languages",
+    BookInstance: "count_of_bookinstances",
+}
+
+AVAILABLE_STATUS = "a"
+
+
+def _is_available(status) -> int:
+    """Returns 1 if the status counts as an available copy, 0 otherwise"""
+
+    return 1 if status == AVAILABLE_STATUS else 0
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_loaded_status(sender, instance: BookInstance, **kwargs) -> None:
+    """Stores the status and book a copy was loaded with so that a later save can tell if they changed"""
+
+    # Reading the attribute directly avoids a query when status is a deferred field
+    instance._loaded_status = instance.__dict__.get("status")
+    instance._loaded_book_id = instance.__dict__.get("book_id")
+
+
+def _move_copy(book_id, old_status, new_status, using: str) -> None:
+    """Moves a copy between the counters of its book, see BookQuerySet.move_copies"""
+
+    if book_id is not None:
+        Book.objects.using(using).filter(pk=book_id).move_copies(old_status, new_status)
+
+
+def update_book_counts(instance: BookInstance, created: bool, using: str) -> None:
+    """Updates the copy counters of the books of a created or changed copy"""
+
+    if created:
+        _move_copy(instance.book_id, None, instance.status, using)
+    elif instance.book_id != instance._loaded_book_id:
+        _move_copy(instance._loaded_book_id, instance._loaded_status, None, using)
+        _move_copy(instance.book_id, None, instance.status, using)
+    elif instance.status != instance._loaded_status:
+        _move_copy(instance.book_id, instance._loaded_status, instance.status, using)
+
+    # touch_copy_pages also refreshes the pages of the book the copy moved from
+    if instance._loaded_book_id != instance.book_id:
+        instance._previous_book_id = instance._loaded_book_id
+    instance._loaded_book_id = instance.book_id
+
+
+def update_counts_on_save(sender, instance, created: bool, raw: bool, **kwargs) -> None:
+    """Increments the counter of the saved model when a new row is created"""
+
+    if raw:
+        return
+
+    deltas = {}
+
+    if created:
+        deltas[STATS_COUNTERS[sender]] = 1
+
+    if sender is BookInstance:
+        update_book_counts(instance, created, kwargs["using"])
+        previous_status = None if created else instance._loaded_status
+        deltas["count_of_available_books"] = _is_available(
+            instance.status
+        ) - _is_available(previous_status)
+        instance._loaded_status = instance.status
+
+    CatalogStats.increment(using=kwargs["using"], **deltas)
+
+
+def update_counts_on_delete(sender, instance, **kwargs) -> None:
+    """Decrements the counter of the deleted model"""
+
+    deltas = {STATS_COUNTERS[sender]: -1}
+
+    if sender is BookInstance:
+        deltas["count_of_available_books"] = -_is_available(instance._loaded_status)
+        _move_copy(
+            instance.book_id, instance._loaded_status or "", None, kwargs["using"]
+        )
+
+    CatalogStats.increment(using=kwargs["using"], **deltas)
+
+
+for model in STATS_COUNTERS:
+    post_save.connect(update_counts_on_save, sender=model)
+    post_delete.connect(update_counts_on_delete, sender=model)
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance: Book, raw: bool, using: str, **kwargs) -> None:
+    """Rebuilds the search document of a created or edited book"""
+
+    if not raw:
+        search.index_books([instance.pk], using)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance: Book, using: str, **kwargs) -> None:
+    """Removes the search document of a deleted book"""
+
+    search.remove_books([instance.pk], using)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_genres(
+    sender, instance, action: str, reverse: bool, pk_set, using: str, **kwargs
+) -> None:
+    """Rebuilds the search documents of books whose genres changed
+
+    When the relation is changed from the genre side, instance is the genre
+    and pk_set holds the books.
+    """
+
+    if action == "pre_clear":
+        # The affected books cannot be found once the relation is cleared
+        instance._affected_book_ids = (
+            list(instance.book_set.values_list("id", flat=True))
+            if reverse
+            else [instance.pk]
+        )
+    elif action == "post_clear":
+        search.index_books(instance._affected_book_ids, using)
+        caching.touch_books(using, pk__in=instance._affected_book_ids)
+    elif action in ("post_add", "post_remove"):
+        book_ids = pk_set if reverse else [instance.pk]
+        search.index_books(book_ids, using)
+        caching.touch_books(using, pk__in=book_ids)
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(
+    sender, instance: Author, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Rebuilds the search documents of the books of a renamed author"""
+
+    if not created and not raw:
+        search.index_books_by_author(instance.pk, using)
+
+
+@receiver(post_save, sender=Genre)
+def index_genre_books(
+    sender, instance: Genre, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Rebuilds the search documents of the books of a renamed genre"""
+
+    if not created and not raw:
+        search.index_books_by_genre(instance.pk, using)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def remember_affected_books(sender, instance, **kwargs) -> None:
+    """Stores which books refer to an author, genre or language that is about to be deleted"""
+
+    instance._affected_book_ids = list(instance.book_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_books_of_deleted(sender, instance, using: str, **kwargs) -> None:
+    """Rebuilds the search documents of books that lost their author or a genre"""
+
+    search.index_books(instance._affected_book_ids, using)
+
+
+@receiver(post_init, sender=Book)
+def remember_loaded_author(sender, instance: Book, **kwargs) -> None:
+    """Stores the author a book was loaded with so that a later save can tell if it changed"""
+
+    instance._loaded_author_id = instance.__dict__.get("author_id")
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def touch_book_authors(
+    sender, instance: Book, using: str, raw: bool = False, **kwargs
+) -> None:
+    """Refreshes the pages of the authors listing a changed book"""
+
+    if not raw:
+        caching.touch_authors(
+            using, pk__in={instance._loaded_author_id, instance.author_id}
+        )
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_copy_pages(
+    sender, instance: BookInstance, using: str, raw: bool = False, **kwargs
+) -> None:
+    """Refreshes the pages of the books of a changed copy and the pages of their authors
+
+    A copy moved to another book changes the pages of both books.
+    """
+
+    book_ids = {instance.book_id, instance.__dict__.pop("_previous_book_id", None)}
+    book_ids.discard(None)
+    if raw or not book_ids:
+        return
+
+    caching.touch_books(using, pk__in=book_ids)
+    caching.touch_authors(using, book__in=book_ids)
+
+
+@receiver(post_save, sender=Author)
+def touch_author_book_pages(
+    sender, instance: Author, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Refreshes the pages of the books of an edited author"""
+
+    if not created and not raw:
+        caching.touch_books(using, author=instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+def touch_genre_book_pages(
+    sender, instance: Genre, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Refreshes the pages of the books of an edited genre"""
+
+    if not created and not raw:
+        caching.touch_books(using, genre=instance.pk)
+
+
+@receiver(post_save, sender=Language)
+def touch_language_book_pages(
+    sender, instance: Language, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Refreshes the pages of the books of an edited language"""
+
+    if not created and not raw:
+        caching.touch_books(using, language=instance.pk)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def touch_pages_of_deleted(sender, instance, using: str, **kwargs) -> None:
+    """Refreshes the pages of books that lost their author, a genre or their language"""
+
+    caching.touch_books(using, pk__in=instance._affected_book_ids)
+
+
+@receiver(post_save, sender=Book)
+def touch_book_copies(
+    sender, instance: Book, created: bool, raw: bool, using: str, **kwargs
+) -> None:
+    """Refreshes the loan list rows of the copies of an edited book"""
+
+    if not created and not raw:
+        caching.touch_copies(using, book=instance.pk)
+
+
+@receiver(post_init, sender=Author)
+def remember_loaded_name(sender, instance: Author, **kwargs) -> None:
+    """Stores the name an author was loaded with so that a later save can remove it"""
+
+    if "first_name" in instance.__dict__ and "last_name" in instance.__dict__:
+        instance._loaded_name = (instance.first_name, instance.last_name)
+    else:
+        instance._loaded_name = None
+
+
+@receiver(post_save, sender=Author)
+def index_author_name(
+    sender, instance: Author, raw: bool, using: str, **kwargs
+) -> None:
+    """Puts the current name of a saved author in the autocompletion index"""
+
+    if raw:
+        return
+
+    name = (instance.first_name, instance.last_name)
+    autocomplete.author_index(using).update(instance.pk, instance._loaded_name, name)
+    instance._loaded_name = name
+
+
+@receiver(post_delete, sender=Author)
+def unindex_author_name(sender, instance: Author, using: str, **kwargs) -> None:
+    """Removes the name of a deleted author from the autocompletion index"""
+
+    autocomplete.author_index(using).update(instance.pk, instance._loaded_name, None)
@@ -0,0 +1,360 @@
+"""Synthetic catalog data for seeding and benchmarking
+
+generate() fills a database with a catalog shaped like a real library from
+nothing but a number of copies, so the same workload can be measured at any
+scale from a thousand to tens of millions of copies. Every other table grows
+with it: one book per COPIES_PER_BOOK copies, one author per BOOKS_PER_AUTHOR
+books and one borrower per COPIES_PER_BORROWER copies, on average.
+
+The data is skewed the way circulation data is: a few authors write many of
+the books, a few books have many of the copies, most books are in a few
+languages and a few readers borrow most of the loans. Copies are mostly on
+the shelf; loans are mostly recent, with a long tail of overdue ones.
+
+The rows are written with multi-row INSERT statements (see
+catalog.importing.insert_rows) in one transaction, which bypass save() and
+its signals, so the search index, the CatalogStats counters and the copy
+counters of the new books are rebuilt at the end. Genres and languages that
+already exist are reused by name and the new rows are added after the
+existing ones, so a catalog can be seeded more than once. The same seed always generates the same catalog.
+"""
+
+import itertools
+import random
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import search
+from .importing import insert_rows
+from .models import (
+    COPY_COUNTERS,
+    Author,
+    Book,
+    BookInstance,
+    CatalogStats,
+    Genre,
+    Language,
+)
+
+COPIES_PER_BOOK = 20
+BOOKS_PER_AUTHOR = 5
+COPIES_PER_BORROWER = 100
+
+GENRES = (
+    "Fiction",
+    "Fantasy",
+    "Science Fiction",
+    "Mystery",
+    "Thriller",
+    "Romance",
+    "Historical Fiction",
+    "Horror",
+    "Poetry",
+    "Drama",
+    "Biography",
+    "History",
+    "Science",
+    "Philosophy",
+    "Travel",
+    "Cooking",
+    "Art",
+    "Children",
+    "Young Adult",
+    "Classic",
+)
+
+# Languages with the share of the books written in them
+LANGUAGES = {
+    "English": 60,
+    "Urdu": 10,
+    "Spanish": 6,
+    "French": 6,
+    "German": 5,
+    "Arabic": 4,
+    "Chinese": 3,
+    "Russian": 2,
+    "Japanese": 2,
+    "Italian": 2,
+}
+
+FIRST_NAMES = (
+    "Ahmed Aisha Alice Amir Anna Carlos Chen David Elena Emma Fatima Hassan "
+    "Ibrahim Isabel James John Julia Kenji Laura Layla Leo Maria Mei Mohammed "
+    "Nadia Noah Olga Omar Pierre Priya Rosa Sara Sofia Tariq Thomas Usman "
+    "Victor Yusuf Zainab Zoe"
+).split()
+
+LAST_NAMES = (
+    "Ahmed Ali Baker Brown Chaudhry Clark Dubois Fischer Garcia Hashmi Hughes "
+    "Ivanova Jones Kahn Khan Kim Kowalski Lee Lopez Malik Martin Moreau Muller "
+    "Nakamura Nguyen Petrov Qureshi Rossi Santos Schmidt Shah Siddiqui Silva "
+    "Smith Suzuki Taylor Wang Williams Wilson Zhang"
+).split()
+
+TITLE_ADJECTIVES = (
+    "Silent Hidden Last Lost Broken Golden Distant Burning Forgotten Crimson "
+    "Endless Quiet Secret Wild Winter Summer Dark Bright Hollow Shattered"
+).split()
+
+TITLE_NOUNS = (
+    "River Garden Kingdom City Shadow Mirror Letter Journey Ocean Mountain "
+    "Island Storm Library Voyage Crown Forest Harbour Tower Promise Orchard"
+).split()
+
+# The loan statuses of the copies with their share
+STATUS_WEIGHTS = {"a": 70, "o": 20, "m": 5, "r": 5}
+
+# Loans last this many days, and have been out for a number of days that
+# follows an exponential distribution with this mean, so most are due back
+# in the coming weeks and a few are overdue by months
+LOAN_DAYS = 21
+MEAN_DAYS_ON_LOAN = 14
+MAX_DAYS_ON_LOAN = 365
+
+# How much more popular some authors, books and borrowers are than others:
+# each one is chosen with a weight drawn from a log-normal distribution with
+# this sigma, so the most popular of a few thousand gets dozens of times the
+# average share
+POPULARITY_SIGMA = 1.0
+
+INSERT_BATCH_SIZE = 50000
+
+
+def _popularity(count: int, rng: random.Random) -> list:
+    """Returns the cumulative weights of count items of random popularity"""
+
+    return list(
+        itertools.accumulate(
+            rng.lognormvariate(0, POPULARITY_SIGMA) for _ in range(count)
+        )
+    )
+
+
+def _last_id(model, using: str) -> int:
+    """Returns the largest primary key of the table of the model, or 0"""
+
+    return model.objects.using(using).aggregate(last=Max("pk"))["last"] or 0
+
+
+def _ids_after(model, last_id: int, using: str) -> list:
+    """Returns the primary keys of the rows added after last_id, in order"""
+
+    return list(
+        model.objects.using(using)
+        .filter(pk__gt=last_id)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def _isbn(number: int) -> str:
+    """Returns a valid ISBN-13 in the 979 range for the number"""
+
+    digits = f"979{number % 10**9:09d}"
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits))
+    return digits + str(-total % 10)
+
+
+def _names(model, field: str, names, now, using: str) -> list:
+    """Returns the ids of the rows with the given names, inserting the missing ones"""
+
+    objects = model.objects.using(using)
+    existing = set(
+        objects.filter(**{f"{field}__in": names}).values_list(field, flat=True)
+    )
+    insert_rows(
+        model,
+        ("created_at", "updated_at", field),
+        [(now, now, name) for name in names if name not in existing],
+        using,
+    )
+    ids = dict(objects.filter(**{f"{field}__in": names}).values_list(field, "pk"))
+    return [ids[name] for name in names]
+
+
+def generate(copies: int, using: str = DEFAULT_DB_ALIAS, seed: int = 0) -> dict:
+    """Inserts a catalog with the given number of copies and returns its row counts"""
+
+    rng = random.Random(seed)
+    connection = connections[using]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    today = date.today()
+
+    counts = {
+        "books": max(copies // COPIES_PER_BOOK, 1),
+        "borrowers": max(copies // COPIES_PER_BORROWER, 1),
+        "copies": copies,
+    }
+    counts["authors"] = max(counts["books"] // BOOKS_PER_AUTHOR, 1)
+
+    # One transaction, as SQLite commits every row of executemany() otherwise
+    with transaction.atomic(using=using):
+        genre_ids = _names(Genre, "name", GENRES, now, using)
+        language_ids = _names(Language, "language", list(LANGUAGES), now, using)
+
+        last_author = _last_id(Author, using)
+        authors = []
+        for _ in range(counts["authors"]):
+            born = None
+            if rng.random() < 0.6:
+                born = date(rng.randint(1850, 1995), rng.randint(1, 12), 1)
+            died = None
+            if born is not None and rng.random() < 0.7:
+                died = born + timedelta(days=365 * rng.randint(40, 90))
+                if died > today:
+                    died = None
+            authors.append(
+                (
+                    now,
+                    now,
+                    rng.choice(FIRST_NAMES),
+                    rng.choice(LAST_NAMES),
+                    born,
+                    died,
+                )
+            )
+        insert_rows(
+            Author,
+            ("created_at", "updated_at", "first_name", "last_name")
+            + ("date_of_birth", "date_of_death"),
+            authors,
+            using,
+            INSERT_BATCH_SIZE,
+        )
+        author_ids = _ids_after(Author, last_author, using)
+
+        last_user = _last_id(User, using)
+        users = []
+        for i in range(counts["borrowers"]):
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            username = f"{first_name}.{last_name}.{last_user + i}".lower()
+            users.append(
+                (
+                    username,
+                    "!",
+                    first_name,
+                    last_name,
+                    f"{username}@example.com",
+                    False,
+                    False,
+                    True,
+                    now,
+                )
+            )
+        insert_rows(
+            User,
+            ("username", "password", "first_name", "last_name", "email")
+            + ("is_superuser", "is_staff", "is_active", "date_joined"),
+            users,
+            using,
+            INSERT_BATCH_SIZE,
+        )
+        user_ids = _ids_after(User, last_user, using)
+
+        last_book = _last_id(Book, using)
+        author_weights = _popularity(len(author_ids), rng)
+        language_weights = list(LANGUAGES.values())
+        for start in range(0, counts["books"], INSERT_BATCH_SIZE):
+            end = min(start + INSERT_BATCH_SIZE, counts["books"])
+            insert_rows(
+                Book,
+                ("created_at", "updated_at", "title", "summary", "isbn")
+                + ("author_id", "language_id")
+                + COPY_COUNTERS,
+                [
+                    (
+                        now,
+                        now,
+                        f"The {rng.choice(TITLE_ADJECTIVES)} "
+                        f"{rng.choice(TITLE_NOUNS)}",
+                        f"A story of the {rng.choice(TITLE_NOUNS).lower()}.",
+                        _isbn(last_book + i + 1),
+                        author_id,
+                        language_id,
+                    )
+                    + (0,) * len(COPY_COUNTERS)
+                    for i, author_id, language_id in zip(
+                        range(start, end),
+                        rng.choices(
+                            author_ids, cum_weights=author_weights, k=end - start
+                        ),
+                        rng.choices(language_ids, language_weights, k=end - start),
+                    )
+                ],
+                using,
+                INSERT_BATCH_SIZE,
+            )
+        book_ids = _ids_after(Book, last_book, using)
+
+        book_genres = Book.genre.through
+        for start in range(0, len(book_ids), INSERT_BATCH_SIZE):
+            insert_rows(
+                book_genres,
+                ("book_id", "genre_id"),
+                [
+                    (book_id, genre_id)
+                    for book_id in book_ids[start : start + INSERT_BATCH_SIZE]
+                    for genre_id in rng.sample(genre_ids, rng.randint(1, 3))
+                ],
+                using,
+                INSERT_BATCH_SIZE,
+            )
+
+        book_weights = _popularity(len(book_ids), rng)
+        user_weights = _popularity(len(user_ids), rng)
+        id_field = BookInstance._meta.pk
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(STATUS_WEIGHTS.values())
+
+        for start in range(0, copies, INSERT_BATCH_SIZE):
+            size = min(INSERT_BATCH_SIZE, copies - start)
+            rows = []
+            for status, book_id in zip(
+                rng.choices(statuses, status_weights, k=size),
+                rng.choices(book_ids, cum_weights=book_weights, k=size),
+            ):
+                due_back = borrower_id = None
+                if status == "o":
+                    days_on_loan = min(
+                        int(rng.expovariate(1 / MEAN_DAYS_ON_LOAN)), MAX_DAYS_ON_LOAN
+                    )
+                    due_back = today + timedelta(days=LOAN_DAYS - days_on_loan)
+                    borrower_id = rng.choices(user_ids, cum_weights=user_weights)[0]
+                rows.append(
+                    (
+                        id_field.get_db_prep_value(
+                            uuid.UUID(int=rng.getrandbits(128), version=4), connection
+                        ),
+                        now,
+                        now,
+                        book_id,
+                        f"{rng.choice(TITLE_NOUNS)} Press, {rng.randint(1950, 2021)}",
+                        status,
+                        due_back,
+                        borrower_id,
+                    )
+                )
+            insert_rows(
+                BookInstance,
+                ("id", "created_at", "updated_at", "book_id")
+                + ("imprint", "status", "due_back", "borrower_id"),
+                rows,
+                using,
+                INSERT_BATCH_SIZE,
+            )
+
+        # The planner needs statistics to pick the partial indexes
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        search.rebuild_index(using)
+        CatalogStats.rebuild(using)
+        Book.objects.using(using).filter(pk__gt=last_book).recount_copies()
+
+    return counts
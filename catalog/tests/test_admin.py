@@ -0,0 +1,197 @@
+import datetime
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class ChangelistQueryCountTest(TestCase):
+    """Tests that the admin changelists cost the same number of queries for any number of rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser("admin", "admin@example.com", "3Kd9#kQz1!pL")
+        cls.genres = [Genre.objects.create(name=f"Genre {i}") for i in range(4)]
+
+    def setUp(self):
+        self.client.login(username="admin", password="3Kd9#kQz1!pL")
+
+    def add_books(self, count: int) -> None:
+        borrower = User.objects.create_user(f"reader{Book.objects.count()}")
+        for _ in range(count):
+            number = Book.objects.count()
+            author = Author.objects.create(
+                first_name="First", last_name=f"Last{number}"
+            )
+            book = Book.objects.create(
+                title=f"Title {number}", summary="", isbn=str(number), author=author
+            )
+            book.genre.set(self.genres)
+            BookInstance.objects.create(
+                book=book,
+                imprint="Imprint",
+                status="o",
+                borrower=borrower,
+                due_back=datetime.date.today(),
+            )
+
+    def count_queries(self, url: str, **params) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url: str, **params) -> None:
+        self.add_books(3)
+        few = self.count_queries(url, **params)
+        self.add_books(12)
+        many = self.count_queries(url, **params)
+        self.assertEqual(few, many)
+
+    def test_book_changelist(self):
+        self.assertConstantQueries(reverse("admin:catalog_book_changelist"))
+
+    def test_bookinstance_changelist(self):
+        self.assertConstantQueries(reverse("admin:catalog_bookinstance_changelist"))
+
+    def test_book_changelist_shows_genres(self):
+        self.add_books(1)
+        response = self.client.get(reverse("admin:catalog_book_changelist"))
+        self.assertContains(response, "Genre 0, Genre 1, Genre 2")
+
+
+class ChangelistSearchTest(TestCase):
+    """Tests the index backed searches of the admin changelists"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser("admin", "admin@example.com", "3Kd9#kQz1!pL")
+        author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        cls.dune = Book.objects.create(
+            title="Dune", summary="Spice", isbn="9780441013593", author=author
+        )
+        cls.other = Book.objects.create(
+            title="Emma", summary="Matchmaking", isbn="9780141439587"
+        )
+        cls.copy = BookInstance.objects.create(book=cls.dune, imprint="Ace")
+        BookInstance.objects.create(book=cls.other, imprint="Penguin")
+
+    def setUp(self):
+        self.client.login(username="admin", password="3Kd9#kQz1!pL")
+
+    def search(self, changelist: str, term: str) -> list:
+        response = self.client.get(reverse(changelist), {"q": term})
+        return list(response.context["cl"].result_list)
+
+    def test_books_are_found_by_full_text_or_isbn(self):
+        self.assertEqual(
+            self.search("admin:catalog_book_changelist", "herb"), [self.dune]
+        )
+        self.assertEqual(
+            self.search("admin:catalog_book_changelist", "9780441013593"), [self.dune]
+        )
+
+    def test_book_author_is_fetched_on_demand(self):
+        Author.objects.create(first_name="Isaac", last_name="Asimov")
+        response = self.client.get(
+            reverse("admin:catalog_book_change", args=[self.dune.pk])
+        )
+
+        self.assertContains(response, reverse("author-autocomplete"))
+        self.assertContains(response, "Herbert, Frank")
+        self.assertNotContains(response, "Asimov, Isaac")
+
+    def test_copies_are_found_by_id_or_isbn(self):
+        changelist = "admin:catalog_bookinstance_changelist"
+        self.assertEqual(self.search(changelist, str(self.copy.pk)), [self.copy])
+        self.assertEqual(self.search(changelist, "9780441013593"), [self.copy])
+        self.assertEqual(self.search(changelist, "978044101"), [])
+
+
+class PaginatedInlineTest(TestCase):
+    """Tests that change forms only render one page of their inline rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser("admin", "admin@example.com", "3Kd9#kQz1!pL")
+        cls.author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        cls.language = Language.objects.create(language="English")
+        cls.book = Book.objects.create(
+            title="Dune", summary="", isbn="1", author=cls.author, language=cls.language
+        )
+        cls.genre = Genre.objects.create(name="Science Fiction")
+        cls.book.genre.set([cls.genre])
+
+    def setUp(self):
+        self.client.login(username="admin", password="3Kd9#kQz1!pL")
+
+    def add_copies(self, count: int) -> None:
+        for _ in range(count):
+            BookInstance.objects.create(book=self.book, imprint="Imprint")
+
+    def get_change_form(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("admin:catalog_book_change", args=[self.book.pk]), params
+            )
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_change_form_costs_the_same_for_any_number_of_copies(self):
+        self.add_copies(25)
+        self.get_change_form()
+        _, few = self.get_change_form()
+        self.add_copies(100)
+        response, many = self.get_change_form()
+
+        self.assertEqual(few, many)
+        formset = response.context["inline_admin_formsets"][0].formset
+        self.assertEqual(formset.initial_form_count(), 20)
+        self.assertContains(response, "Page 1 of 7 (125 book instances)")
+
+    def test_pages_are_ordered_by_pk_after_the_default_ordering(self):
+        self.add_copies(25)
+        response, _ = self.get_change_form()
+
+        queryset = response.context["inline_admin_formsets"][0].formset.get_queryset()
+        self.assertEqual(queryset.query.order_by[-1], "pk")
+
+    def test_later_pages_can_be_opened_and_saved(self):
+        self.add_copies(25)
+        response, _ = self.get_change_form(**{"bookinstance_set-page": 2})
+
+        formset = response.context["inline_admin_formsets"][0].formset
+        copies = [form.instance for form in formset.initial_forms]
+        self.assertEqual(len(copies), 5)
+
+        data = {
+            "title": "Dune",
+            "author": self.author.pk,
+            "summary": "Spice",
+            "isbn": "1",
+            "language": self.language.pk,
+            "genre": [self.genre.pk],
+            "bookinstance_set-TOTAL_FORMS": 5,
+            "bookinstance_set-INITIAL_FORMS": 5,
+            "bookinstance_set-MIN_NUM_FORMS": 0,
+            "bookinstance_set-MAX_NUM_FORMS": 1000,
+        }
+        for index, copy in enumerate(copies):
+            prefix = f"bookinstance_set-{index}-"
+            data.update(
+                {
+                    prefix + "id": copy.pk,
+                    prefix + "book": self.book.pk,
+                    prefix + "imprint": "Reprint",
+                    prefix + "status": "a",
+                }
+            )
+        url = reverse("admin:catalog_book_change", args=[self.book.pk])
+        response = self.client.post(f"{url}?bookinstance_set-page=2", data)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(BookInstance.objects.filter(imprint="Reprint")), set(copies)
+        )
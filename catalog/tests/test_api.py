@@ -0,0 +1,104 @@
+import gzip
+import json
+from django.test import TestCase
+from django.urls import reverse
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogApiTest(TestCase):
+    """Tests the read-only JSON API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="John", last_name="Smith")
+        cls.language = Language.objects.create(language="English")
+        Genre.objects.create(name="Fantasy")
+
+        cls.books = [
+            Book.objects.create(
+                title=f"title{book_id}",
+                summary="Summary",
+                isbn=f"123123123123{book_id}",
+                author=cls.author,
+                language=cls.language,
+            )
+            for book_id in range(5)
+        ]
+
+        for status in ("a", "o", "a"):
+            BookInstance.objects.create(
+                book=cls.books[0], imprint="Imprint", status=status
+            )
+
+    def get_json(self, name: str, **params) -> dict:
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(
+            b"".join(response) if response.streaming else response.content
+        )
+
+    def test_lists_books_with_all_fields(self):
+        data = self.get_json("api-books")
+        self.assertEqual(len(data["results"]), 5)
+        self.assertEqual(data["results"][0]["title"], "title0")
+        self.assertEqual(data["results"][0]["language"], "English")
+        self.assertIsNone(data["next"])
+
+    def test_field_selection(self):
+        data = self.get_json("api-books", fields="id,isbn")
+        self.assertEqual(data["fields"], ["id", "isbn"])
+        self.assertEqual(set(data["results"][0]), {"id", "isbn"})
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse("api-books"), {"fields": "borrower"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        data = self.get_json("api-books", limit=2, fields="title")
+        titles = [row["title"] for row in data["results"]]
+
+        while data["next"]:
+            response = self.client.get(data["next"])
+            data = json.loads(response.content)
+            titles += [row["title"] for row in data["results"]]
+
+        self.assertEqual(titles, [f"title{book_id}" for book_id in range(5)])
+
+    def test_compact_format(self):
+        data = self.get_json(
+            "api-authors", fields="first_name,last_name", format="compact"
+        )
+        self.assertEqual(data["results"], [["John", "Smith"]])
+
+    def test_stream_returns_every_row(self):
+        response = self.client.get(reverse("api-books"), {"stream": 1, "fields": "id"})
+        self.assertTrue(response.streaming)
+
+        data = json.loads(b"".join(response))
+        self.assertEqual(
+            [row["id"] for row in data["results"]], [book.id for book in self.books]
+        )
+
+    def test_copies_filtered_by_availability(self):
+        data = self.get_json("api-copies", book=self.books[0].pk, status="a")
+        self.assertEqual(len(data["results"]), 2)
+        self.assertNotIn("borrower", data["results"][0])
+
+    def test_invalid_filter_value(self):
+        response = self.client.get(reverse("api-copies"), {"book": "not-a-number"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip(self):
+        response = self.client.get(
+            reverse("api-books"), {"stream": 1}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        data = json.loads(gzip.decompress(b"".join(response)))
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_genres_and_languages(self):
+        self.assertEqual(self.get_json("api-genres")["results"][0]["name"], "Fantasy")
+        self.assertEqual(
+            self.get_json("api-languages")["results"][0]["language"], "English"
+        )
@@ -0,0 +1,207 @@
+import datetime
+import uuid
+from django.contrib.auth.models import User
+from django.test import TestCase
+from catalog import circulation
+from catalog.models import Book, BookInstance, CatalogStats, Hold
+
+
+class CirculationTransitionTest(TestCase):
+    """Tests the single copy transitions of the circulation service"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="reader")
+        cls.other_reader = User.objects.create_user(username="other_reader")
+        cls.book = Book.objects.create(title="Dune", summary="", isbn="1")
+        cls.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(
+            book=self.book, imprint="Ace", status="a"
+        )
+
+    def available_count(self) -> int:
+        return CatalogStats.load().count_of_available_books
+
+    def test_a_copy_can_only_be_lent_once(self):
+        available = self.available_count()
+
+        error = circulation.checkout(self.copy.pk, self.reader, self.due_back)
+        self.assertIsNone(error)
+        error = circulation.checkout(self.copy.pk, self.other_reader, self.due_back)
+        self.assertEqual(error, circulation.NOT_AVAILABLE)
+
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, "o")
+        self.assertEqual(self.copy.borrower, self.reader)
+        self.assertEqual(self.available_count(), available - 1)
+
+    def test_transitions_only_write_the_changed_fields(self):
+        stale_copy = BookInstance.objects.get(pk=self.copy.pk)
+        BookInstance.objects.filter(pk=self.copy.pk).update(imprint="Reprint")
+
+        circulation.checkout(stale_copy.pk, self.reader, self.due_back)
+
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.imprint, "Reprint")
+
+    def test_return_and_renew_need_a_copy_on_loan(self):
+        self.assertEqual(circulation.return_copy(self.copy.pk), circulation.NOT_ON_LOAN)
+        self.assertEqual(
+            circulation.renew_copy(self.copy.pk, self.due_back),
+            circulation.NOT_ON_LOAN,
+        )
+        self.assertEqual(
+            circulation.return_copy(uuid.uuid4()), circulation.UNKNOWN_COPY
+        )
+
+        circulation.checkout(self.copy.pk, self.reader, self.due_back)
+        self.assertIsNone(circulation.return_copy(self.copy.pk))
+
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, "a")
+        self.assertIsNone(self.copy.borrower)
+        self.assertIsNone(self.copy.due_back)
+
+    def test_reserved_copies_are_lent_on_purpose_only(self):
+        self.assertIsNone(circulation.reserve(self.copy.pk))
+        self.assertEqual(
+            circulation.checkout(self.copy.pk, self.reader, self.due_back),
+            circulation.NOT_AVAILABLE,
+        )
+        self.assertIsNone(
+            circulation.checkout(
+                self.copy.pk, self.reader, self.due_back, reserved=True
+            )
+        )
+        self.assertEqual(circulation.release(self.copy.pk), circulation.NOT_RESERVED)
+
+    def test_checkout_any_lends_every_available_copy_once(self):
+        second = BookInstance.objects.create(book=self.book, imprint="Ace", status="a")
+
+        lent = {
+            circulation.checkout_any(self.book.pk, self.reader, self.due_back),
+            circulation.checkout_any(self.book.pk, self.reader, self.due_back),
+        }
+
+        self.assertEqual(lent, {self.copy.pk, second.pk})
+        self.assertIsNone(
+            circulation.checkout_any(self.book.pk, self.reader, self.due_back)
+        )
+
+    def test_transitions_move_the_copy_between_the_counters_of_its_book(self):
+        def counters():
+            book = Book.objects.get(pk=self.book.pk)
+            return book.count_of_available, book.count_of_on_loan
+
+        second = BookInstance.objects.create(book=self.book, imprint="Ace", status="a")
+        self.assertEqual(counters(), (2, 0))
+
+        circulation.checkout(self.copy.pk, self.reader, self.due_back)
+        circulation.checkout(second.pk, self.other_reader, self.due_back)
+        self.assertEqual(counters(), (0, 2))
+
+        circulation.renew([self.copy.pk, second.pk], self.due_back)
+        self.assertEqual(counters(), (0, 2))
+
+        circulation.return_copies([self.copy.pk, second.pk])
+        self.assertEqual(counters(), (2, 0))
+
+
+class HoldQueueTest(TestCase):
+    """Tests that holds are served first come, first served as copies come back"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrower = User.objects.create_user(username="borrower")
+        cls.patrons = [
+            User.objects.create_user(username=f"patron{i}") for i in range(3)
+        ]
+        cls.book = Book.objects.create(title="Dune", summary="", isbn="1")
+        cls.due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+    def setUp(self):
+        self.copy = BookInstance.objects.create(
+            book=self.book,
+            imprint="Ace",
+            status="o",
+            borrower=self.borrower,
+            due_back=self.due_back,
+        )
+        self.holds = [
+            circulation.place_hold(self.book.pk, patron) for patron in self.patrons
+        ]
+
+    def positions(self) -> dict:
+        return dict(
+            Hold.objects.waiting().with_position().values_list("patron", "position")
+        )
+
+    def test_holds_wait_in_order(self):
+        self.assertEqual(
+            self.positions(),
+            {self.patrons[0].pk: 1, self.patrons[1].pk: 2, self.patrons[2].pk: 3},
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(Hold.objects.next_for(self.book.pk), self.holds[0])
+
+        # Placing a hold again keeps its place
+        again = circulation.place_hold(self.book.pk, self.patrons[0])
+        self.assertEqual(again, self.holds[0])
+
+    def test_returned_copy_is_reserved_for_the_next_hold(self):
+        available = CatalogStats.load().count_of_available_books
+
+        self.assertIsNone(circulation.return_copy(self.copy.pk))
+
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, "r")
+        first = Hold.objects.get(pk=self.holds[0].pk)
+        self.assertEqual(first.status, "r")
+        self.assertEqual(first.copy, self.copy)
+        self.assertIsNotNone(first.ready_at)
+        self.assertEqual(
+            self.positions(), {self.patrons[1].pk: 1, self.patrons[2].pk: 2}
+        )
+        self.assertEqual(CatalogStats.load().count_of_available_books, available)
+
+    def test_bulk_returns_serve_holds(self):
+        circulation.return_copies([self.copy.pk])
+
+        self.assertEqual(Hold.objects.get(pk=self.holds[0].pk).copy, self.copy)
+
+    def test_cancelled_ready_hold_passes_the_copy_on(self):
+        circulation.return_copy(self.copy.pk)
+
+        self.assertIsNone(circulation.cancel_hold(self.holds[0].pk))
+        self.assertEqual(
+            circulation.cancel_hold(self.holds[0].pk), circulation.HOLD_NOT_ACTIVE
+        )
+
+        second = Hold.objects.get(pk=self.holds[1].pk)
+        self.assertEqual(second.status, "r")
+        self.assertEqual(second.copy, self.copy)
+
+    def test_ready_hold_is_lent_to_its_patron(self):
+        self.assertEqual(
+            circulation.fulfil_hold(self.holds[0].pk, self.due_back),
+            circulation.HOLD_NOT_READY,
+        )
+        circulation.return_copy(self.copy.pk)
+
+        self.assertIsNone(circulation.fulfil_hold(self.holds[0].pk, self.due_back))
+
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, "o")
+        self.assertEqual(self.copy.borrower, self.patrons[0])
+        self.assertEqual(Hold.objects.get(pk=self.holds[0].pk).status, "f")
+
+    def test_hold_on_an_available_copy_is_ready_at_once(self):
+        other = Book.objects.create(title="Emma", summary="", isbn="2")
+        copy = BookInstance.objects.create(book=other, imprint="Penguin", status="a")
+
+        hold = circulation.place_hold(other.pk, self.patrons[0])
+
+        self.assertEqual(hold.status, "r")
+        self.assertEqual(hold.copy, copy)
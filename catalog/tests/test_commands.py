@@ -0,0 +1,476 @@
+import csv
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from catalog import search, synthetic
+from catalog.management.commands import benchmark_routes
+from catalog.models import Author, Book, BookInstance, CatalogStats, Genre, Language
+from catalog.models import Hold, OverdueNoticeRun
+
+
+class ImportCatalogCommandTest(TestCase):
+    """Tests the bulk import command"""
+
+    CSV = (
+        "isbn,title,summary,author_first_name,author_last_name,language,genres,copies,imprint,status\n"
+        "1111111111111,A Wizard of Earthsea,Mage,Ursula,Le Guin,English,Fantasy|Classic,3,Parnassus,a\n"
+        "2222222222222,The Dispossessed,Anarchy,Ursula,Le Guin,English,Science Fiction,1,Harper,o\n"
+        "3333333333333,Dune,Spice,Frank,Herbert,English,Science Fiction,0,,\n"
+        ",No ISBN,,,,,,,,\n"
+    )
+
+    def write_file(self, suffix: str, content: str) -> str:
+        file = tempfile.NamedTemporaryFile(
+            "w", suffix=suffix, delete=False, encoding="utf-8"
+        )
+        with file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def run_import(self, path: str, *args) -> str:
+        out = StringIO()
+        call_command("import_catalog", path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_csv(self):
+        output = self.run_import(self.write_file(".csv", self.CSV), "--batch-size", "2")
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(BookInstance.objects.count(), 4)
+        self.assertIn("rows/s", output)
+        self.assertIn("1 invalid", output)
+
+        book = Book.objects.get(isbn="1111111111111")
+        self.assertEqual(str(book.author), "Le Guin, Ursula")
+        self.assertEqual(
+            set(book.genre.values_list("name", flat=True)), {"Fantasy", "Classic"}
+        )
+        self.assertEqual(book.bookinstance_set.filter(status="a").count(), 3)
+        self.assertEqual((book.count_of_bookinstances, book.count_of_available), (3, 3))
+
+    def test_rebuilds_stats_and_search_index(self):
+        self.run_import(self.write_file(".csv", self.CSV))
+
+        stats = CatalogStats.load()
+        self.assertEqual(stats.count_of_books, 3)
+        self.assertEqual(stats.count_of_available_books, 3)
+
+        dune = Book.objects.get(isbn="3333333333333")
+        self.assertEqual(search.search_book_ids("herbert"), [dune.pk])
+
+    def test_indexes_only_the_imported_books(self):
+        existing = Book.objects.create(title="Solaris", summary="", isbn="4")
+
+        with mock.patch.object(search, "rebuild_index") as rebuild_index:
+            self.run_import(self.write_file(".csv", self.CSV))
+
+        rebuild_index.assert_not_called()
+        self.assertEqual(search.search_book_ids("solaris"), [existing.pk])
+        self.assertEqual(len(search.search_book_ids("ursula")), 2)
+
+    def test_records_with_invalid_values_are_skipped(self):
+        content = (
+            "isbn,title,copies,status\n"
+            "1111111111111,Good,2,m\n"
+            "2222222222222,Wordy,two,a\n"
+            "3333333333333,Negative,-1,a\n"
+            "4444444444444,Unknown status,1,x\n"
+            "55555555555555,Long ISBN,1,a\n"
+            f"6666666666666,{'T' * 201},1,a\n"
+        )
+        output = self.run_import(self.write_file(".csv", content))
+
+        self.assertIn("5 invalid", output)
+        book = Book.objects.get()
+        self.assertEqual(book.title, "Good")
+        self.assertEqual(
+            (book.count_of_bookinstances, book.count_of_maintenance), (2, 2)
+        )
+
+    def test_ndjson_values_are_normalized_or_skipped(self):
+        lines = [
+            json.dumps({"isbn": 9780000000001, "title": 1984, "genres": "Fantasy"}),
+            "{not json",
+            json.dumps(["not", "an", "object"]),
+            json.dumps(
+                {"isbn": "2", "title": "Long name", "author_last_name": "L" * 101}
+            ),
+            json.dumps({"isbn": "3", "title": "Long genre", "genres": ["G" * 201]}),
+            json.dumps({"isbn": "4", "title": "Long language", "language": "E" * 101}),
+        ]
+        output = self.run_import(self.write_file(".ndjson", "\n".join(lines)))
+
+        self.assertIn("5 invalid", output)
+        book = Book.objects.get()
+        self.assertEqual((book.isbn, book.title), ("9780000000001", "1984"))
+        self.assertEqual(list(book.genre.values_list("name", flat=True)), ["Fantasy"])
+        self.assertEqual(Author.objects.count(), 0)
+
+    def test_rerun_is_idempotent(self):
+        path = self.write_file(".csv", self.CSV)
+        self.run_import(path)
+        output = self.run_import(path)
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(BookInstance.objects.count(), 4)
+        self.assertIn("3 existing", output)
+
+    def test_imports_ndjson_with_existing_author(self):
+        Author.objects.create(first_name="Frank", last_name="Herbert")
+        records = [
+            {
+                "isbn": "3333333333333",
+                "title": "Dune",
+                "author_first_name": "Frank",
+                "author_last_name": "Herbert",
+                "genres": ["Science Fiction"],
+                "copies": 2,
+            },
+            {"isbn": "3333333333333", "title": "Dune (duplicate)"},
+        ]
+        path = self.write_file(
+            ".ndjson", "\n".join(json.dumps(record) for record in records)
+        )
+        self.run_import(path)
+
+        self.assertEqual(Author.objects.count(), 1)
+        book = Book.objects.get()
+        self.assertEqual(book.title, "Dune")
+        self.assertEqual(book.bookinstance_set.count(), 2)
+
+
+class ExportCatalogCommandTest(TestCase):
+    """Tests the streaming export command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        english = Language.objects.create(language="English")
+        cls.book = Book.objects.create(
+            title="A Wizard of Earthsea",
+            summary="Mage",
+            isbn="1111111111111",
+            author=author,
+            language=english,
+        )
+        cls.book.genre.set(
+            [Genre.objects.create(name="Fantasy"), Genre.objects.create(name="Classic")]
+        )
+        Book.objects.create(title="Untitled", summary="", isbn="2222222222222")
+        BookInstance.objects.create(book=cls.book, imprint="Parnassus", status="a")
+
+    def run_export(self, *args) -> str:
+        out = StringIO()
+        call_command("export_catalog", *args, stdout=out)
+        return out.getvalue()
+
+    def test_exports_books_as_csv_with_one_row_per_book(self):
+        rows = list(csv.DictReader(StringIO(self.run_export("books"))))
+
+        self.assertEqual(
+            [row["isbn"] for row in rows], ["1111111111111", "2222222222222"]
+        )
+        self.assertEqual(set(rows[0]["genres"].split("|")), {"Fantasy", "Classic"})
+        self.assertEqual(rows[0]["author_last_name"], "Le Guin")
+        self.assertEqual(rows[1]["genres"], "")
+
+    def test_exports_copies_as_ndjson(self):
+        lines = self.run_export("copies", "--format", "ndjson").splitlines()
+
+        self.assertEqual(len(lines), 1)
+        copy = json.loads(lines[0])
+        self.assertEqual(copy["isbn"], "1111111111111")
+        self.assertEqual(copy["status"], "a")
+
+    def test_book_export_can_be_imported(self):
+        path = tempfile.mktemp(suffix=".ndjson")
+        self.addCleanup(os.remove, path)
+        output = self.run_export("books", "--output", path, "--chunk-size", "1")
+        self.assertIn("Exported 2 books", output)
+
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        out = StringIO()
+        call_command("import_catalog", path, stdout=out)
+
+        book = Book.objects.get(isbn="1111111111111")
+        self.assertEqual(str(book.author), "Le Guin, Ursula")
+        self.assertEqual(book.genre.count(), 2)
+
+
+class SendOverdueNoticesCommandTest(TestCase):
+    """Tests the batched overdue notice mailer"""
+
+    TODAY = datetime.date(2026, 3, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title="Dune", summary="", isbn="3333333333333")
+
+        def loan(borrower, days_until_due):
+            BookInstance.objects.create(
+                book=book,
+                imprint="Imprint",
+                status="o",
+                borrower=borrower,
+                due_back=cls.TODAY + datetime.timedelta(days=days_until_due),
+            )
+
+        cls.first = User.objects.create_user("first", "first@example.com")
+        loan(cls.first, -5)
+        loan(cls.first, -1)
+        loan(cls.first, 2)
+
+        cls.second = User.objects.create_user("second", "second@example.com")
+        loan(cls.second, 1)
+        loan(cls.second, 30)
+
+        # Borrowers without an email address or without loans due soon
+        loan(User.objects.create_user("no-email"), -3)
+        loan(User.objects.create_user("later", "later@example.com"), 10)
+
+    def run_notices(self, *args) -> str:
+        out = StringIO()
+        call_command(
+            "send_overdue_notices", "--date", self.TODAY.isoformat(), *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_sends_one_notice_per_borrower_with_one_loan_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_notices()
+
+        loan_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "catalog_bookinstance"' in query["sql"]
+        ]
+        self.assertEqual(len(loan_queries), 1)
+
+        self.assertIn("2 overdue notices sent", output)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["first@example.com"], ["second@example.com"]],
+        )
+        self.assertEqual(
+            mail.outbox[0].subject,
+            "2 overdue books and 1 due soon at the Local Library",
+        )
+        self.assertEqual(mail.outbox[0].body.count("Dune, due"), 3)
+        self.assertEqual(mail.outbox[1].subject, "1 book due soon at the Local Library")
+
+    def test_resumes_after_the_last_batch_sent(self):
+        send_messages = locmem.EmailBackend.send_messages
+        calls = []
+
+        def fail_on_second_batch(backend, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise ConnectionError("SMTP server went away")
+            return send_messages(backend, messages)
+
+        with mock.patch.object(
+            locmem.EmailBackend, "send_messages", fail_on_second_batch
+        ):
+            with self.assertRaises(ConnectionError):
+                self.run_notices("--batch-size", "1")
+
+        self.assertEqual(len(mail.outbox), 1)
+        run = OverdueNoticeRun.objects.get(run_date=self.TODAY)
+        self.assertEqual(run.last_borrower_id, self.first.pk)
+
+        self.run_notices("--batch-size", "1")
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["first@example.com"], ["second@example.com"]],
+        )
+
+        # A finished run sends nothing again unless restarted
+        self.run_notices()
+        self.assertEqual(len(mail.outbox), 2)
+        self.run_notices("--restart")
+        self.assertEqual(len(mail.outbox), 4)
+
+
+class ReconcileCopyCountsCommandTest(TestCase):
+    """Tests that the drifted copy counters of the books are found and fixed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Dune", summary="", isbn="1")
+        cls.other_book = Book.objects.create(title="Emma", summary="", isbn="2")
+        for status in ("a", "o", "r"):
+            BookInstance.objects.create(book=cls.book, imprint="Ace", status=status)
+
+    def reconcile(self, *args) -> str:
+        out = StringIO()
+        call_command("reconcile_copy_counts", *args, stdout=out)
+        return out.getvalue()
+
+    def test_fixes_drifted_books_only(self):
+        # Queryset updates bypass the signals that maintain the counters
+        BookInstance.objects.filter(status="o").update(status="a")
+
+        output = self.reconcile("--dry-run")
+        self.assertIn("1 books have drifted", output)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.count_of_on_loan, 1)
+
+        output = self.reconcile()
+        self.assertIn("Copy counters of 1 books reconciled", output)
+        self.book.refresh_from_db()
+        self.assertEqual(
+            (self.book.count_of_available, self.book.count_of_on_loan), (2, 0)
+        )
+        self.assertIn("of 0 books reconciled", self.reconcile())
+
+
+class StressCirculationCommandTest(TestCase):
+    """Tests the circulation stress test on a temporary database"""
+
+    def test_transitions_stay_consistent_under_contention(self):
+        out = StringIO()
+        call_command(
+            "stress_circulation",
+            "--threads=4",
+            "--copies=2",
+            "--operations=25",
+            stdout=out,
+        )
+
+        self.assertIn("100 attempts by 4 threads on 2 copies", out.getvalue())
+        self.assertIn("0 database errors", out.getvalue())
+        self.assertIn("Every copy is consistent", out.getvalue())
+
+
+class BenchmarkRoutesCommandTest(TestCase):
+    """Tests the route benchmark on a temporary and on the current database"""
+
+    def run_benchmark(self, *args) -> dict:
+        file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+
+        call_command(
+            "benchmark_routes",
+            "--requests=2",
+            f"--output={file.name}",
+            *args,
+            stdout=StringIO(),
+        )
+        with open(file.name, encoding="utf-8") as results:
+            return json.load(results)
+
+    def test_times_every_route_on_a_temporary_database(self):
+        results = self.run_benchmark("--copies=200")
+
+        self.assertEqual(results["copies"], 200)
+        self.assertEqual(
+            {(route["name"], route["method"]) for route in results["routes"]},
+            {(name, method) for name, _, method in benchmark_routes.ROUTES},
+        )
+        for route in results["routes"]:
+            self.assertLess(route["status"], 400, route["name"])
+            self.assertGreater(route["queries"], 0, route["name"])
+            self.assertLessEqual(route["p50_ms"], route["p99_ms"])
+        # The data was generated in the temporary database only
+        self.assertFalse(BookInstance.objects.exists())
+
+    # The dashboard queries on other threads cannot see the test transaction
+    @override_settings(CATALOG_CONCURRENT_QUERIES=False)
+    def test_skips_the_changes_to_the_current_database(self):
+        synthetic.generate(100)
+        User.objects.create_superuser("librarian", password="password")
+
+        results = self.run_benchmark("--existing")
+
+        methods = {route["method"] for route in results["routes"]}
+        self.assertEqual(methods, {"get"})
+        self.assertEqual(results["copies"], 100)
+        self.assertFalse(Hold.objects.exists())
+
+    def test_covers_every_named_route(self):
+        benchmarked = {name for name, _, _ in benchmark_routes.ROUTES}
+        self.assertEqual(
+            benchmarked | set(benchmark_routes.SKIPPED),
+            set(benchmark_routes.Command().route_names()),
+        )
+
+
+class SeedCatalogCommandTest(TestCase):
+    """Tests the synthetic catalog seeding command"""
+
+    def seed(self, *args) -> str:
+        out = StringIO()
+        call_command("seed_catalog", *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self) -> list:
+        return list(
+            BookInstance.objects.order_by("book_id", "imprint", "status").values_list(
+                "book__title",
+                "book__author__last_name",
+                "book__language__language",
+                "imprint",
+                "status",
+                "due_back",
+            )
+        )
+
+    def test_seeds_a_consistent_catalog(self):
+        output = self.seed("--copies=400", "--seed=3")
+
+        self.assertIn("Seeded 400 copies of 20 books by 4 authors", output)
+        self.assertEqual(BookInstance.objects.count(), 400)
+        self.assertEqual(Genre.objects.count(), len(synthetic.GENRES))
+        self.assertEqual(Language.objects.count(), len(synthetic.LANGUAGES))
+        self.assertFalse(Book.objects.filter(genre=None).exists())
+        on_loan = BookInstance.objects.filter(status__exact="o")
+        self.assertTrue(on_loan.exists())
+        self.assertFalse(on_loan.filter(borrower=None).exists())
+        self.assertFalse(on_loan.filter(due_back=None).exists())
+        self.assertFalse(
+            BookInstance.objects.exclude(status__exact="o").filter(
+                borrower__isnull=False
+            )
+        )
+
+        stats = CatalogStats.load()
+        self.assertEqual(stats.count_of_bookinstances, 400)
+        self.assertEqual(
+            stats.count_of_available_books,
+            BookInstance.objects.filter(status__exact="a").count(),
+        )
+        book = Book.objects.first()
+        self.assertIn(book.pk, search.search_book_ids(book.title))
+
+    def test_is_deterministic_and_can_be_repeated(self):
+        synthetic.generate(300, seed=5)
+        first = self.snapshot()
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+
+        synthetic.generate(300, seed=5)
+        self.assertEqual(self.snapshot(), first)
+
+        # Seeding again adds to the catalog and reuses genres and languages
+        synthetic.generate(300, seed=6)
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Genre.objects.count(), len(synthetic.GENRES))
+        self.assertEqual(len(set(Book.objects.values_list("isbn", flat=True))), 30)
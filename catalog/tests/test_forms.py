@@ -1,7 +1,9 @@
 import datetime
+import uuid
 from django.test import TestCase
 from django.utils import timezone
-from catalog.forms import RenewBookForm
+from catalog.forms import BookForm, BulkCirculationForm, RenewBookForm
+from catalog.models import Author, Book
 
 
 class RenewBookFormTest(TestCase):
@@ -44,3 +46,52 @@ class RenewBookFormTest(TestCase):
         date = timezone.localtime() + datetime.timedelta(weeks=4)
         form = RenewBookForm(data={"renewal_date": date})
         self.assertTrue(form.is_valid())
+
+
+class BulkCirculationFormTest(TestCase):
+    """Class for testing the form that renews or returns many copies"""
+
+    def test_parses_and_deduplicates_copy_ids(self):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        form = BulkCirculationForm(
+            data={"action": "return", "copies": f"{first}\n{second}, {first}\n"}
+        )
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["copies"], [first, second])
+
+    def test_reports_invalid_copy_ids(self):
+        form = BulkCirculationForm(
+            data={"action": "return", "copies": f"{uuid.uuid4()} not-an-id"}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("not-an-id", form.errors["copies"][0])
+
+    def test_renewal_needs_a_valid_date(self):
+        copies = str(uuid.uuid4())
+        form = BulkCirculationForm(data={"action": "renew", "copies": copies})
+        self.assertFalse(form.is_valid())
+        self.assertIn("renewal_date", form.errors)
+
+        date = datetime.date.today() + datetime.timedelta(weeks=5)
+        form = BulkCirculationForm(
+            data={"action": "renew", "copies": copies, "renewal_date": date}
+        )
+        self.assertFalse(form.is_valid())
+
+
+class BookFormTest(TestCase):
+    """Tests that the book form only renders the selected author"""
+
+    def test_author_options_are_fetched_on_demand(self):
+        authors = [
+            Author.objects.create(first_name="Jane", last_name=f"Doe {index}")
+            for index in range(5)
+        ]
+        book = Book.objects.create(
+            title="Title", summary="", isbn="1", author=authors[2]
+        )
+
+        html = str(BookForm(instance=book)["author"])
+        self.assertIn('data-ajax--url="/catalog/authors/autocomplete/"', html)
+        self.assertIn("Doe 2, Jane", html)
+        self.assertNotIn("Doe 1, Jane", html)
@@ -1,6 +1,7 @@
 import datetime
+from unittest import mock
 from django.test import TestCase
-from catalog.models import Author, Genre, Book, BookInstance, Language
+from catalog.models import Author, Genre, Book, BookInstance, Language, CatalogStats
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -217,3 +218,204 @@ class BookInstanceModelTest(TestCase):
     def test_book_details(self):
         book_instance = BookInstance.objects.get(id=1)
         self.assertEqual(book_instance.book_details(), "title")
+
+
+class BookInstanceQuerySetTest(TestCase):
+    """Tests the overdue queries computed in the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2026, 3, 31)
+        book = Book.objects.create(title="title", summary="summary", isbn="1")
+
+        def copy(days_overdue, status="o"):
+            return BookInstance.objects.create(
+                book=book,
+                imprint="Imprint",
+                status=status,
+                due_back=cls.today - datetime.timedelta(days=days_overdue),
+            )
+
+        cls.due_tomorrow = copy(-1)
+        cls.due_today = copy(0)
+        cls.week = copy(7)
+        cls.month = copy(8)
+        cls.ancient = copy(365)
+        cls.returned = copy(30, status="a")
+
+    def test_overdue_only_includes_copies_on_loan_past_their_due_date(self):
+        self.assertEqual(
+            set(BookInstance.objects.overdue(self.today)),
+            {self.week, self.month, self.ancient},
+        )
+
+    def test_overdue_between(self):
+        self.assertEqual(
+            list(BookInstance.objects.overdue_between(1, 7, self.today)), [self.week]
+        )
+        self.assertEqual(
+            list(BookInstance.objects.overdue_between(91, today=self.today)),
+            [self.ancient],
+        )
+
+    def test_count_overdue_by_bucket_uses_one_query(self):
+        with self.assertNumQueries(1):
+            counts = BookInstance.objects.count_overdue_by_bucket(self.today)
+
+        self.assertEqual(counts, {"1-7": 1, "8-30": 1, "31-90": 0, "90+": 1})
+
+    def test_with_is_overdue_can_be_filtered_and_replaces_the_property(self):
+        queryset = BookInstance.objects.with_is_overdue(self.today)
+
+        self.assertEqual(queryset.filter(is_overdue=True).count(), 4)
+        copy = queryset.get(pk=self.due_tomorrow.pk)
+        self.assertIs(copy.is_overdue, False)
+
+
+class CatalogStatsModelTest(TestCase):
+    """Tests that the denormalized catalog counters follow the tables"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        test_author = Author.objects.create(first_name="Big", last_name="Bog")
+        test_language = Language.objects.create(language="English")
+        Genre.objects.create(name="Fiction")
+
+        cls.test_book = Book.objects.create(
+            title="title",
+            author=test_author,
+            language=test_language,
+            summary="Book Summary",
+            isbn="1234567891231",
+        )
+
+        for status in ("a", "a", "o", "m"):
+            BookInstance.objects.create(
+                book=cls.test_book, imprint="Imprint", status=status
+            )
+
+    def assertStatsMatchTables(self):
+        stats = CatalogStats.load()
+        rebuilt = CatalogStats.rebuild()
+
+        for field in (
+            "count_of_books",
+            "count_of_authors",
+            "count_of_genres",
+            "count_of_languages",
+            "count_of_bookinstances",
+            "count_of_available_books",
+        ):
+            self.assertEqual(getattr(stats, field), getattr(rebuilt, field), field)
+
+    def test_counts_after_create(self):
+        stats = CatalogStats.load()
+        self.assertEqual(stats.count_of_books, 1)
+        self.assertEqual(stats.count_of_bookinstances, 4)
+        self.assertEqual(stats.count_of_available_books, 2)
+        self.assertStatsMatchTables()
+
+    def test_status_change_updates_available_count(self):
+        book_instance = BookInstance.objects.filter(status="o").get()
+        book_instance.status = "a"
+        book_instance.save()
+        self.assertEqual(CatalogStats.load().count_of_available_books, 3)
+
+        book_instance.status = "m"
+        book_instance.save()
+        self.assertEqual(CatalogStats.load().count_of_available_books, 2)
+
+    def test_delete_updates_counts(self):
+        BookInstance.objects.filter(status="a").delete()
+        Genre.objects.all().delete()
+
+        stats = CatalogStats.load()
+        self.assertEqual(stats.count_of_bookinstances, 2)
+        self.assertEqual(stats.count_of_available_books, 0)
+        self.assertEqual(stats.count_of_genres, 0)
+        self.assertStatsMatchTables()
+
+    def test_load_rebuilds_missing_row(self):
+        CatalogStats.objects.all().delete()
+        self.assertEqual(CatalogStats.load().count_of_bookinstances, 4)
+
+    def test_counters_are_updated_on_the_database_written_to(self):
+        with mock.patch.object(CatalogStats, "increment") as increment:
+            genre = Genre(name="Poetry")
+            genre.save(using="default")
+            genre.delete(using="default")
+
+        self.assertEqual(
+            increment.call_args_list,
+            [
+                mock.call(using="default", count_of_genres=1),
+                mock.call(using="default", count_of_genres=-1),
+            ],
+        )
+
+
+class BookCopyCountersTest(TestCase):
+    """Tests that the copy counters of the books follow their copies"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title="Counted", summary="Summary", isbn="1234567891232"
+        )
+        cls.other_book = Book.objects.create(
+            title="Other", summary="Summary", isbn="1234567891233"
+        )
+        for status in ("a", "a", "o", "m"):
+            BookInstance.objects.create(book=cls.book, imprint="Imprint", status=status)
+
+    def assertCounters(
+        self, book, total, available=0, on_loan=0, reserved=0, maintenance=0
+    ):
+        book.refresh_from_db()
+        self.assertEqual(
+            (
+                book.count_of_bookinstances,
+                book.count_of_available,
+                book.count_of_on_loan,
+                book.count_of_reserved,
+                book.count_of_maintenance,
+            ),
+            (total, available, on_loan, reserved, maintenance),
+        )
+
+    def test_counters_after_create(self):
+        self.assertCounters(self.book, 4, available=2, on_loan=1, maintenance=1)
+        self.assertCounters(self.other_book, 0)
+
+    def test_status_change_moves_the_copy(self):
+        copy = BookInstance.objects.get(status="o")
+        copy.status = "r"
+        copy.save()
+        self.assertCounters(self.book, 4, available=2, reserved=1, maintenance=1)
+
+    def test_copy_moved_to_another_book(self):
+        copy = BookInstance.objects.get(status="m")
+        copy.book = self.other_book
+        copy.status = "a"
+        copy.save()
+        self.assertCounters(self.book, 3, available=2, on_loan=1)
+        self.assertCounters(self.other_book, 1, available=1)
+
+    def test_delete_removes_the_copy(self):
+        BookInstance.objects.filter(status="a").delete()
+        self.assertCounters(self.book, 2, on_loan=1, maintenance=1)
+
+    def test_saving_a_stale_book_keeps_the_counters(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        BookInstance.objects.create(book=self.book, imprint="Imprint", status="a")
+
+        stale.title = "Renamed"
+        stale.save()
+        self.assertCounters(self.book, 5, available=3, on_loan=1, maintenance=1)
+        self.assertEqual(self.book.title, "Renamed")
+
+    def test_recount_copies_fixes_drift(self):
+        Book.objects.update(count_of_bookinstances=9, count_of_available=0)
+        Book.objects.recount_copies()
+        self.assertCounters(self.book, 4, available=2, on_loan=1, maintenance=1)
+        self.assertCounters(self.other_book, 0)
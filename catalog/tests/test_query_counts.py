@@ -0,0 +1,280 @@
+"""Query budgets of the catalog pages
+
+Every page is requested after seeding the database with N rows of
+everything it lists, and again with 10N rows. A page must run the same
+number of queries both times, and exactly as many as its budget in
+query_budgets.json. A page that runs a query per row, e.g. from a template
+following a relation of every object, fails the first check; a page that
+gains or loses a query fails the second, so the budgets are kept up to date
+in review.
+
+After a deliberate change, rewrite the budgets with
+
+    CATALOG_UPDATE_QUERY_BUDGETS=True python manage.py test catalog.tests.test_query_counts
+
+A failure lists the queries of the page grouped by the line that ran them:
+the template line for queries run while rendering, or otherwise the
+innermost line of the project's own code.
+"""
+
+import datetime
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import autocomplete, instrumentation
+from catalog.models import Author, Book, BookInstance, Genre, Hold, Language
+
+BUDGETS_FILE = Path(__file__).with_name("query_budgets.json")
+
+UPDATE_BUDGETS = os.environ.get("CATALOG_UPDATE_QUERY_BUDGETS", "") == "True"
+
+# The number of rows of each kind seeded for the first measurement
+ROWS = 3
+
+# How many times more rows the second measurement is made with
+SCALE = 10
+
+# Every page with the user it is requested as, the URL arguments taken from
+# the sample objects of the test and its query string
+PAGES = (
+    ("index", None, None, {}),
+    ("books", None, None, {}),
+    ("book-search", None, None, {"q": "Title"}),
+    ("book-detail", None, "book", {}),
+    ("authors", None, None, {}),
+    ("author-detail", None, "author", {}),
+    ("author-autocomplete", None, None, {"term": "Do"}),
+    ("api-books", None, None, {}),
+    ("api-authors", None, None, {}),
+    ("api-copies", None, None, {}),
+    ("my-borrowed", "patron", None, {}),
+    ("my-holds", "patron", None, {}),
+    ("holds-ready", "librarian", None, {}),
+    ("all-borrowed", "librarian", None, {}),
+    ("overdue", "librarian", None, {}),
+    ("overdue-bucket", "librarian", "bucket", {}),
+    ("renew-book-librarian", "librarian", "copy", {}),
+    ("bulk-circulation", "librarian", None, {}),
+    ("dashboard", "librarian", None, {}),
+    ("catalog-export", "librarian", "resource", {}),
+    ("author-update", "librarian", "author", {}),
+    ("book-update", "librarian", "book", {}),
+)
+
+# Queries longer than this are shortened in failure messages
+SQL_LENGTH = 300
+
+
+def call_site() -> str:
+    """Returns the template line or project line that is running a query"""
+
+    base_dir = str(settings.BASE_DIR)
+    tests_dir = str(Path(__file__).parent)
+    # The execute wrapper of the request timings is not a call site
+    skipped = (tests_dir, instrumentation.__file__)
+    frame = sys._getframe(1)
+    while frame is not None:
+        node = (
+            frame.f_locals.get("self")
+            if frame.f_code.co_name == "render_annotated"
+            else None
+        )
+        if node is not None and getattr(node, "origin", None) is not None:
+            return f"{node.origin.template_name}:{node.token.lineno}"
+
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir)
+            and not filename.startswith(skipped)
+            and "site-packages" not in filename
+        ):
+            return (
+                f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return "(unknown)"
+
+
+class QueryLog:
+    """An execute wrapper that keeps every query with its call site"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, call_site()))
+        return execute(sql, params, many, context)
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def by_call_site(self) -> str:
+        """Returns the queries grouped by call site, the most frequent first"""
+
+        counts = Counter(site for _, site in self.queries)
+        first_sql = {}
+        for sql, site in self.queries:
+            first_sql.setdefault(site, sql)
+
+        lines = []
+        for site, count in counts.most_common():
+            sql = first_sql[site]
+            if len(sql) > SQL_LENGTH:
+                sql = sql[:SQL_LENGTH] + "..."
+            lines.append(f"  {count}x {site}\n      {sql}")
+        return "\n".join(lines)
+
+
+# The dashboard queries run on other threads and connections, which cannot
+# see the data of the test transaction
+@override_settings(CATALOG_CONCURRENT_QUERIES=False)
+class QueryBudgetTest(TestCase):
+    """Tests that no page runs more queries with more rows, or more than its budget"""
+
+    measured = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.budgets = {}
+        if BUDGETS_FILE.exists():
+            cls.budgets = json.loads(BUDGETS_FILE.read_text(encoding="utf-8"))
+
+    @classmethod
+    def tearDownClass(cls):
+        if UPDATE_BUDGETS and cls.measured:
+            BUDGETS_FILE.write_text(
+                json.dumps(dict(sorted(cls.measured.items())), indent=2) + "\n",
+                encoding="utf-8",
+            )
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username="librarian")
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        cls.patron = User.objects.create_user(username="patron")
+        cls.author = Author.objects.create(first_name="John", last_name="Smith")
+        cls.language = Language.objects.create(language="English")
+        cls.genres = [Genre.objects.create(name=f"Genre {i}") for i in range(3)]
+        cls.book = cls.create_book()
+        cls.copy = BookInstance.objects.create(
+            book=cls.book,
+            imprint="Imprint",
+            status="o",
+            borrower=cls.patron,
+            due_back=datetime.date.today() - datetime.timedelta(days=10),
+        )
+
+    @classmethod
+    def create_book(cls) -> Book:
+        book = Book.objects.create(
+            title="Book Title",
+            summary="Summary",
+            isbn=f"ISBN{Book.objects.count()}",
+            author=cls.author,
+            language=cls.language,
+        )
+        book.genre.set(cls.genres[:2])
+        return book
+
+    def seed(self, rows: int) -> None:
+        """Adds rows of everything the pages list"""
+
+        today = datetime.date.today()
+        for i in range(rows):
+            Author.objects.create(first_name="Jane", last_name=f"Doe {i}")
+            book = self.create_book()
+            BookInstance.objects.create(book=book, imprint="Imprint", status="a")
+            BookInstance.objects.create(
+                book=self.book,
+                imprint="Imprint",
+                status="o",
+                borrower=self.patron,
+                due_back=today - datetime.timedelta(days=i % 40 - 5),
+            )
+            Hold.objects.create(book=book, patron=self.patron)
+            reserved = BookInstance.objects.create(
+                book=book, imprint="Imprint", status="r"
+            )
+            Hold.objects.create(
+                book=book,
+                patron=self.librarian,
+                status="r",
+                copy=reserved,
+                ready_at=timezone.now(),
+            )
+
+    def url(self, name: str, argument: str) -> str:
+        kwargs = {}
+        if argument == "bucket":
+            kwargs["bucket"] = "8-30"
+        elif argument == "resource":
+            kwargs["resource"] = "books"
+        elif argument is not None:
+            kwargs["pk"] = getattr(self, argument).pk
+        return reverse(name, kwargs=kwargs)
+
+    def measure(self) -> dict:
+        """Returns the queries of the first request of every page"""
+
+        logs = {}
+        for name, user, argument, query in PAGES:
+            self.client.logout()
+            if user is not None:
+                self.client.force_login(getattr(self, user))
+            # Cached fragments and indexes would hide the queries that fill them
+            cache.clear()
+            autocomplete.clear()
+
+            log = QueryLog()
+            with connection.execute_wrapper(log):
+                response = self.client.get(self.url(name, argument), query)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, name)
+            logs[name] = log
+        return logs
+
+    def test_pages_run_a_constant_number_of_queries(self):
+        self.seed(ROWS)
+        few_rows = self.measure()
+        self.seed(ROWS * (SCALE - 1))
+        many_rows = self.measure()
+
+        for name, _, _, _ in PAGES:
+            few, many = few_rows[name], many_rows[name]
+            type(self).measured[name] = len(many)
+            with self.subTest(page=name):
+                self.assertEqual(
+                    len(few),
+                    len(many),
+                    f"{name} ran {len(few)} queries with {ROWS} rows and "
+                    f"{len(many)} with {ROWS * SCALE}:\n{many.by_call_site()}",
+                )
+                if UPDATE_BUDGETS:
+                    continue
+                budget = self.budgets.get(name)
+                self.assertEqual(
+                    len(many),
+                    budget,
+                    f"{name} ran {len(many)} queries, its budget in "
+                    f"{BUDGETS_FILE.name} is {budget}. If the change is "
+                    "intended, update the budgets with "
+                    "CATALOG_UPDATE_QUERY_BUDGETS=True:\n"
+                    f"{many.by_call_site()}",
+                )
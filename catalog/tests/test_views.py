@@ -1,12 +1,28 @@
 import datetime
 import uuid
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import serializers
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncClient,
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 from catalog.models import Author
 from django.utils import timezone
+from django.utils.html import escape
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
 from django.contrib.auth.models import User  # Required to assign User as a borrower
-from catalog.models import BookInstance, Book, Genre, Language
+from catalog.models import BookInstance, Book, CatalogStats, Genre, Hold, Language
 from catalog.forms import RenewBookForm
+from catalog import autocomplete, circulation, instrumentation, views
+from catalog.pagination import KeysetPaginator
 from django.contrib.auth.models import (
     Permission,
 )  # Required to grant the permission needed to set a book as returned.
@@ -121,7 +137,33 @@ class IndexPageTest(TestCase):
         count_of_genres = response.context.get("count_of_genres")
         self.assertEqual(count_of_genres, 12)
 
+    def test_counts_are_read_with_one_query(self):
+        # Warm up the visit counter so that a repeat visit is measured
+        self.client.get(reverse("index"))
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse("index"))
+
     def test_number_of_visits(self):
+        response1 = self.client.get(reverse("index"))
+        self.assertEqual(response1.context["num_visits"], 0)
+
+        response2 = self.client.get(reverse("index"))
+        self.assertEqual(response2.context["num_visits"], 1)
+        self.assertEqual(response2.context["cookie_support"], "Cookie support exists!")
+
+        response3 = self.client.get(reverse("index"))
+        self.assertEqual(response3.context["num_visits"], 2)
+
+    def test_repeat_visits_do_not_create_session(self):
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("index"))
+
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertIn("private", response["Cache-Control"])
+
+    @override_settings(CATALOG_VISIT_COUNTER="session")
+    def test_number_of_visits_in_session_mode(self):
         response1 = self.client.get(reverse("index"))
         self.assertEqual(self.client.session["num_visits"], 1)
 
@@ -164,12 +206,307 @@ class AuthorListViewTest(TestCase):
         self.assertEqual(len(response.context["author_list"]), 10)
 
     def test_lists_all_authors(self):
-        # Get second page and confirm it has (exactly) remaining 3 items
-        response = self.client.get(reverse("authors") + "?page=2")
+        # Follow the next page token and confirm it has (exactly) remaining 3 items
+        response = self.client.get(reverse("authors"))
+        next_cursor = response.context["page_obj"].next_cursor
+
+        response = self.client.get(reverse("authors"), {"after": next_cursor})
         self.assertEqual(response.status_code, 200)
         self.assertTrue("is_paginated" in response.context)
         self.assertTrue(response.context["is_paginated"] == True)
         self.assertEqual(len(response.context["author_list"]), 3)
+        self.assertFalse(response.context["page_obj"].has_next())
+
+    def test_previous_page_returns_first_page(self):
+        first_page = self.client.get(reverse("authors"))
+        second_page = self.client.get(
+            reverse("authors"), {"after": first_page.context["page_obj"].next_cursor}
+        )
+
+        response = self.client.get(
+            reverse("authors"),
+            {"before": second_page.context["page_obj"].previous_cursor},
+        )
+        self.assertEqual(
+            list(response.context["author_list"]),
+            list(first_page.context["author_list"]),
+        )
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_pages_keep_author_ordering(self):
+        first_page = self.client.get(reverse("authors"))
+        second_page = self.client.get(
+            reverse("authors"), {"after": first_page.context["page_obj"].next_cursor}
+        )
+
+        authors = list(first_page.context["author_list"]) + list(
+            second_page.context["author_list"]
+        )
+        self.assertEqual(authors, list(Author.objects.all()))
+
+    def test_deep_page_does_not_count_rows(self):
+        first_page = self.client.get(reverse("authors"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse("authors"),
+                {"after": first_page.context["page_obj"].next_cursor},
+            )
+
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+    def test_invalid_page_token(self):
+        response = self.client.get(reverse("authors"), {"after": "not-a-token"})
+        self.assertEqual(response.status_code, 404)
+
+
+class BookListViewTest(TestCase):
+    """Tests filtering and sorting the book list on the available copies"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Books with 0, 3, 1 and 2 available copies
+        for index, available in enumerate((0, 3, 1, 2)):
+            book = Book.objects.create(
+                title=f"Book {index}", summary="Summary", isbn=f"{index}"
+            )
+            BookInstance.objects.create(book=book, imprint="Imprint", status="m")
+            for _ in range(available):
+                BookInstance.objects.create(book=book, imprint="Imprint", status="a")
+
+    def titles(self, query: dict) -> list:
+        """Returns the titles of every page of the list, following the page links"""
+
+        titles = []
+        response = self.client.get(reverse("books"), query)
+        while True:
+            titles += [book.title for book in response.context["book_list"]]
+            if not response.context["page_obj"].has_next():
+                return titles
+            self.assertContains(
+                response, escape(f"?{response.context['keyset_query']}after=")
+            )
+            response = self.client.get(
+                reverse("books"),
+                dict(query, after=response.context["page_obj"].next_cursor),
+            )
+
+    def test_lists_the_available_copies(self):
+        response = self.client.get(reverse("books"))
+        self.assertContains(response, "3 of 4 available")
+
+    def test_filters_on_available_copies(self):
+        self.assertEqual(
+            self.titles({"available": "1"}), ["Book 1", "Book 2", "Book 3"]
+        )
+
+    def test_sorts_on_available_copies(self):
+        self.assertEqual(
+            self.titles({"sort": "available"}), ["Book 1", "Book 3", "Book 2", "Book 0"]
+        )
+
+    def test_filter_does_not_join_the_copies(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("books"), {"available": "1", "sort": "available"})
+
+        self.assertFalse(
+            any("catalog_bookinstance" in query["sql"] for query in queries)
+        )
+
+
+class AuthorAutocompleteTest(TestCase):
+    """Tests the author matches served from the in-memory prefix index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.le_guin = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.lem = Author.objects.create(first_name="Stanisław", last_name="Lem")
+        cls.capek = Author.objects.create(first_name="Karel", last_name="Čapek")
+        cls.herbert = Author.objects.create(first_name="Frank", last_name="Herbert")
+
+    def setUp(self):
+        # The index outlives the test transactions
+        autocomplete.clear()
+
+    def names(self, term: str, **params) -> list:
+        response = self.client.get(
+            reverse("author-autocomplete"), dict(params, term=term)
+        )
+        self.assertEqual(response.status_code, 200)
+        return [result["text"] for result in response.json()["results"]]
+
+    def test_matches_the_start_of_either_name(self):
+        self.assertEqual(self.names("le"), ["Le Guin, Ursula", "Lem, Stanisław"])
+        self.assertEqual(self.names("URSULA l"), ["Le Guin, Ursula"])
+        self.assertEqual(self.names("capek k"), ["Čapek, Karel"])
+        self.assertEqual(self.names("guin"), [])
+
+    def test_follows_saved_and_deleted_authors(self):
+        self.assertEqual(self.names("her"), ["Herbert, Frank"])
+
+        self.herbert.last_name = "Harrison"
+        self.herbert.save()
+        Author.objects.create(first_name="Robert", last_name="Heinlein")
+        self.lem.delete()
+
+        self.assertEqual(self.names("her"), [])
+        self.assertEqual(self.names("h"), ["Harrison, Frank", "Heinlein, Robert"])
+        self.assertEqual(self.names("lem"), [])
+
+    def test_drops_authors_changed_by_other_processes(self):
+        self.names("le")
+        # Queryset updates and deletes bypass the signals, like other processes
+        Author.objects.filter(pk=self.lem.pk).update(last_name="Asimov")
+
+        self.assertEqual(self.names("le"), ["Le Guin, Ursula"])
+
+    def test_reads_authors_added_by_other_processes_after_the_sync_interval(self):
+        self.names("a")
+        Author.objects.bulk_create([Author(first_name="Isaac", last_name="Asimov")])
+        self.assertEqual(self.names("asi"), [])
+
+        with override_settings(CATALOG_AUTOCOMPLETE_SYNC_INTERVAL=0):
+            self.names("a")
+        self.assertEqual(self.names("asi"), ["Asimov, Isaac"])
+
+    def test_pages_through_the_matches(self):
+        for index in range(autocomplete.RESULTS_LIMIT + 5):
+            Author.objects.create(first_name="Jane", last_name=f"Doe {index:02}")
+
+        first_page = self.client.get(reverse("author-autocomplete"), {"term": "doe"})
+        second_page = self.client.get(
+            reverse("author-autocomplete"), {"term": "doe", "page": 2}
+        )
+        self.assertTrue(first_page.json()["pagination"]["more"])
+        self.assertFalse(second_page.json()["pagination"]["more"])
+        self.assertEqual(len(second_page.json()["results"]), 5)
+        self.assertEqual(second_page.json()["results"][0]["text"], "Doe 20, Jane")
+
+
+class KeysetPaginatorTest(TestCase):
+    """Tests paging over a nullable ordering key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        test_book = Book.objects.create(
+            title="Book Title", summary="My book summary", isbn="ABCDEFG"
+        )
+
+        for copy in range(7):
+            # Every third copy has no due date
+            due_back = (
+                None
+                if copy % 3 == 0
+                else datetime.date.today() + datetime.timedelta(days=copy % 2)
+            )
+            BookInstance.objects.create(
+                book=test_book, imprint="Imprint", due_back=due_back, status="o"
+            )
+
+    def test_walks_forward_and_backward_over_nulls(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 2, ("due_back", "id"))
+
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+
+        forward = [copy for page in pages for copy in page]
+        self.assertEqual(len(forward), 7)
+        self.assertEqual(len(set(forward)), 7)
+        self.assertEqual([copy.due_back for copy in forward][-3:], [None] * 3)
+
+        backward = []
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.page(before=page.previous_cursor)
+            backward = list(page) + backward
+        self.assertEqual(backward + list(pages[-1]), forward)
+
+    def test_reads_rows_without_a_due_date_only_when_the_page_is_not_full(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 1, ("due_back", "id"))
+        page = paginator.page()
+
+        # Pages followed by another dated copy need no look at the nulls
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                page = paginator.page(after=page.next_cursor)
+            self.assertIsNotNone(page.object_list[0].due_back)
+
+        # The last dated copy is followed by the copies without a due date
+        with self.assertNumQueries(2):
+            page = paginator.page(after=page.next_cursor)
+        self.assertIsNotNone(page.object_list[0].due_back)
+        self.assertTrue(page.has_next())
+
+
+class BookSearchViewTest(TestCase):
+    """Tests the full-text book search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.genre = Genre.objects.create(name="Fantasy")
+
+        cls.earthsea = Book.objects.create(
+            title="A Wizard of Earthsea",
+            summary="A young mage on the islands of Earthsea.",
+            isbn="9780547773742",
+            author=cls.author,
+        )
+        cls.earthsea.genre.add(cls.genre)
+
+        cls.dispossessed = Book.objects.create(
+            title="The Dispossessed",
+            summary="A physicist travels between two worlds, one is not a wizard.",
+            isbn="9780061054884",
+        )
+
+    def search(self, query: str) -> list:
+        response = self.client.get(reverse("book-search"), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["book_list"])
+
+    def test_view_uses_correct_template(self):
+        response = self.client.get(reverse("book-search"), {"q": "wizard"})
+        self.assertTemplateUsed(response, "catalog/book_search.html")
+
+    def test_title_match_ranks_above_summary_match(self):
+        self.assertEqual(self.search("wizard"), [self.earthsea, self.dispossessed])
+
+    def test_matches_word_prefixes_and_every_word(self):
+        self.assertEqual(self.search("earth mage"), [self.earthsea])
+
+    def test_matches_author_and_genre(self):
+        self.assertEqual(self.search("ursula"), [self.earthsea])
+        self.assertEqual(self.search("fantasy"), [self.earthsea])
+
+    def test_empty_query_returns_nothing(self):
+        self.assertEqual(self.search(""), [])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_index_follows_author_and_genre_changes(self):
+        self.author.last_name = "LeGuin"
+        self.author.save()
+        self.assertEqual(self.search("leguin"), [self.earthsea])
+
+        self.genre.name = "Mythopoeia"
+        self.genre.save()
+        self.assertEqual(self.search("fantasy"), [])
+        self.assertEqual(self.search("mythopoeia"), [self.earthsea])
+
+        self.dispossessed.genre.add(self.genre)
+        self.assertEqual(len(self.search("mythopoeia")), 2)
+
+        self.genre.book_set.clear()
+        self.assertEqual(self.search("mythopoeia"), [])
+
+    def test_index_follows_deletions(self):
+        self.author.delete()
+        self.assertEqual(self.search("ursula"), [])
+        self.assertEqual(self.search("earthsea"), [self.earthsea])
+
+        self.earthsea.delete()
+        self.assertEqual(self.search("earthsea"), [])
 
 
 class LoanedBookInstancesByUserListViewTest(TestCase):
@@ -787,3 +1124,734 @@ class DeleteBookViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
         self.assertTemplateUsed(response, "catalog/book_confirm_delete.html")
+
+
+class ViewQueryCountTest(TestCase):
+    """Tests that pages run the same number of queries however many rows they show"""
+
+    def setUp(self):
+        self.librarian = User.objects.create_user(
+            username="testuser2", password="2HJ1vRV0Z&3iD"
+        )
+        permission = Permission.objects.get(name="Set book as returned")
+        self.librarian.user_permissions.add(permission)
+
+        self.author = Author.objects.create(first_name="John", last_name="Smith")
+        self.language = Language.objects.create(language="English")
+        self.genres = [Genre.objects.create(name=f"genre{i}") for i in range(3)]
+        self.book = self.create_book()
+
+    def create_book(self) -> Book:
+        book = Book.objects.create(
+            title="Book Title",
+            summary="My book summary",
+            isbn=f"ISBN{Book.objects.count()}",
+            author=self.author,
+            language=self.language,
+        )
+        book.genre.set(self.genres)
+        return book
+
+    def add_rows(self, number_of_rows: int) -> None:
+        """Adds books for the author and loaned copies of the first book"""
+
+        for _ in range(number_of_rows):
+            book = self.create_book()
+            BookInstance.objects.create(book=book, imprint="Imprint", status="a")
+            BookInstance.objects.create(
+                book=self.book,
+                imprint="Imprint",
+                status="o",
+                borrower=self.librarian,
+                due_back=datetime.date.today(),
+            )
+
+    def count_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url: str) -> None:
+        self.client.login(username="testuser2", password="2HJ1vRV0Z&3iD")
+
+        self.add_rows(1)
+        few_rows = self.count_queries(url)
+
+        self.add_rows(5)
+        many_rows = self.count_queries(url)
+
+        self.assertEqual(few_rows, many_rows)
+
+    def test_book_list(self):
+        self.assertConstantQueries(reverse("books"))
+
+    def test_book_detail(self):
+        self.assertConstantQueries(reverse("book-detail", kwargs={"pk": self.book.pk}))
+
+    def test_author_detail(self):
+        self.assertConstantQueries(
+            reverse("author-detail", kwargs={"pk": self.author.pk})
+        )
+
+    def test_my_borrowed(self):
+        self.assertConstantQueries(reverse("my-borrowed"))
+
+    def test_all_borrowed(self):
+        self.assertConstantQueries(reverse("all-borrowed"))
+
+    def test_author_detail_shows_number_of_copies(self):
+        self.add_rows(2)
+        response = self.client.get(
+            reverse("author-detail", kwargs={"pk": self.author.pk})
+        )
+        copies = {
+            book.pk: book.count_of_bookinstances
+            for book in response.context["book_list"]
+        }
+        self.assertEqual(copies[self.book.pk], 2)
+
+
+class DetailFragmentCacheTest(TestCase):
+    """Tests that cached fragments of the detail pages follow changes of related objects"""
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name="John", last_name="Smith")
+        self.language = Language.objects.create(language="English")
+        self.genre = Genre.objects.create(name="Fantasy")
+        self.book = Book.objects.create(
+            title="Book Title",
+            summary="My book summary",
+            isbn="ABCDEFG",
+            author=self.author,
+            language=self.language,
+        )
+        self.book.genre.add(self.genre)
+        self.copy = BookInstance.objects.create(
+            book=self.book, imprint="First Imprint", status="a"
+        )
+
+    def book_page(self) -> str:
+        response = self.client.get(reverse("book-detail", kwargs={"pk": self.book.pk}))
+        return response.content.decode()
+
+    def author_page(self) -> str:
+        response = self.client.get(
+            reverse("author-detail", kwargs={"pk": self.author.pk})
+        )
+        return response.content.decode()
+
+    def test_cached_book_page_runs_no_related_queries(self):
+        self.book_page()
+
+        # Only the conditional GET validators and the book with its author
+        # and language are loaded
+        with self.assertNumQueries(2):
+            self.book_page()
+
+    def test_cached_author_page_runs_no_book_queries(self):
+        self.author_page()
+
+        # Only the conditional GET validators and the author are loaded
+        with self.assertNumQueries(2):
+            self.author_page()
+
+    def test_book_page_follows_related_changes(self):
+        self.assertIn("First Imprint", self.book_page())
+
+        self.copy.imprint = "Second Imprint"
+        self.copy.save()
+        self.assertIn("Second Imprint", self.book_page())
+
+        self.author.first_name = "Jane"
+        self.author.save()
+        self.assertIn("Smith, Jane", self.book_page())
+
+        self.genre.name = "Mythology"
+        self.genre.save()
+        self.assertIn("Mythology", self.book_page())
+
+        self.language.language = "French"
+        self.language.save()
+        self.assertIn("French", self.book_page())
+
+        self.book.genre.clear()
+        self.assertNotIn("Mythology", self.book_page())
+
+    def test_author_page_follows_book_and_copy_changes(self):
+        self.assertIn("(1)", self.author_page())
+
+        BookInstance.objects.create(book=self.book, imprint="Imprint", status="a")
+        self.assertIn("(2)", self.author_page())
+
+        self.book.title = "New Title"
+        self.book.save()
+        self.assertIn("New Title", self.author_page())
+
+        other_author = Author.objects.create(first_name="Jane", last_name="Doe")
+        self.book.author = other_author
+        self.book.save()
+        self.assertNotIn("New Title", self.author_page())
+
+    def test_pages_of_both_books_follow_a_moved_copy(self):
+        other_book = Book.objects.create(
+            title="Other Title",
+            summary="Other summary",
+            isbn="HIJKLMN",
+            author=Author.objects.create(first_name="Jane", last_name="Doe"),
+        )
+        self.assertIn("First Imprint", self.book_page())
+        self.assertIn("(1)", self.author_page())
+
+        self.copy.book = other_book
+        self.copy.save()
+        self.assertNotIn("First Imprint", self.book_page())
+        self.assertIn("(0)", self.author_page())
+
+    def test_loading_fixtures_does_not_touch_authors(self):
+        loaded_at = Author.objects.get(pk=self.author.pk).updated_at
+
+        fixture = serializers.serialize("json", [self.book])
+        for obj in serializers.deserialize("json", fixture):
+            obj.save()
+
+        self.assertEqual(Author.objects.get(pk=self.author.pk).updated_at, loaded_at)
+
+
+class ConditionalGetTest(TestCase):
+    """Tests that unchanged pages are answered with 304 Not Modified"""
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name="John", last_name="Smith")
+        self.book = Book.objects.create(
+            title="Book Title",
+            summary="My book summary",
+            isbn="ABCDEFG",
+            author=self.author,
+        )
+        self.user = User.objects.create_user(
+            username="testuser1", password="1X<ISRUkw+tuK"
+        )
+        self.copy = BookInstance.objects.create(
+            book=self.book,
+            imprint="Imprint",
+            status="o",
+            borrower=self.user,
+            due_back=datetime.date.today(),
+        )
+
+    def assertNotModifiedUntilChanged(self, url: str, change, queries: int = 1) -> None:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        # The page is neither loaded nor rendered again
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_book_detail(self):
+        def change():
+            self.copy.imprint = "New Imprint"
+            self.copy.save()
+
+        self.assertNotModifiedUntilChanged(
+            reverse("book-detail", kwargs={"pk": self.book.pk}), change
+        )
+
+    def test_author_detail(self):
+        def change():
+            self.book.title = "New Title"
+            self.book.save()
+
+        self.assertNotModifiedUntilChanged(
+            reverse("author-detail", kwargs={"pk": self.author.pk}), change
+        )
+
+    def test_book_list(self):
+        def change():
+            Book.objects.create(title="Another", summary="Summary", isbn="HIJKLMN")
+
+        self.assertNotModifiedUntilChanged(reverse("books"), change)
+
+    def test_author_list(self):
+        def change():
+            self.author.last_name = "Smythe"
+            self.author.save()
+
+        self.assertNotModifiedUntilChanged(reverse("authors"), change)
+
+    def test_loan_list_follows_book_title(self):
+        self.client.login(username="testuser1", password="1X<ISRUkw+tuK")
+
+        def change():
+            self.book.title = "New Title"
+            self.book.save()
+
+        # The session and the user are loaded before the validators
+        self.assertNotModifiedUntilChanged(reverse("my-borrowed"), change, queries=3)
+
+    def test_if_modified_since(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        response = self.client.get(url)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_loan_list_has_no_last_modified(self):
+        self.client.login(username="testuser1", password="1X<ISRUkw+tuK")
+        response = self.client.get(reverse("my-borrowed"))
+        self.assertTrue(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+    def test_etag_depends_on_user(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        anonymous_etag = self.client.get(url)["ETag"]
+
+        self.client.login(username="testuser1", password="1X<ISRUkw+tuK")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportCatalogViewTest(TestCase):
+    """Tests the streaming export available to librarians"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="reader", password="1X<ISRUkw+tuK")
+        librarian = User.objects.create_user(
+            username="librarian", password="2HJ1vRV0Z&3iD"
+        )
+        librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        Author.objects.create(first_name="Frank", last_name="Herbert")
+
+    def test_requires_the_librarian_permission(self):
+        url = reverse("catalog-export", args=["authors"])
+        response = self.client.get(url)
+        self.assertRedirects(response, f"/accounts/login/?next={url}")
+
+        self.client.login(username="reader", password="1X<ISRUkw+tuK")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_streams_csv_and_ndjson(self):
+        self.client.login(username="librarian", password="2HJ1vRV0Z&3iD")
+
+        response = self.client.get(reverse("catalog-export", args=["authors"]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        self.assertTrue(content.startswith("id,first_name,last_name"))
+        self.assertIn("Frank,Herbert", content)
+
+        response = self.client.get(
+            reverse("catalog-export", args=["authors"]), {"format": "ndjson"}
+        )
+        self.assertIn(
+            '"last_name":"Herbert"', b"".join(response.streaming_content).decode()
+        )
+
+    def test_unknown_resource_is_not_found(self):
+        self.client.login(username="librarian", password="2HJ1vRV0Z&3iD")
+        response = self.client.get(reverse("catalog-export", args=["users"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class OverdueReportViewTest(TestCase):
+    """Tests the overdue report available to librarians"""
+
+    @classmethod
+    def setUpTestData(cls):
+        librarian = User.objects.create_user(
+            username="librarian", password="2HJ1vRV0Z&3iD"
+        )
+        librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        book = Book.objects.create(title="Overdue Book", summary="", isbn="1")
+        today = datetime.date.today()
+        for days_overdue in (-3, 3, 10, 10, 200):
+            BookInstance.objects.create(
+                book=book,
+                imprint="Imprint",
+                status="o",
+                due_back=today - datetime.timedelta(days=days_overdue),
+                borrower=librarian,
+            )
+
+    def setUp(self):
+        self.client.login(username="librarian", password="2HJ1vRV0Z&3iD")
+
+    def test_requires_the_librarian_permission(self):
+        self.client.logout()
+        response = self.client.get(reverse("overdue"))
+        self.assertRedirects(response, f"/accounts/login/?next={reverse('overdue')}")
+
+    def test_lists_overdue_copies_with_bucket_counts(self):
+        response = self.client.get(reverse("overdue"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["bookinstance_list"]), 4)
+        self.assertEqual(response.context["count_of_overdue"], 4)
+        self.assertEqual(
+            response.context["buckets"],
+            [("1-7", 1), ("8-30", 2), ("31-90", 0), ("90+", 1)],
+        )
+        self.assertContains(response, "200 days overdue")
+
+    def test_lists_one_bucket(self):
+        response = self.client.get(reverse("overdue-bucket", args=["8-30"]))
+
+        copies = response.context["bookinstance_list"]
+        self.assertEqual([copy.days_overdue for copy in copies], [10, 10])
+
+    def test_unknown_bucket_is_not_found(self):
+        response = self.client.get(reverse("overdue-bucket", args=["1-2"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class LibrarianDashboardViewTest(TransactionTestCase):
+    """Tests the async librarian dashboard, whose queries run on separate threads
+
+    The queries run on other connections than the one of the test, so the test
+    data has to be committed.
+    """
+
+    def setUp(self):
+        librarian = User.objects.create_user(
+            username="librarian", password="2HJ1vRV0Z&3iD"
+        )
+        librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        reader = User.objects.create_user(username="reader", password="1X<ISRUkw+tuK")
+        popular = Book.objects.create(title="Popular Book", summary="", isbn="1")
+        other = Book.objects.create(title="Other Book", summary="", isbn="2")
+        today = datetime.date.today()
+        for book, days_overdue, borrower in (
+            (popular, -3, reader),
+            (popular, 10, reader),
+            (popular, 200, librarian),
+            (other, 3, reader),
+        ):
+            BookInstance.objects.create(
+                book=book,
+                imprint="Imprint",
+                status="o",
+                due_back=today - datetime.timedelta(days=days_overdue),
+                borrower=borrower,
+            )
+        BookInstance.objects.create(book=other, imprint="Imprint", status="a")
+
+    async def get_dashboard(self, username="librarian", password="2HJ1vRV0Z&3iD"):
+        await sync_to_async(self.async_client.login)(
+            username=username, password=password
+        )
+        return await self.async_client.get(reverse("dashboard"))
+
+    async def test_requires_the_librarian_permission(self):
+        response = await self.async_client.get(reverse("dashboard"))
+        self.assertRedirects(
+            response,
+            f"/accounts/login/?next={reverse('dashboard')}",
+            fetch_redirect_response=False,
+        )
+
+        response = await self.get_dashboard("reader", "1X<ISRUkw+tuK")
+        self.assertEqual(response.status_code, 403)
+
+    async def test_shows_the_loan_counts(self):
+        response = await self.get_dashboard()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "catalog/librarian_dashboard.html")
+        self.assertEqual(response.context["loans_by_status"]["On loan"], 4)
+        self.assertEqual(response.context["loans_by_status"]["Available"], 1)
+        self.assertEqual(response.context["count_of_borrowers"], 2)
+        self.assertEqual(response.context["count_of_due_soon"], 1)
+        self.assertEqual(response.context["count_of_overdue"], 3)
+        self.assertEqual(
+            response.context["buckets"],
+            [("1-7", 1), ("8-30", 1), ("31-90", 0), ("90+", 1)],
+        )
+        self.assertEqual(
+            [book.title for book in response.context["most_borrowed"]],
+            ["Popular Book", "Other Book"],
+        )
+        self.assertEqual(response.context["stats"].count_of_bookinstances, 5)
+
+    @override_settings(CATALOG_CONCURRENT_QUERIES=False)
+    async def test_queries_can_run_one_after_another(self):
+        response = await self.get_dashboard()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["count_of_overdue"], 3)
+
+    def test_async_index_matches_the_sync_one(self):
+        request = RequestFactory().get(reverse("index"))
+        request.user = AnonymousUser()
+        sync_page = views.index(request).content
+        async_page = async_to_sync(views.index_async)(request).content
+
+        self.assertEqual(async_page, sync_page)
+        self.assertIn(b"<strong>Copies:</strong> 5", async_page)
+
+
+class HoldViewsTest(TestCase):
+    """Tests placing, listing, cancelling and lending holds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patron = User.objects.create_user(
+            username="patron", password="1X<ISRUkw+tuK"
+        )
+        cls.librarian = User.objects.create_user(
+            username="librarian", password="2HJ1vRV0Z&3iD"
+        )
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        cls.book = Book.objects.create(title="Dune", summary="", isbn="1")
+
+    def setUp(self):
+        self.client.login(username="patron", password="1X<ISRUkw+tuK")
+
+    def test_hold_is_placed_and_listed_with_its_place(self):
+        circulation.place_hold(self.book.pk, self.librarian)
+
+        response = self.client.post(reverse("place-hold", args=[self.book.pk]))
+        self.assertRedirects(response, reverse("my-holds"))
+
+        response = self.client.get(reverse("my-holds"))
+        self.assertContains(response, "number 2 in the queue")
+        self.assertEqual(len(response.context["hold_list"]), 1)
+
+    def test_only_own_holds_can_be_cancelled(self):
+        hold = circulation.place_hold(self.book.pk, self.librarian)
+
+        response = self.client.post(reverse("cancel-hold", args=[hold.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        own = circulation.place_hold(self.book.pk, self.patron)
+        response = self.client.post(reverse("cancel-hold", args=[own.pk]))
+        self.assertRedirects(response, reverse("my-holds"))
+        self.assertEqual(Hold.objects.get(pk=own.pk).status, "c")
+
+    def test_librarian_lends_the_copy_of_a_ready_hold(self):
+        copy = BookInstance.objects.create(book=self.book, imprint="Ace", status="a")
+        hold = circulation.place_hold(self.book.pk, self.patron)
+
+        response = self.client.post(reverse("lend-hold", args=[hold.pk]))
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username="librarian", password="2HJ1vRV0Z&3iD")
+        response = self.client.get(reverse("holds-ready"))
+        self.assertContains(response, "Dune")
+
+        response = self.client.post(reverse("lend-hold", args=[hold.pk]))
+        self.assertRedirects(response, reverse("holds-ready"))
+        copy.refresh_from_db()
+        self.assertEqual(copy.borrower, self.patron)
+
+    def test_hold_is_placed_after_signing_in_again(self):
+        client = Client(enforce_csrf_checks=True)
+
+        def sign_in():
+            page = client.get(reverse("login"))
+            client.post(
+                reverse("login"),
+                {
+                    "username": "patron",
+                    "password": "1X<ISRUkw+tuK",
+                    "csrfmiddlewaretoken": str(page.context["csrf_token"]),
+                },
+            )
+
+        url = reverse("book-detail", args=[self.book.pk])
+        sign_in()
+        etag = client.get(url)["ETag"]
+        client.get(reverse("logout"))
+        sign_in()
+
+        # The CSRF token was rotated, so the cached page must not be reused
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+        )
+
+        response = client.post(
+            reverse("place-hold", args=[self.book.pk]),
+            {"csrfmiddlewaretoken": str(response.context["csrf_token"])},
+        )
+        self.assertRedirects(response, reverse("my-holds"))
+        self.assertTrue(Hold.objects.filter(patron=self.patron).exists())
+
+
+class BulkCirculationViewTest(TestCase):
+    """Tests renewing and returning many copies at once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        librarian = User.objects.create_user(
+            username="librarian", password="2HJ1vRV0Z&3iD"
+        )
+        librarian.user_permissions.add(
+            Permission.objects.get(name="Set book as returned")
+        )
+        cls.book = Book.objects.create(title="Book Title", summary="", isbn="1")
+        cls.on_loan = [
+            BookInstance.objects.create(
+                book=cls.book,
+                imprint="Imprint",
+                status="o",
+                borrower=librarian,
+                due_back=datetime.date.today(),
+            )
+            for _ in range(3)
+        ]
+        cls.available = BookInstance.objects.create(
+            book=cls.book, imprint="Imprint", status="a"
+        )
+
+    def setUp(self):
+        self.client.login(username="librarian", password="2HJ1vRV0Z&3iD")
+
+    def post(self, action: str, copy_ids, **data):
+        data.update(
+            action=action, copies="\n".join(str(copy_id) for copy_id in copy_ids)
+        )
+        return self.client.post(reverse("bulk-circulation"), data)
+
+    def test_renews_copies_on_loan_and_reports_the_others(self):
+        unknown = uuid.uuid4()
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        copy_ids = [copy.pk for copy in self.on_loan] + [self.available.pk, unknown]
+
+        response = self.post("renew", copy_ids, renewal_date=renewal_date)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BookInstance.objects.filter(due_back=renewal_date).count(), 3)
+        results = {copy_id: error for copy_id, _, error in response.context["results"]}
+        self.assertEqual(results[self.on_loan[0].pk], None)
+        self.assertEqual(results[self.available.pk], "Not on loan")
+        self.assertEqual(results[unknown], "Unknown copy")
+
+    def test_returns_copies_with_one_update(self):
+        copy_ids = [copy.pk for copy in self.on_loan]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post("return", copy_ids)
+
+        updates = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "catalog_bookinstance"')
+        ]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(BookInstance.objects.filter(status="a").count(), 4)
+        self.assertFalse(BookInstance.objects.filter(borrower__isnull=False).exists())
+        self.assertEqual(CatalogStats.load().count_of_available_books, 4)
+
+    def test_requires_the_librarian_permission(self):
+        self.client.logout()
+        response = self.client.get(reverse("bulk-circulation"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_admin_action_returns_the_selected_copies(self):
+        User.objects.create_superuser("admin", "admin@example.com", "3Kd9#kQz1!pL")
+        self.client.login(username="admin", password="3Kd9#kQz1!pL")
+
+        response = self.client.post(
+            reverse("admin:catalog_bookinstance_changelist"),
+            {
+                "action": "return_selected",
+                "_selected_action": [self.on_loan[0].pk, self.available.pk],
+            },
+            follow=True,
+        )
+
+        self.assertContains(response, "1 copies returned.")
+        self.assertContains(response, f"Not on loan: {self.available.pk}")
+        self.assertEqual(BookInstance.objects.filter(status="o").count(), 2)
+
+
+@override_settings(CATALOG_REQUEST_TIMINGS=True, CATALOG_REQUEST_TIMINGS_HEADER=True)
+class RequestTimingTest(TestCase):
+    """Tests the request timing middleware and the page showing its measurements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username="staff", password="2HJ1vRV0Z&3iD", is_staff=True
+        )
+        author = Author.objects.create(first_name="John", last_name="Smith")
+        Book.objects.create(title="Book", summary="", isbn="1", author=author)
+
+    def setUp(self):
+        instrumentation.windows.clear()
+        self.addCleanup(instrumentation.windows.clear)
+
+    def test_measures_every_request_by_url_name(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("books"))
+
+        count = len(queries)
+        self.assertIn(f'desc="{count} queries"', response["Server-Timing"])
+        self.client.get(reverse("books"))
+        self.client.get("/catalog/no-such-page/")
+
+        summary = instrumentation.windows.summary()
+        self.assertEqual(set(summary), {"books", instrumentation.UNRESOLVED})
+        books = summary["books"]
+        self.assertEqual(books["requests"], 2)
+        self.assertEqual(books["queries"]["max"], count)
+        self.assertGreater(books["template_ms"]["p50"], 0)
+        self.assertLess(books["sql_ms"]["p50"], books["total_ms"]["p50"])
+        self.assertLess(books["template_ms"]["p50"], books["total_ms"]["p50"])
+        self.assertEqual(sum(books["histogram"].values()), 2)
+
+    def test_keeps_the_most_recent_requests(self):
+        windows = instrumentation.TimingWindows(window=2)
+        for total in (1, 2, 300):
+            windows.add("books", (0, 0.0, 0.0, total))
+
+        books = windows.summary()["books"]
+        self.assertEqual((books["requests"], books["window"]), (3, 2))
+        self.assertEqual(books["total_ms"]["p50"], 2)
+        self.assertEqual(books["histogram"]["<=500"], 1)
+
+    def test_only_staff_see_the_measurements(self):
+        response = self.client.get(reverse("request-timings"))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.get(reverse("books"))
+        self.client.login(username="staff", password="2HJ1vRV0Z&3iD")
+        response = self.client.get(reverse("request-timings"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["enabled"])
+        self.assertIn("books", response.json()["routes"])
+
+    @override_settings(CATALOG_REQUEST_TIMINGS=False)
+    def test_nothing_is_measured_when_disabled(self):
+        response = self.client.get(reverse("books"))
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(instrumentation.windows.summary(), {})
+
+    async def test_measures_async_views(self):
+        response = await self.async_client.get(reverse("index"))
+
+        self.assertIn("Server-Timing", response)
+        summary = await sync_to_async(instrumentation.windows.summary)()
+        self.assertGreater(summary["index"]["queries"]["max"], 0)
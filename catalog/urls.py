@@ -1,25 +1,64 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # The home page address is added here
-    path("", views.index, name="index"),
+    path(
+        "",
+        views.index_async if settings.CATALOG_ASYNC_VIEWS else views.index,
+        name="index",
+    ),
     # The address to book list page
     path("books/", views.BookListView.as_view(), name="books"),
+    # The address to the book search results
+    path("books/search/", views.BookSearchView.as_view(), name="book-search"),
     # The address to a specific book's details
     path("book/<int:pk>", views.BookDetailView.as_view(), name="book-detail"),
     # The address to author list page
     path("authors/", views.AuthorListView.as_view(), name="authors"),
     # The address to a specific author's details
     path("author/<int:pk>", views.AuthorDetailView.as_view(), name="author-detail"),
+    # The address to the authors matching the start of a name, for the forms
+    path(
+        "authors/autocomplete/",
+        views.author_autocomplete,
+        name="author-autocomplete",
+    ),
     # The address to borrowed books of a user
     path("mybooks/", views.LoanedBooksByUserListView.as_view(), name="my-borrowed"),
+    # The addresses to the holds of a user, placing and cancelling them
+    path("myholds/", views.HoldsByUserListView.as_view(), name="my-holds"),
+    path("book/<int:pk>/hold/", views.place_hold, name="place-hold"),
+    path("hold/<int:pk>/cancel/", views.cancel_hold, name="cancel-hold"),
+    # The addresses to the holds ready for pickup and lending their copies
+    path("holds/ready/", views.HoldsReadyListView.as_view(), name="holds-ready"),
+    path("hold/<int:pk>/lend/", views.lend_hold_librarian, name="lend-hold"),
     # The address to all borrowed books
     path("allbooks/", views.AllLoanedBooks.as_view(), name="all-borrowed"),
+    # The address to the report of overdue books, optionally by days overdue
+    path("overdue/", views.OverdueReportView.as_view(), name="overdue"),
+    path(
+        "overdue/<str:bucket>/",
+        views.OverdueReportView.as_view(),
+        name="overdue-bucket",
+    ),
     # The address to a form where books can be renewed
     path(
         "book/<uuid:pk>/renew/", views.renew_book_librarian, name="renew-book-librarian"
     ),
+    # The address to a form where many books are renewed or returned at once
+    path(
+        "books/circulation/",
+        views.bulk_circulation_librarian,
+        name="bulk-circulation",
+    ),
+    # The address to the librarian dashboard
+    path("dashboard/", views.dashboard_librarian, name="dashboard"),
+    # The address to the query and timing measurements of the recent requests
+    path("timings/", views.request_timings, name="request-timings"),
+    # The address to the streaming CSV or NDJSON export of the catalog
+    path("export/<str:resource>/", views.export_catalog, name="catalog-export"),
 ]
 
 
@@ -37,3 +76,13 @@ urlpatterns += [
     path("book/<int:pk>/update/", views.BookUpdate.as_view(), name="book-update"),
     path("book/<int:pk>/delete/", views.BookDelete.as_view(), name="book-delete"),
 ]
+
+
+urlpatterns += [
+    # Read-only JSON API
+    path("api/books/", api.BookApiView.as_view(), name="api-books"),
+    path("api/authors/", api.AuthorApiView.as_view(), name="api-authors"),
+    path("api/genres/", api.GenreApiView.as_view(), name="api-genres"),
+    path("api/languages/", api.LanguageApiView.as_view(), name="api-languages"),
+    path("api/copies/", api.BookInstanceApiView.as_view(), name="api-copies"),
+]
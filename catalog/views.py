@@ -1,22 +1,64 @@
 import datetime
 import uuid
+from asgiref.sync import sync_to_async
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
 from django.db.models.query import QuerySet
 from django.shortcuts import render
-from .models import Book, BookInstance, Language, Genre, Author
+from .models import Book, BookInstance, Author, CatalogStats, Hold
+from .models import OVERDUE_BUCKETS
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponseRedirect
 from django.urls import reverse
-from catalog.forms import RenewBookForm
+from catalog.forms import BookForm, BulkCirculationForm, RenewBookForm
+from catalog import aggregates, autocomplete, caching, circulation, exporting
+from catalog import search, visits
+from catalog import instrumentation
+from catalog.importing import CSV_FORMAT
+from catalog.pagination import KeysetPaginationMixin
+from catalog.conditional import ConditionalDetailMixin, ConditionalListMixin
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from catalog.models import Author
 from django.http import HttpResponse, HttpRequest
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+
+def _index_context(stats: CatalogStats, num_visits: int, cookie_works: bool) -> dict:
+    """Returns the template context of the home page"""
+
+    cookie_support_exists = (
+        "No cookie support."  # String that tells if cookie support exists
+    )
+
+    # The result of the test is received the second time that the user opens the page
+
+    if cookie_works:
+
+        cookie_support_exists = "Cookie support exists!"
+
+    # The count of each item is stored in the context so that the page can be populated
+
+    return {
+        "count_of_books": stats.count_of_books,
+        "count_of_authors": stats.count_of_authors,
+        "count_of_genres": stats.count_of_genres,
+        "count_of_languages": stats.count_of_languages,
+        "count_of_bookinstances": stats.count_of_bookinstances,
+        "count_of_available_books": stats.count_of_available_books,
+        "num_visits": num_visits,
+        "cookie_support": cookie_support_exists,
+    }
 
 
 def index(request: HttpRequest) -> HttpResponse:
@@ -24,105 +66,276 @@ def index(request: HttpRequest) -> HttpResponse:
     The home page displays the count of all items in library
     """
 
-    # Storing the count of each type of item
+    # The counts of each type of item are read from the denormalized
+    # statistics row in a single query instead of counting every table
 
-    count_of_books = Book.objects.all().count()
-    count_of_authors = Author.objects.all().count()
-    count_of_genres = Genre.objects.all().count()
-    count_of_languages = Language.objects.all().count()
-    count_of_bookinstance = BookInstance.objects.all().count()
+    stats = CatalogStats.load()
 
-    # Storing available books count
+    # The number of visits on this page are read from the visit counter and incremented on each visit
+    # By default the counter is a cookie, so the page does not write to the session
 
-    count_of_available_books = (
-        BookInstance.objects.all().filter(status__exact="a").count()
-    )
+    num_visits, cookie_works = visits.read_visits(request)
 
-    # The number of visits on this page are stored in session and incremented on each visit
+    context = _index_context(stats, num_visits, cookie_works)
 
-    num_visits = request.session.get("num_visits", 0)
-    request.session["num_visits"] = num_visits + 1
-
-    cookie_support_exists = (
-        "No cookie support."  # String that tells if cookie support exists
-    )
+    response = render(request, "index.html", context)
 
-    # Testing if sessions are supported by the browser.
-    # The result of the test is received the second time that the user opens the page
+    visits.save_visits(request, response, num_visits + 1)
 
-    if request.session.test_cookie_worked():
+    return response
 
-        cookie_support_exists = "Cookie support exists!"
 
-        # The cookie is deleted after testing
-        request.session.delete_test_cookie()
+async def index_async(request: HttpRequest) -> HttpResponse:
+    """The home page as an async view, for deployments served over ASGI
 
-    request.session.set_test_cookie()
+    The statistics row and the visit counter are read concurrently, see
+    catalog.aggregates. The page is the same as the one of index.
+    """
 
-    # The count of each item is stored in the context so that the page can be populated
+    results = await aggregates.gather(
+        stats=CatalogStats.load, visits=lambda: visits.read_visits(request)
+    )
+    num_visits, cookie_works = results["visits"]
+    context = _index_context(results["stats"], num_visits, cookie_works)
 
-    context = {
-        "count_of_books": count_of_books,
-        "count_of_authors": count_of_authors,
-        "count_of_genres": count_of_genres,
-        "count_of_languages": count_of_languages,
-        "count_of_bookinstances": count_of_bookinstance,
-        "count_of_available_books": count_of_available_books,
-        "num_visits": num_visits,
-        "cookie_support": cookie_support_exists,
-    }
+    # Rendering may load the user and the session, which only sync code can do
+    def respond():
+        response = render(request, "index.html", context)
+        visits.save_visits(request, response, num_visits + 1)
+        return response
 
-    return render(request, "index.html", context)
+    return await sync_to_async(respond)()
 
 
-class BookListView(generic.ListView):
+class BookListView(ConditionalListMixin, KeysetPaginationMixin, generic.ListView):
     """The list view for Book model"""
 
     model = Book
     paginate_by = 2
 
+    # Pages are found by seeking on the primary key rather than with OFFSET
+    keyset_ordering = ("id",)
+
+    # ?available=1 lists only the books with a copy on the shelf and
+    # ?sort=available the books with the most available copies first. Both
+    # read the copy counters of the books, so neither joins the copies.
+    keyset_params = ("available", "sort")
+
+    def get_keyset_ordering(self) -> tuple:
+        if self.request.GET.get("sort") == "available":
+            return ("-count_of_available", "id")
+        return self.keyset_ordering
+
+    def get_queryset(self) -> QuerySet:
+        """The author of each book is joined so the list does not query it per row"""
+
+        books = Book.objects.select_related("author")
+        if self.request.GET.get("available"):
+            books = books.filter(count_of_available__gt=0)
+        return books
+
+    def get_etag_extra(self) -> list:
+        return super().get_etag_extra() + [
+            self.request.GET.get(param, "") for param in self.keyset_params
+        ]
+
+
+class BookSearchView(generic.ListView):
+    """Lists the books matching the words of the ?q= query, best matches first"""
+
+    model = Book
+    template_name = "catalog/book_search.html"
+    paginate_by = 10
+
+    def get_queryset(self) -> list:
+        """Returns the ranked ids of the matching books; only the shown page is loaded"""
+
+        self.query = self.request.GET.get("q", "").strip()
+        return search.search_book_ids(self.query)
+
+    def get_context_data(self, **kwargs) -> dict:
+        context = super().get_context_data(**kwargs)
 
-class BookDetailView(generic.DetailView):
+        # The books of the page are loaded at once and put back in ranked order
+        book_ids = context["object_list"]
+        books = Book.objects.select_related("author").in_bulk(book_ids)
+
+        context["book_list"] = [books[pk] for pk in book_ids if pk in books]
+        context["query"] = self.query
+        return context
+
+
+class BookDetailView(ConditionalDetailMixin, generic.DetailView):
     """The detail view for Book model"""
 
     model = Book
 
+    def get_queryset(self) -> QuerySet:
+        """The author and language are joined; genres and copies are only
+        queried by the template when its cached fragment has to be rendered
+        """
+
+        return Book.objects.select_related("author", "language")
 
-class AuthorListView(generic.ListView):
+    def get_etag_extra(self) -> list:
+        """The hold form of a signed in user carries a CSRF token, which is
+        rotated when they sign in again, so the token's cookie is part of the ETag
+        """
+
+        extra = super().get_etag_extra()
+        if self.request.user.is_authenticated:
+            extra.append(self.request.META.get("CSRF_COOKIE", ""))
+        return extra
+
+    def get_context_data(self, **kwargs) -> dict:
+        context = super().get_context_data(**kwargs)
+        context["fragment_cache_timeout"] = caching.fragment_cache_timeout()
+        return context
+
+
+class AuthorListView(ConditionalListMixin, KeysetPaginationMixin, generic.ListView):
     """The list view for author model"""
 
     model = Author
     paginate_by = 10
 
+    # The default ordering of authors, made unique by the primary key
+    keyset_ordering = ("last_name", "first_name", "id")
+
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ConditionalDetailMixin, generic.DetailView):
     """The detail view for author model"""
 
     model = Author
     paginate_by = 1
 
+    def get_context_data(self, **kwargs) -> dict:
+        """Adds the books of the author, which carry their number of copies
+
+        The queryset is lazy, so it only runs when the cached fragment listing
+        the books has to be rendered.
+        """
+
+        context = super().get_context_data(**kwargs)
+        context["book_list"] = Book.objects.filter(author=self.object)
+        context["fragment_cache_timeout"] = caching.fragment_cache_timeout()
+        return context
+
+
+class LoanListConditionalMixin(ConditionalListMixin):
+    """Conditional GET for the loan lists
+
+    Overdue copies are highlighted, so the pages also change when the date
+    changes. Last-Modified cannot express that, so only the ETag is used.
+    """
+
+    use_last_modified = False
+
+    def get_etag_extra(self) -> list:
+        return super().get_etag_extra() + [datetime.date.today()]
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+
+class LoanedBooksByUserListView(
+    LoginRequiredMixin,
+    LoanListConditionalMixin,
+    KeysetPaginationMixin,
+    generic.ListView,
+):
     """Generic class-based view listing books on loan to current user."""
 
     model = BookInstance
     template_name = "catalog/bookinstance_list_borrowed_user.html"
     paginate_by = 10
+    keyset_ordering = ("due_back", "id")
 
     def get_queryset(self) -> QuerySet:
         return (
             BookInstance.objects.filter(borrower=self.request.user)
             .filter(status__exact="o")
+            .select_related("book")
             .order_by("due_back")
         )
 
 
-class AllLoanedBooks(PermissionRequiredMixin, generic.ListView):
+class HoldsByUserListView(LoginRequiredMixin, generic.ListView):
+    """Lists the active holds of the current user with their place in each queue"""
+
+    model = Hold
+    template_name = "catalog/hold_list_user.html"
+
+    def get_queryset(self) -> QuerySet:
+        return (
+            Hold.objects.active()
+            .filter(patron=self.request.user)
+            .with_position()
+            .select_related("book")
+        )
+
+
+class HoldsReadyListView(
+    PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView
+):
+    """Lists the holds whose copy waits for its patron, longest waiting first"""
+
+    model = Hold
+    template_name = "catalog/hold_list_ready.html"
+    paginate_by = 20
+    keyset_ordering = ("ready_at", "id")
+
+    # The user must have these permissions to access this functionality
+    permission_required = "catalog.can_mark_returned"
+
+    def get_queryset(self) -> QuerySet:
+        return Hold.objects.filter(status__exact="r").select_related(
+            "book", "patron", "copy"
+        )
+
+
+@login_required
+@require_POST
+def place_hold(request: HttpRequest, pk: int) -> HttpResponse:
+    """Puts the current user in the hold queue of a book"""
+
+    book = get_object_or_404(Book.objects.only("pk"), pk=pk)
+    circulation.place_hold(book.pk, request.user)
+    return HttpResponseRedirect(reverse("my-holds"))
+
+
+@login_required
+@require_POST
+def cancel_hold(request: HttpRequest, pk: int) -> HttpResponse:
+    """Cancels a hold of the current user"""
+
+    hold = get_object_or_404(Hold.objects.active(), pk=pk, patron=request.user)
+    circulation.cancel_hold(hold.pk)
+    return HttpResponseRedirect(reverse("my-holds"))
+
+
+@login_required
+@permission_required("catalog.can_mark_returned", raise_exception=True)
+@require_POST
+def lend_hold_librarian(request: HttpRequest, pk: int) -> HttpResponse:
+    """Lends the copy reserved for a ready hold to its patron for three weeks"""
+
+    hold = get_object_or_404(Hold, pk=pk)
+    due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+    if circulation.fulfil_hold(hold.pk, due_back) is not None:
+        raise Http404("No copy is ready for this hold.")
+    return HttpResponseRedirect(reverse("holds-ready"))
+
+
+class AllLoanedBooks(
+    PermissionRequiredMixin,
+    LoanListConditionalMixin,
+    KeysetPaginationMixin,
+    generic.ListView,
+):
     """Displays all books to users with permission"""
 
     model = BookInstance
     template_name = "catalog/bookinstance_list_all_borrowed_librarian.html"
     paginate_by = 10
+    keyset_ordering = ("due_back", "id")
 
     # The user must have these permissions to access this functionality
     permission_required = "catalog.can_mark_returned"
@@ -130,14 +343,70 @@ class AllLoanedBooks(PermissionRequiredMixin, generic.ListView):
     def get_queryset(self) -> QuerySet:
         """There is no filter on user id so all books are fetched"""
 
-        return BookInstance.objects.filter(status__exact="o").order_by("due_back")
+        return (
+            BookInstance.objects.filter(status__exact="o")
+            .select_related("book", "borrower")
+            .order_by("due_back")
+        )
+
+
+class OverdueReportView(
+    PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView
+):
+    """Lists the overdue copies, most overdue first, optionally within one bucket
+
+    The number of overdue copies in every bucket is counted in the database
+    with a single query, and the listed copies are filtered on their due date,
+    both using the index on (status, due_back).
+    """
+
+    model = BookInstance
+    template_name = "catalog/bookinstance_list_overdue.html"
+    paginate_by = 20
+    keyset_ordering = ("due_back", "id")
+
+    # The user must have these permissions to access this functionality
+    permission_required = "catalog.can_mark_returned"
+
+    def get_bucket(self):
+        """Returns the (name, first day, last day) of the requested bucket, if any"""
+
+        name = self.kwargs.get("bucket")
+        if name is None:
+            return None
+
+        for bucket in OVERDUE_BUCKETS:
+            if bucket[0] == name:
+                return bucket
+        raise Http404("Unknown overdue range.")
+
+    def get_queryset(self) -> QuerySet:
+        bucket = self.get_bucket()
+        if bucket is None:
+            queryset = BookInstance.objects.overdue()
+        else:
+            _, first_day, last_day = bucket
+            queryset = BookInstance.objects.overdue_between(first_day, last_day)
+
+        return queryset.select_related("book", "borrower")
+
+    def get_context_data(self, **kwargs) -> dict:
+        context = super().get_context_data(**kwargs)
+        counts = BookInstance.objects.count_overdue_by_bucket()
+
+        context["bucket"] = self.kwargs.get("bucket")
+        context["buckets"] = [(name, counts[name]) for name, _, _ in OVERDUE_BUCKETS]
+        context["count_of_overdue"] = sum(counts.values())
+        return context
 
 
 @login_required
 @permission_required("catalog.can_mark_returned", raise_exception=True)
 def renew_book_librarian(request: HttpRequest, pk: uuid.UUID) -> HttpResponse:
     """View function for renewing a specific BookInstance by librarian."""
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    book_instance = get_object_or_404(
+        BookInstance.objects.select_related("book", "borrower"), pk=pk
+    )
 
     # If this is a POST request then process the Form data
     if request.method == "POST":
@@ -147,12 +416,16 @@ def renew_book_librarian(request: HttpRequest, pk: uuid.UUID) -> HttpResponse:
 
         # Check if the form is valid:
         if form.is_valid():
-            # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            book_instance.due_back = form.cleaned_data["renewal_date"]
-            book_instance.save()
+            # process the data in form.cleaned_data as required (here we only move the due_back
+            # field, and only if the copy is still on loan when the change is written)
+            error = circulation.renew_copy(
+                book_instance.pk, form.cleaned_data["renewal_date"]
+            )
 
             # redirect to a new URL:
-            return HttpResponseRedirect(reverse("all-borrowed"))
+            if error is None:
+                return HttpResponseRedirect(reverse("all-borrowed"))
+            form.add_error(None, error)
 
     # If this is a GET (or any other method) create the default form.
     else:
@@ -167,6 +440,133 @@ def renew_book_librarian(request: HttpRequest, pk: uuid.UUID) -> HttpResponse:
     return render(request, "catalog/book_renew_librarian.html", context)
 
 
+@login_required
+@permission_required("catalog.can_mark_returned", raise_exception=True)
+def bulk_circulation_librarian(request: HttpRequest) -> HttpResponse:
+    """View function for renewing or returning many copies at once by librarian.
+
+    Every copy is renewed or returned with a single UPDATE, and the page shows
+    which copies were changed and why the others were not.
+    """
+
+    results = None
+
+    if request.method == "POST":
+        form = BulkCirculationForm(request.POST)
+
+        if form.is_valid():
+            copy_ids = form.cleaned_data["copies"]
+            if form.cleaned_data["action"] == BulkCirculationForm.RENEW:
+                outcome = circulation.renew(copy_ids, form.cleaned_data["renewal_date"])
+            else:
+                outcome = circulation.return_copies(copy_ids)
+
+            # The titles of all the copies are read with one query
+            copies = BookInstance.objects.select_related("book").in_bulk(copy_ids)
+            results = [
+                (copy_id, copies.get(copy_id), error)
+                for copy_id, error in outcome.items()
+            ]
+
+    else:
+        proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
+        form = BulkCirculationForm(initial={"renewal_date": proposed_renewal_date})
+
+    context = {
+        "form": form,
+        "results": results,
+    }
+
+    return render(request, "catalog/bookinstance_bulk_circulation.html", context)
+
+
+async def dashboard_librarian(request: HttpRequest) -> HttpResponse:
+    """Shows the librarian the state of the loans at a glance
+
+    The independent counts of the dashboard are queried concurrently, see
+    catalog.aggregates. Async views cannot be wrapped by login_required and
+    permission_required, which are sync, so the same checks are made here.
+    """
+
+    def check_permission():
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not request.user.has_perm("catalog.can_mark_returned"):
+            raise PermissionDenied
+        return None
+
+    redirect = await sync_to_async(check_permission)()
+    if redirect is not None:
+        return redirect
+
+    context = await aggregates.load_dashboard()
+    return await sync_to_async(render)(
+        request, "catalog/librarian_dashboard.html", context
+    )
+
+
+@staff_member_required
+def request_timings(request: HttpRequest) -> JsonResponse:
+    """Shows staff the measurements of the recent requests by URL name
+
+    See catalog.instrumentation; nothing is measured unless the
+    CATALOG_REQUEST_TIMINGS setting is on.
+    """
+
+    return JsonResponse(
+        {
+            "enabled": instrumentation.timings_enabled(),
+            "window": instrumentation.windows.window,
+            "routes": instrumentation.windows.summary(),
+        }
+    )
+
+
+def author_autocomplete(request: HttpRequest) -> JsonResponse:
+    """Returns a page of the authors whose first or last name starts with ?term=
+
+    The response is in the format the select2 widget of the admin expects,
+    see catalog.forms.AuthorAutocompleteSelect.
+    """
+
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
+    authors, more = autocomplete.search_authors(request.GET.get("term", ""), page)
+    return JsonResponse(
+        {
+            "results": [
+                {"id": str(author.pk), "text": str(author)} for author in authors
+            ],
+            "pagination": {"more": more},
+        }
+    )
+
+
+@login_required
+@permission_required("catalog.can_mark_returned", raise_exception=True)
+@gzip_page
+def export_catalog(request: HttpRequest, resource: str) -> StreamingHttpResponse:
+    """Streams the authors, books or copies of the catalog as CSV or NDJSON.
+
+    The rows are read from the database in chunks and encoded one at a time,
+    so the response can be as large as the catalog without growing memory.
+    """
+
+    file_format = request.GET.get("format", CSV_FORMAT)
+    if resource not in exporting.RESOURCES or file_format not in exporting.ENCODERS:
+        raise Http404("Unknown export.")
+
+    response = StreamingHttpResponse(
+        exporting.export_lines(resource, file_format),
+        content_type=exporting.CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{resource}.{file_format}"'
+    return response
+
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     model = Author
     fields = ["first_name", "last_name", "date_of_birth", "date_of_death"]
@@ -188,13 +588,13 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
 
 class BookCreate(PermissionRequiredMixin, CreateView):
     model = Book
-    fields = ["title", "author", "summary", "isbn", "genre", "language"]
+    form_class = BookForm
     permission_required = "catalog.can_mark_returned"
 
 
 class BookUpdate(PermissionRequiredMixin, UpdateView):
     model = Book
-    fields = ["title", "author", "summary", "isbn", "genre", "language"]
+    form_class = BookForm
     permission_required = "catalog.can_mark_returned"
 
 
@@ -0,0 +1,80 @@
+"""Visit counting for the home page
+
+The home page shows visitors how many times they have opened it. Storing the
+count in the session means every anonymous hit creates or updates a row in
+django_session, so by default the count is kept in a signed cookie instead and
+the session is left untouched. The storage is chosen with the
+CATALOG_VISIT_COUNTER setting:
+
+    "cookie"  - the count lives in a signed cookie (default, no database writes)
+    "session" - the count lives in the session, as it did originally
+"""
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+VISITS_KEY = "num_visits"
+
+# The salt keeps the signed cookie value from being reused for other purposes
+VISITS_COOKIE_SALT = "catalog.visits"
+
+# Visit counts are remembered for one year
+VISITS_COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+COOKIE_MODE = "cookie"
+SESSION_MODE = "session"
+
+
+def visit_counter_mode() -> str:
+    """Returns the configured storage for visit counts"""
+
+    return getattr(settings, "CATALOG_VISIT_COUNTER", COOKIE_MODE)
+
+
+def read_visits(request: HttpRequest) -> tuple:
+    """Returns the number of previous visits and whether the browser supports cookies
+
+    Cookie support is known once the browser sends back a cookie that was set
+    on an earlier visit.
+    """
+
+    if visit_counter_mode() == SESSION_MODE:
+        num_visits = request.session.get(VISITS_KEY, 0)
+        cookie_support = request.session.test_cookie_worked()
+        return num_visits, cookie_support
+
+    try:
+        num_visits = int(
+            request.get_signed_cookie(VISITS_KEY, default=0, salt=VISITS_COOKIE_SALT)
+        )
+    except ValueError:
+        num_visits = 0
+
+    return num_visits, VISITS_KEY in request.COOKIES
+
+
+def save_visits(request: HttpRequest, response: HttpResponse, num_visits: int) -> None:
+    """Stores the new number of visits for the next request"""
+
+    if visit_counter_mode() == SESSION_MODE:
+        request.session[VISITS_KEY] = num_visits
+
+        # The test cookie is replaced so that the next visit can check it again
+        if request.session.test_cookie_worked():
+            request.session.delete_test_cookie()
+        request.session.set_test_cookie()
+        return
+
+    response.set_signed_cookie(
+        VISITS_KEY,
+        num_visits,
+        salt=VISITS_COOKIE_SALT,
+        max_age=VISITS_COOKIE_MAX_AGE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+    # The page differs per visitor, so only the browser itself may cache it
+    patch_vary_headers(response, ("Cookie",))
+    patch_cache_control(response, private=True)
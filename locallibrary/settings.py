@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so that it measures the whole stack when it is enabled
+    "catalog.instrumentation.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -69,7 +71,8 @@ ROOT_URLCONF = "locallibrary.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # The Django backend, with rendering timed for the request timings
+        "BACKEND": "catalog.instrumentation.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -97,6 +100,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# CATALOG_CACHE_BACKEND selects where rendered page fragments are stored:
+# "locmem" keeps them in the memory of each process, "file" in a directory
+# shared by the processes of one machine and "memcached" on a shared server.
+
+CATALOG_CACHE_BACKEND = os.environ.get("CATALOG_CACHE_BACKEND", "locmem")
+
+CATALOG_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "locallibrary",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CATALOG_CACHE_LOCATION", BASE_DIR / ".cache"),
+    },
+    "memcached": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": os.environ.get("CATALOG_CACHE_LOCATION", "127.0.0.1:11211"),
+    },
+}
+
+CACHES = {"default": CATALOG_CACHE_BACKENDS[CATALOG_CACHE_BACKEND]}
+
+# Seconds a rendered fragment of the book and author pages stays cached.
+# Fragments are keyed by updated_at, so changes never wait for the timeout.
+CATALOG_FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get("CATALOG_FRAGMENT_CACHE_TIMEOUT", 24 * 60 * 60)
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -144,12 +179,41 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Redirect to home URL after login (Default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = "/"
 
+# Where the home page keeps visit counts: "cookie" avoids a session write on
+# every visit, "session" stores them in the session as before
+CATALOG_VISIT_COUNTER = os.environ.get("CATALOG_VISIT_COUNTER", "cookie")
+
+# The ASGI deployment profile (see README) serves the async home page, whose
+# queries, like the ones of the librarian dashboard, run concurrently on a
+# thread pool unless CATALOG_CONCURRENT_QUERIES is off
+CATALOG_ASYNC_VIEWS = os.environ.get("CATALOG_ASYNC_VIEWS", "") == "True"
+CATALOG_CONCURRENT_QUERIES = (
+    os.environ.get("CATALOG_CONCURRENT_QUERIES", "True") == "True"
+)
+
+# Measures the queries, SQL time, template time and wall time of every
+# request by URL name (see catalog/instrumentation.py), shown to staff at
+# /catalog/timings/ and, with CATALOG_REQUEST_TIMINGS_HEADER, sent in a
+# Server-Timing header of every response
+CATALOG_REQUEST_TIMINGS = os.environ.get("CATALOG_REQUEST_TIMINGS", "") == "True"
+CATALOG_REQUEST_TIMINGS_HEADER = (
+    os.environ.get("CATALOG_REQUEST_TIMINGS_HEADER", "") == "True"
+)
+
+# Seconds between two reads of the authors changed by other processes into
+# the author autocompletion index of a process (see catalog/autocomplete.py)
+CATALOG_AUTOCOMPLETE_SYNC_INTERVAL = int(
+    os.environ.get("CATALOG_AUTOCOMPLETE_SYNC_INTERVAL", 60)
+)
+
 # Allows testing of reset password feature
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 
 # Heroku: Update database configuration from $DATABASE_URL.
-db_from_env = dj_database_url.config(conn_max_age=500)
+# Under ASGI queries run on pool threads, each with its own connection, so
+# connections are not kept open between requests there
+db_from_env = dj_database_url.config(conn_max_age=0 if CATALOG_ASYNC_VIEWS else 500)
 DATABASES["default"].update(db_from_env)
 
 